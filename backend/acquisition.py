@@ -0,0 +1,68 @@
+import asyncio
+import logging
+import threading
+from ring_buffer import RingBuffer
+
+BUFFER_SECONDS = 10  # Backlog the acquisition thread can hold before overwriting unread samples
+
+class AcquisitionThread(threading.Thread):
+    """Reads one board off the event loop and wakes the stream task when a hop is ready.
+
+    The thread is the only writer of the ring buffer and the stream task its
+    only reader, so no lock is taken on the sample path. BrainFlow has no
+    blocking read, so the thread polls the board at a short interval.
+    """
+    def __init__(self, device_manager, loop: asyncio.AbstractEventLoop, hop_samples: int, poll_interval: float = 0.01):
+        super().__init__(daemon=True, name="acquisition")
+        self.device_manager = device_manager
+        self.loop = loop
+        self.hop_samples = hop_samples
+        self.poll_interval = poll_interval
+        self.buffer = RingBuffer(len(device_manager.eeg_rows), int(device_manager.fs * BUFFER_SECONDS), dtype=device_manager.dtype)
+        self.ready = asyncio.Event()
+        self.cursor = 0  # Reader position, in samples written
+        self.overruns = 0
+        self._notified = False
+        self._stopping = threading.Event()
+
+    @property
+    def backlog(self):
+        """Samples written but not yet read"""
+        return self.buffer.total_written - self.cursor
+
+    def run(self):
+        while not self._stopping.is_set():
+            try:
+                data, timestamps = self.device_manager.get_data()
+            except Exception as e:
+                logging.error(f"Acquisition error: {e}")
+                data, timestamps = None, []
+            if len(timestamps):
+                self.buffer.write(data, timestamps)
+                if not self._notified and self.backlog >= self.hop_samples:
+                    self._notified = True
+                    self.loop.call_soon_threadsafe(self.ready.set)
+            self._stopping.wait(self.poll_interval)
+
+    async def wait(self, timeout: float = None) -> bool:
+        """Wait until at least a hop of samples is buffered; False on timeout"""
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def read(self):
+        """All samples buffered since the previous read as (eeg, timestamps)"""
+        self.ready.clear()
+        self._notified = False
+        if self.backlog > self.buffer.capacity:
+            self.overruns += 1
+            logging.warning(f"Acquisition buffer overrun, {self.backlog - self.buffer.capacity} samples dropped")
+        data, timestamps, self.cursor = self.buffer.read_since(self.cursor)
+        return data, timestamps
+
+    def stop(self):
+        self._stopping.set()
+        if self.is_alive():
+            self.join(timeout=1.0)
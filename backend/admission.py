@@ -0,0 +1,148 @@
+import os
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+DEFAULT_MAX_SESSIONS = 32  # Streaming sessions per worker
+DEFAULT_MAX_WEBSOCKETS = 8  # Clients per session per worker
+DEFAULT_MAX_AUDIO_JOBS = 2  # Concurrent /api/process_audio jobs per worker
+DEFAULT_MAX_LATENESS_MS = 100.0  # p95 tick lateness of any session above which new work is refused
+DEFAULT_MIN_CPU_HEADROOM = 0.15  # Idle CPU fraction of the host below which new work is refused
+CPU_SAMPLE_INTERVAL = 1.0
+LIMIT_RETRY_AFTER = 30  # Seconds clients wait after hitting a cap
+OVERLOAD_RETRY_AFTER = 10  # Seconds clients wait while the worker is overloaded
+
+class AdmissionRejected(Exception):
+    """New work refused: 429 for a configured cap, 503 for an overloaded host"""
+    def __init__(self, message: str, status_code: int, retry_after: int):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+def _read_cpu_times():
+    """(idle, total) jiffies of all CPUs from /proc/stat"""
+    with open('/proc/stat') as f:
+        values = [int(v) for v in f.readline().split()[1:]]
+    return values[3] + values[4], sum(values)  # idle + iowait
+
+class CpuMonitor(threading.Thread):
+    """Host CPU idle fraction, sampled every CPU_SAMPLE_INTERVAL from /proc/stat"""
+    def __init__(self, interval: float = CPU_SAMPLE_INTERVAL):
+        super().__init__(daemon=True, name="cpu-monitor")
+        self.interval = interval
+        self.idle: Optional[float] = None
+
+    def run(self):
+        previous = _read_cpu_times()
+        while True:
+            time.sleep(self.interval)
+            current = _read_cpu_times()
+            total = current[1] - previous[1]
+            if total > 0:
+                self.idle = (current[0] - previous[0]) / total
+            previous = current
+
+def start_cpu_monitor() -> Optional[CpuMonitor]:
+    try:
+        _read_cpu_times()
+    except (OSError, ValueError, IndexError):
+        return None  # Not Linux; the headroom check is skipped
+    monitor = CpuMonitor()
+    monitor.start()
+    return monitor
+
+class AdmissionController:
+    """Decides whether a worker takes on a new session, websocket or audio job.
+
+    Caps come from STUDYAMP_MAX_SESSIONS, STUDYAMP_MAX_WEBSOCKETS and
+    STUDYAMP_MAX_AUDIO_JOBS. New sessions and audio jobs are also refused while
+    any streaming session's p95 tick lateness exceeds STUDYAMP_MAX_LATENESS_MS
+    or host CPU idle drops below STUDYAMP_MIN_CPU_HEADROOM, so sessions already
+    running keep their frame rate when the host is saturated. A limit set to 0
+    is disabled.
+    """
+    def __init__(self, manager):
+        self.manager = manager
+        self.max_sessions = int(os.getenv('STUDYAMP_MAX_SESSIONS', DEFAULT_MAX_SESSIONS))
+        self.max_websockets = int(os.getenv('STUDYAMP_MAX_WEBSOCKETS', DEFAULT_MAX_WEBSOCKETS))
+        self.max_audio_jobs = int(os.getenv('STUDYAMP_MAX_AUDIO_JOBS', DEFAULT_MAX_AUDIO_JOBS))
+        self.max_lateness_ms = float(os.getenv('STUDYAMP_MAX_LATENESS_MS', DEFAULT_MAX_LATENESS_MS))
+        self.min_cpu_headroom = float(os.getenv('STUDYAMP_MIN_CPU_HEADROOM', DEFAULT_MIN_CPU_HEADROOM))
+        self.cpu = start_cpu_monitor() if self.min_cpu_headroom else None
+        self.websockets: Dict[str, int] = {}  # Open client connections per session, local or relayed
+        self.audio_jobs = 0
+        self.rejected: Dict[str, int] = {}
+
+    def reject(self, reason: str, message: str, status_code: int, retry_after: int):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        logging.warning(f"Admission rejected ({reason}): {message}")
+        raise AdmissionRejected(message, status_code, retry_after)
+
+    def worst_lateness_ms(self) -> float:
+        return max((stream["scheduler"].stats()["lateness_p95_ms"] for stream in list(self.manager.streams.values())),
+                   default=0.0)
+
+    def check_overload(self):
+        if self.max_lateness_ms:
+            lateness = self.worst_lateness_ms()
+            if lateness > self.max_lateness_ms:
+                self.reject("lateness", f"Worker is behind real time (p95 tick lateness {lateness:.0f} ms)",
+                            503, OVERLOAD_RETRY_AFTER)
+        idle = self.cpu and self.cpu.idle
+        if idle is not None and idle < self.min_cpu_headroom:
+            self.reject("cpu", f"Host CPU is saturated ({100 * idle:.0f}% idle)", 503, OVERLOAD_RETRY_AFTER)
+
+    def check_session(self):
+        """Raises AdmissionRejected unless a new session may start in this worker"""
+        active = len(self.manager.websockets)  # Keyed by every session this worker runs
+        if self.max_sessions and active >= self.max_sessions:
+            self.reject("sessions", f"Worker is running its limit of {self.max_sessions} sessions",
+                        429, LIMIT_RETRY_AFTER)
+        self.check_overload()
+
+    def open_websocket(self, session_id: str) -> bool:
+        """Counts a new client of the session, or returns False when the session is at its cap"""
+        count = self.websockets.get(session_id, 0)
+        if self.max_websockets and count >= self.max_websockets:
+            self.rejected["websockets"] = self.rejected.get("websockets", 0) + 1
+            return False
+        self.websockets[session_id] = count + 1
+        return True
+
+    def close_websocket(self, session_id: str):
+        count = self.websockets.get(session_id, 0) - 1
+        if count > 0:
+            self.websockets[session_id] = count
+        else:
+            self.websockets.pop(session_id, None)
+
+    @contextmanager
+    def audio_job(self):
+        """Holds one of the audio job slots for the duration of a job"""
+        if self.max_audio_jobs and self.audio_jobs >= self.max_audio_jobs:
+            self.reject("audio_jobs", f"{self.audio_jobs} audio jobs are already running", 429, LIMIT_RETRY_AFTER)
+        self.check_overload()
+        self.audio_jobs += 1
+        try:
+            yield
+        finally:
+            self.audio_jobs -= 1
+
+    def stats(self):
+        return {
+            "limits": {
+                "sessions": self.max_sessions,
+                "websockets_per_session": self.max_websockets,
+                "audio_jobs": self.max_audio_jobs,
+                "lateness_ms": self.max_lateness_ms,
+                "cpu_headroom": self.min_cpu_headroom,
+            },
+            "sessions": len(self.manager.websockets),
+            "websockets": sum(self.websockets.values()),
+            "audio_jobs": self.audio_jobs,
+            "lateness_p95_ms": self.worst_lateness_ms(),
+            "cpu_idle": self.cpu.idle if self.cpu else None,
+            "rejected": dict(self.rejected),
+        }
@@ -0,0 +1,239 @@
+import os
+import logging
+import numpy as np
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from models import SessionData
+from rollups import SessionRollups, RESOLUTIONS
+
+DEFAULT_DROP_THRESHOLD = 50.0  # Attention below this counts as a drop, as in the frontend's default
+PERCENTILES = (10, 25, 50, 75, 90)
+GROUPINGS = ("user", "day", "week", "hour", "status")
+COLUMNS = ("start_ts", "end_ts", "duration_s", "scores", "mean", "p10", "p25", "p50", "p75", "p90",
+           "drop_count", "drop_seconds")
+# Per hour of day (UTC): seconds with scores, score sum and count, drop seconds, drops starting
+HISTOGRAMS = ("hour_seconds", "hour_score_sum", "hour_scores", "hour_drop_seconds", "hour_drops")
+DAY = 86400
+
+def drop_threshold() -> float:
+    return float(os.getenv('STUDYAMP_DROP_THRESHOLD', DEFAULT_DROP_THRESHOLD))
+
+def aggregate_session(session: SessionData, rollups: Optional[SessionRollups], threshold: float) -> Dict:
+    """One session's summary row, from its scores and 1 s rollups.
+
+    A drop is a run of consecutive seconds whose mean attention is below
+    threshold; drop_seconds is the time spent in drops. duration_s counts
+    the same 1 s buckets (seconds with scores), so drop_seconds never
+    exceeds it, and matches the hourly histograms.
+    """
+    scores = np.asarray(session.attention_scores, dtype=np.float64)
+    fine = (rollups or SessionRollups()).levels[RESOLUTIONS[0]]
+    t = np.asarray(fine.starts, dtype=np.float64)
+    sums = np.asarray(fine.sums, dtype=np.float64)
+    counts = np.asarray(fine.counts, dtype=np.float64)
+    below = sums < threshold * counts
+    contiguous = np.diff(t, prepend=-np.inf) == RESOLUTIONS[0]
+    drop_starts = below & ~(np.concatenate(([False], below[:-1])) & contiguous)
+    hours = (t // 3600 % 24).astype(np.int64)
+
+    start_ts = session.start_time.timestamp()
+    if session.end_time:
+        end_ts = session.end_time.timestamp()
+    else:
+        end_ts = float(t[-1]) + RESOLUTIONS[0] if len(t) else start_ts
+    percentiles = np.percentile(scores, PERCENTILES) if len(scores) else [None] * len(PERCENTILES)
+    return {
+        "session_id": session.session_id,
+        "user_id": session.user_id,
+        "status": session.status,
+        "start_ts": start_ts,
+        "end_ts": end_ts,
+        "duration_s": float(len(t)) * RESOLUTIONS[0],
+        "scores": len(scores),
+        "mean": float(scores.mean()) if len(scores) else None,
+        **{f"p{p}": None if value is None else float(value) for p, value in zip(PERCENTILES, percentiles)},
+        "drop_count": int(drop_starts.sum()),
+        "drop_seconds": float(below.sum()) * RESOLUTIONS[0],
+        "hour_seconds": (np.bincount(hours, minlength=24) * RESOLUTIONS[0]).tolist(),
+        "hour_score_sum": np.bincount(hours, weights=sums, minlength=24).tolist(),
+        "hour_scores": np.bincount(hours, weights=counts, minlength=24).astype(np.int64).tolist(),
+        "hour_drop_seconds": (np.bincount(hours[below], minlength=24) * RESOLUTIONS[0]).tolist(),
+        "hour_drops": np.bincount(hours[drop_starts], minlength=24).tolist(),
+    }
+
+def _ratio(numerator: np.ndarray, denominator: np.ndarray):
+    """Elementwise ratio as a list, None where the denominator is 0"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = numerator / denominator
+    return [float(value) if d else None for value, d in zip(ratio, denominator)]
+
+def _date(day: int) -> str:
+    return datetime.fromtimestamp(int(day) * DAY, timezone.utc).date().isoformat()
+
+class SessionAnalytics:
+    """Per-session aggregates and grouped queries across sessions.
+
+    A row is computed once, when a session ends, and appended to the store's
+    aggregates log, which other workers pick up by reading its new tail.
+    Rows are kept as column arrays, filled in place as they arrive, with
+    user and status as integer codes, so a query is a few NumPy reductions
+    over every session whatever the number of scores behind them.
+    """
+    def __init__(self, store, threshold: float = None, capacity: int = 1024):
+        self.store = store
+        self.threshold = drop_threshold() if threshold is None else threshold
+        self.index: Dict[str, int] = {}  # Session id -> row
+        self.size = 0
+        self.codes: Dict[str, Dict[str, int]] = {"user": {}, "status": {}}  # Label -> code per category
+        self.columns = self._allocate(capacity)
+        self.offset = 0  # Bytes of the aggregates log applied so far
+        self.refresh()
+
+    @staticmethod
+    def _allocate(capacity: int) -> Dict[str, np.ndarray]:
+        return {
+            "valid": np.zeros(capacity, dtype=bool),  # False for deleted rows
+            "user": np.zeros(capacity, dtype=np.int64),
+            "status": np.zeros(capacity, dtype=np.int64),
+            **{name: np.zeros(capacity) for name in COLUMNS},
+            **{name: np.zeros((capacity, 24)) for name in HISTOGRAMS},
+        }
+
+    def refresh(self):
+        rows, self.offset = self.store.read_aggregates(self.offset)
+        for row in rows:
+            self._apply(row)
+
+    def _code(self, category: str, label: str) -> int:
+        return self.codes[category].setdefault(label, len(self.codes[category]))
+
+    def _apply(self, row: Dict):
+        i = self.index.get(row["session_id"])
+        if row.get("deleted"):
+            if i is not None:
+                self.columns["valid"][i] = False
+                del self.index[row["session_id"]]
+            return
+        if i is None:
+            if self.size == len(self.columns["valid"]):
+                grown = self._allocate(max(2 * self.size, 1))
+                for name, values in self.columns.items():
+                    grown[name][:self.size] = values
+                self.columns = grown
+            i = self.index[row["session_id"]] = self.size
+            self.size += 1
+        columns = self.columns
+        columns["valid"][i] = True
+        columns["user"][i] = self._code("user", row["user_id"])
+        columns["status"][i] = self._code("status", row["status"])
+        for name in COLUMNS:
+            columns[name][i] = np.nan if row[name] is None else row[name]
+        for name in HISTOGRAMS:
+            columns[name][i] = row[name]
+
+    def record(self, session: SessionData, rollups: Optional[SessionRollups]) -> Dict:
+        row = aggregate_session(session, rollups, self.threshold)
+        self.store.append_aggregate(row)
+        self._apply(row)
+        return row
+
+    def delete(self, session_id: str):
+        if session_id in self.index:
+            row = {"session_id": session_id, "deleted": True}
+            self.store.append_aggregate(row)
+            self._apply(row)
+
+    def backfill(self):
+        """Aggregate ended sessions that have no row yet, e.g. ones stored before aggregates existed"""
+        self.store.refresh()
+        missing = [session_id for session_id, entry in list(self.store.manifest.items())
+                   if entry['status'] == 'ended' and session_id not in self.index]
+        for session_id in missing:
+            session = self.store.load(session_id)
+            if session:
+                self.record(session, self.store.get_rollups(session_id))
+        if missing:
+            logging.info(f"Aggregated {len(missing)} stored sessions for analytics")
+
+    def query(self, group_by: str, start_ts: float = None, end_ts: float = None, user_id: str = None,
+              status: str = None, utc_offset: int = 0) -> Dict:
+        """Sessions that started within [start_ts, end_ts), grouped by user, day, week, hour of day or status.
+
+        Days, weeks (starting Monday) and hours are in UTC shifted by
+        utc_offset hours. Hour groups come from the sessions' hourly
+        histograms, so a session spanning several hours counts in each.
+        """
+        if group_by not in GROUPINGS:
+            raise ValueError(f"Unknown grouping {group_by}; use one of {', '.join(GROUPINGS)}")
+        self.refresh()
+        columns = {name: values[:self.size] for name, values in self.columns.items()}
+        mask = columns["valid"].copy()
+        if start_ts is not None:
+            mask &= columns["start_ts"] >= start_ts
+        if end_ts is not None:
+            mask &= columns["start_ts"] < end_ts
+        for category, label in (("user", user_id), ("status", status)):
+            if label is not None:
+                mask &= columns[category] == self.codes[category].get(label, -1)
+        result = {"group_by": group_by, "utc_offset": utc_offset, "sessions": int(mask.sum())}
+        if group_by == "hour":
+            return {**result, "groups": self._hour_groups(columns, mask, utc_offset)}
+
+        if group_by in ("user", "status"):
+            keys = columns[group_by][mask]
+        else:
+            days = np.floor((columns["start_ts"][mask] + utc_offset * 3600) / DAY).astype(np.int64)
+            # Day 0 (1970-01-01) was a Thursday; weeks are keyed by their Monday
+            keys = days if group_by == "day" else (days + 3) // 7 * 7 - 3
+        keys, inverse = np.unique(keys, return_inverse=True)
+
+        def total(values):
+            return np.bincount(inverse, weights=values[mask], minlength=len(keys))
+
+        scores = total(columns["scores"])
+        score_sums = total(np.nan_to_num(columns["mean"]) * columns["scores"])
+        durations = total(columns["duration_s"])
+        drop_counts = total(columns["drop_count"])
+        drop_seconds = total(columns["drop_seconds"])
+        sessions = np.bincount(inverse, minlength=len(keys))
+        if group_by in ("day", "week"):
+            labels = [_date(day) for day in keys]
+        else:
+            names = {code: label for label, code in self.codes[group_by].items()}
+            labels = [names[code] for code in keys]
+        return {**result, "groups": [
+            {
+                "key": label,
+                "sessions": int(count),
+                "duration_s": float(duration),
+                "mean_attention": mean,
+                "drop_count": int(drops),
+                "drop_seconds": float(dropped),
+                "drops_per_hour": per_hour,
+            }
+            for label, count, duration, mean, drops, dropped, per_hour in zip(
+                labels, sessions, durations, _ratio(score_sums, scores), drop_counts, drop_seconds,
+                _ratio(drop_counts * 3600, durations))
+        ]}
+
+    def _hour_groups(self, columns: Dict[str, np.ndarray], mask: np.ndarray, utc_offset: int):
+        # Column sums over the selected rows as one matrix-vector product, without copying them out
+        weights = mask.astype(np.float64)
+        hist = {name: weights @ columns[name] for name in HISTOGRAMS}
+        hist["sessions"] = weights @ (columns["hour_seconds"] > 0)
+        # np.roll moves UTC hour h to local hour h + utc_offset
+        hist = {name: np.roll(values, utc_offset) for name, values in hist.items()}
+        return [
+            {
+                "key": hour,
+                "sessions": int(hist["sessions"][hour]),
+                "duration_s": float(hist["hour_seconds"][hour]),
+                "mean_attention": mean,
+                "drop_count": int(hist["hour_drops"][hour]),
+                "drop_seconds": float(hist["hour_drop_seconds"][hour]),
+                "drops_per_hour": per_hour,
+            }
+            for hour, mean, per_hour in zip(
+                range(24), _ratio(hist["hour_score_sum"], hist["hour_scores"]),
+                _ratio(hist["hour_drops"] * 3600, hist["hour_seconds"]))
+        ]
@@ -8,12 +8,26 @@ from rich.text import Text
 from device_manager import DeviceManager
 from signal_processor import SignalProcessor
 
+BLINK_BAND = (0.5, 4)  # Blinks are low-frequency frontal deflections
+CLENCH_BAND = (20, 60)  # Jaw clenches are broadband high-frequency muscle activity
+FRONTAL_CHANNELS = [1, 2]  # AF7 and AF8
+
 class ArtifactDetector:
-    def __init__(self):
+    def __init__(self, warmup=8, baseline_alpha=0.05, blink_factor=4.0, clench_factor=2.5, motion_factor=6.0):
         self.buffer_size = 512  # Increased buffer size for more data
         self.data_buffer = np.zeros((4, self.buffer_size))
         self.buffer_index = 0
 
+        # Adaptive thresholds: multiples of a running baseline of
+        # (blink power, clench power fraction, total power) per channel
+        self.warmup = warmup
+        self.baseline_alpha = baseline_alpha
+        self.blink_factor = blink_factor
+        self.clench_factor = clench_factor
+        self.motion_factor = motion_factor
+        self.baseline = None
+        self.windows_seen = 0
+
     def update_buffer(self, new_data):
         num_samples = new_data.shape[1]
         if num_samples >= self.buffer_size:
@@ -24,43 +38,57 @@ class ArtifactDetector:
             self.data_buffer[:, -num_samples:] = new_data[:self.data_buffer.shape[0], -num_samples:]
             self.buffer_index = min(self.buffer_index + num_samples, self.buffer_size)
 
-    def detect_blink(self):
-        # Use band-pass filter to isolate blink-related frequencies
-        # Blinks are typically low-frequency (< 4 Hz) signals
-        blink_band = (0.5, 4)
-        frontal_channels = self.data_buffer[1:3, -self.buffer_size:]  # AF7 and AF8
-        power = self.calculate_band_power(frontal_channels, blink_band)
-        blink_threshold = 80  # Adjusted threshold
-        return np.any(power > blink_threshold)
-
-    def detect_jaw_clench(self):
-        # Jaw clenches are high-frequency artifacts
-        clench_band = (20, 60)
-        all_channels = self.data_buffer[:, -self.buffer_size:]
-        power = self.calculate_band_power(all_channels, clench_band)
-        normalized_power = power / np.max(power)  # Normalize power values
-        clench_threshold = 0.8  # Adjusted threshold for normalized power
-        return np.any(normalized_power > clench_threshold)
-
-    def detect_alpha_burst(self):
+    def detect(self, freqs, psd):
+        """Blink, clench and motion flags for all channels from one window's spectrum.
+
+        Each feature is compared with a running baseline learned from clean
+        windows, so thresholds adapt to the wearer and the electrode contact.
+        """
+        return self.detect_features(self.features(freqs, psd))
+
+    def features(self, freqs, psd):
+        """(blink power, clench power fraction, total power) per channel, shape (..., 3, channels).
+
+        Stateless, so it can run over a stack of sessions' spectra at once.
+        """
+        blink_power = self.band_sum(freqs, psd, BLINK_BAND)
+        total_power = np.sum(psd, axis=-1) + 1e-12
+        return np.stack([
+            blink_power,
+            self.band_sum(freqs, psd, CLENCH_BAND) / total_power,
+            total_power,
+        ], axis=-2)
+
+    def detect_features(self, features):
+        """Flags for one window's (3, channels) features against this detector's baseline"""
+        if self.baseline is None:
+            self.baseline = features.copy()
+        ratio = features / (self.baseline + 1e-12)
+
+        warmed_up = self.windows_seen >= self.warmup
+        flags = {
+            "blink": bool(warmed_up and np.any(ratio[0, FRONTAL_CHANNELS] > self.blink_factor)),
+            "clench": bool(warmed_up and np.any(ratio[1] > self.clench_factor)),
+            "motion": bool(warmed_up and np.mean(ratio[2]) > self.motion_factor),
+        }
+
+        # Only clean windows move the baseline
+        if not any(flags.values()):
+            self.windows_seen += 1
+            alpha = max(self.baseline_alpha, 1.0 / self.windows_seen)
+            self.baseline += alpha * (features - self.baseline)
+        return flags
+
+    def detect_alpha_burst(self, freqs, psd):
         # Alpha bursts in the 8-13 Hz band
         alpha_band = (8, 13)
-        occipital_channels = self.data_buffer[2:4, -self.buffer_size:]  # Assuming channels 2 and 3 are occipital
-        power = self.calculate_band_power(occipital_channels, alpha_band)
+        power = self.band_sum(freqs, psd[2:4], alpha_band)  # Assuming channels 2 and 3 are occipital
         alpha_threshold = 30  # Adjusted threshold
-        return np.all(power > alpha_threshold)
-
-    def calculate_band_power(self, data, band):
-        from scipy.signal import welch
-        fs = 256  # Sampling frequency
-        band = np.asarray(band)
-        power = []
-        for channel_data in data:
-            f, Pxx = welch(channel_data, fs=fs, nperseg=256)
-            idx_band = np.logical_and(f >= band[0], f <= band[1])
-            band_power = np.sum(Pxx[idx_band])
-            power.append(band_power)
-        return np.array(power)
+        return bool(np.all(power > alpha_threshold))
+
+    def band_sum(self, freqs, psd, band):
+        idx_band = np.logical_and(freqs >= band[0], freqs <= band[1])
+        return np.sum(psd[..., idx_band], axis=-1)
 
 def create_artifact_display(detections):
     text = Text()
@@ -78,16 +106,20 @@ async def main():
     try:
         with Live(refresh_per_second=4) as live:
             while True:
-                raw_data = device_manager.get_data()  # Should return numpy array of shape (channels, samples)
+                raw_data, _ = device_manager.get_data()  # New samples, shape (channels, samples)
                 if raw_data is None or raw_data.size == 0:
+                    await asyncio.sleep(0.05)
                     continue
 
                 artifact_detector.update_buffer(raw_data)
 
+                freqs, psd = signal_processor.compute_psd(artifact_detector.data_buffer)
+                flags = artifact_detector.detect(freqs, psd)
                 detections = {
-                    "Eye Blink": artifact_detector.detect_blink(),
-                    "Jaw Clench": artifact_detector.detect_jaw_clench(),
-                    "Alpha Burst": artifact_detector.detect_alpha_burst()
+                    "Eye Blink": flags["blink"],
+                    "Jaw Clench": flags["clench"],
+                    "Motion": flags["motion"],
+                    "Alpha Burst": artifact_detector.detect_alpha_burst(freqs, psd)
                 }
 
                 display = create_artifact_display(detections)
@@ -1,6 +1,4 @@
 import json
-import google.generativeai as genai
-from pydub import AudioSegment
 import io
 import os
 from typing import List, Dict
@@ -14,8 +12,10 @@ import magic
 import uuid
 from dotenv import load_dotenv
 import asyncio
+from functools import lru_cache
 # from parser import AudioParser
 from prompt import PromptGenerator
+from llm_backend import LLMClient, default_client
 
 
 
@@ -24,22 +24,90 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+DEFAULT_MAX_UPLOAD_MB = 512
+SEGMENT_SECONDS = 30
+FFMPEG_BASE_TIMEOUT = 30  # Seconds any ffmpeg/ffprobe run may take
+FFMPEG_SECONDS_PER_MB = 2  # Extra seconds per MB of input, so long recordings are not cut off
+
+def max_upload_bytes() -> int:
+    """STUDYAMP_MAX_UPLOAD_MB, the largest recording /api/process_audio accepts"""
+    return int(float(os.getenv('STUDYAMP_MAX_UPLOAD_MB', DEFAULT_MAX_UPLOAD_MB)) * 1024 * 1024)
+
+def save_upload(source, path: str, limit: int) -> int:
+    """Copy an upload to disk in fixed-size chunks; raises 413 past limit bytes"""
+    size = 0
+    with open(path, 'wb') as f:
+        while True:
+            chunk = source.read(UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                return size
+            size += len(chunk)
+            if size > limit:
+                raise HTTPException(status_code=413, detail=f"Audio upload exceeds {limit // (1024 * 1024)} MB")
+            f.write(chunk)
+
+def ffmpeg_timeout(path: str) -> float:
+    """Time limit of an ffmpeg run over path, growing with its size"""
+    return FFMPEG_BASE_TIMEOUT + FFMPEG_SECONDS_PER_MB * os.path.getsize(path) / (1024 * 1024)
+
+async def run_tool(args: List[str], timeout: float) -> subprocess.CompletedProcess:
+    """Run ffmpeg/ffprobe without blocking the event loop.
+
+    Raises subprocess.TimeoutExpired (after killing the process) and
+    subprocess.CalledProcessError like subprocess.run(check=True, timeout=...).
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise subprocess.TimeoutExpired(args, timeout)
+    stdout, stderr = stdout.decode(errors='replace'), stderr.decode(errors='replace')
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, args, stdout, stderr)
+    return subprocess.CompletedProcess(args, process.returncode, stdout, stderr)
+
+@lru_cache(maxsize=1)
+def ffmpeg_version() -> str:
+    """Checked once per worker rather than on every request"""
+    if not shutil.which('ffmpeg'):
+        raise RuntimeError("FFmpeg not found in system PATH")
+    version = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, check=True)
+    return version.stdout.splitlines()[0]
+
+async def probe_media(path: str) -> Dict:
+    """Container and audio stream metadata from ffprobe, without decoding any samples"""
+    result = await run_tool([
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=format_name,duration:stream=codec_type,codec_name,sample_rate,channels',
+        '-of', 'json', path
+    ], FFMPEG_BASE_TIMEOUT)
+    info = json.loads(result.stdout)
+    audio = next((s for s in info.get('streams', []) if s.get('codec_type') == 'audio'), None)
+    duration = info.get('format', {}).get('duration')
+    return {
+        "format": info.get('format', {}).get('format_name'),
+        "duration": float(duration) if duration not in (None, 'N/A') else None,
+        "codec": audio and audio.get('codec_name'),
+        "sample_rate": int(audio['sample_rate']) if audio and audio.get('sample_rate') else None,
+        "channels": audio and audio.get('channels'),
+    }
+
+def summary_mode() -> str:
+    """STUDYAMP_SUMMARY_MODE: one summary of the whole recording (audio) or one per low attention period (segments)"""
+    return os.getenv('STUDYAMP_SUMMARY_MODE', 'audio')
+
 class AudioProcessor:
-    def __init__(self):
-        genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
-        self.model = genai.GenerativeModel('gemini-1.5-flash')  # Updated to use audio-capable model
+    def __init__(self, llm: LLMClient = None):
+        # Shared per worker unless a client is passed in (tests, benchmarks)
+        self.llm = llm or default_client()
 
         # Verify ffmpeg installation
         try:
-            ffmpeg_path = shutil.which('ffmpeg')
-            if not ffmpeg_path:
-                raise RuntimeError("FFmpeg not found in system PATH")
-            logger.info(f"Found FFmpeg at: {ffmpeg_path}")
-            
-            # Test FFmpeg capabilities
-            version = subprocess.run(['ffmpeg', '-version'], 
-                                  capture_output=True, text=True, check=True)
-            logger.info(f"FFmpeg version info: {version.stdout.splitlines()[0]}")
+            logger.info(f"FFmpeg version info: {ffmpeg_version()}")
         except Exception as e:
             logger.error(f"FFmpeg initialization error: {e}")
             raise
@@ -64,20 +132,21 @@ class AudioProcessor:
             logger.info(f"Processing {len(timestamps)} low attention periods")
 
             
-            # Save and validate input file
+            # Save and validate input file; disk and file(1) work runs off the event loop
+            loop = asyncio.get_running_loop()
             input_filename, input_path = self._create_temp_file('.webm')
+            temp_files.append(input_path)
             try:
-                with open(input_path, 'wb') as f:
-                    audio_content = audio_file.read()
-                    f.write(audio_content)
-                temp_files.append(input_path)
+                await loop.run_in_executor(None, save_upload, audio_file, input_path, max_upload_bytes())
                 logger.info(f"Saved input file: {input_path}")
+            except HTTPException:
+                raise
             except Exception as e:
                 logger.error(f"Error saving input file: {e}")
                 raise HTTPException(status_code=500, detail="Failed to save audio file")
             
             # Verify file type and size
-            file_type = magic.from_file(input_path, mime=True)
+            file_type = await loop.run_in_executor(None, lambda: magic.from_file(input_path, mime=True))
             file_size = os.path.getsize(input_path)
             logger.info(f"Input file: type={file_type}, size={file_size/1024:.2f}KB")
             
@@ -95,9 +164,10 @@ class AudioProcessor:
             try:
                 # Extract audio from WebM and convert to MP3
                 logger.info("Starting FFmpeg conversion")
-                result = subprocess.run([
+                result = await run_tool([
                     'ffmpeg',
                     '-y',              # Overwrite output
+                    '-nostats', '-loglevel', 'error',  # Keep captured output small on long recordings
                     '-i', input_path,  # Input
                     '-vn',            # No video
                     '-acodec', 'libmp3lame',  # MP3 codec
@@ -105,7 +175,7 @@ class AudioProcessor:
                     '-ac', '2',       # Stereo
                     '-b:a', '192k',   # Bitrate
                     output_path  # Output
-                ], capture_output=True, text=True, check=True, timeout=30)
+                ], ffmpeg_timeout(input_path))
                 
                 logger.info(f"FFmpeg stdout: {result.stdout}")
                 if result.stderr:
@@ -121,20 +191,22 @@ class AudioProcessor:
                 
                 logger.info(f"Conversion successful. Output size: {output_size/1024:.2f}KB")
 
-                # Load and validate converted audio
-                audio = AudioSegment.from_mp3(output_path)
-                if len(audio) == 0:
+                # Validate converted audio from its metadata; nothing is decoded here
+                media = await probe_media(output_path)
+                if not media["duration"] or not media["codec"]:
                     raise ValueError("Converted audio is empty")
                 
-                logger.info(f"Audio loaded successfully: {len(audio)/1000:.2f}s, {audio.frame_rate}Hz")
-
-                # # Process segments
-                # segments = self._extract_segments(audio, timestamps)
-                # if not segments:
-                #     return ["No valid audio segments found for analysis."]
-
-                summaries = await self._generate_summary(audio, timestamps)
-                print("Summaries audio_processor.py: ", summaries)
+                logger.info(f"Audio probed: {media['duration']:.2f}s, {media['sample_rate']}Hz, {media['codec']}")
+
+                if summary_mode() == 'segments':
+                    # Process segments
+                    segments = await self._extract_segments(output_path, media["duration"], timestamps, temp_files)
+                    if not segments:
+                        return ["No valid audio segments found for analysis."]
+                    summaries = await self._get_summaries(segments, timestamps)
+                else:
+                    summaries = await self._generate_summary(output_path, timestamps)
+                logger.debug(f"Summaries: {summaries}")
                 return summaries
 
             except subprocess.TimeoutExpired:
@@ -147,6 +219,8 @@ class AudioProcessor:
                     detail=f"Audio conversion failed: {e.stderr}"
                 )
 
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Processing error: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
@@ -162,223 +236,111 @@ class AudioProcessor:
                 except Exception as e:
                     logger.warning(f"Failed to cleanup {temp_file}: {e}")
 
-    def _extract_segments(self, audio: AudioSegment, timestamps: List[Dict]) -> List[AudioSegment]:
-        segments = []
-        audio_length_ms = len(audio)
-        
-        if audio_length_ms == 0:
-            return []
+    async def _extract_segments(self, audio_path: str, duration: float, timestamps: List[Dict],
+                                temp_files: List[str]) -> List[str]:
+        """Cut a clip around each low attention period with stream copy; samples are never decoded.
+
+        Each clip's path joins temp_files before ffmpeg runs, so a failed cut
+        leaves nothing behind.
+        """
+        # Handle case where audio is less than 30 seconds
+        if duration < SEGMENT_SECONDS:
+            return [audio_path]
 
+        segments = []
+        timeout = ffmpeg_timeout(audio_path)
         for period in timestamps:
-            start_ms = int(period['timestamp'] * 1000)
             # Calculate start and end of the segment
-            segment_start = max(0, start_ms - 15000)
-            segment_end = min(audio_length_ms, start_ms + 15000)
+            segment_start = max(0.0, period['timestamp'] - SEGMENT_SECONDS / 2)
+            segment_end = min(duration, period['timestamp'] + SEGMENT_SECONDS / 2)
             
             # Ensure segment is within audio bounds
             if segment_start < segment_end:
-                segment = audio[segment_start:segment_end]
-                segments.append(segment)
-        
-        # Handle case where audio is less than 30 seconds
-        if audio_length_ms < 30000:
-            segments = [audio]
+                _, segment_path = self._create_temp_file('.mp3')
+                temp_files.append(segment_path)
+                await run_tool([
+                    'ffmpeg', '-y', '-nostats', '-loglevel', 'error',
+                    '-ss', f"{segment_start:.3f}",  # Seek before -i: jumps in the file instead of decoding up to it
+                    '-i', audio_path,
+                    '-t', f"{segment_end - segment_start:.3f}",
+                    '-c', 'copy',
+                    segment_path
+                ], timeout)
+                segments.append(segment_path)
         
         return segments
     
 
-    async def _generate_summary(self, audio: AudioSegment, timestamps: List[Dict]) -> List[str]:
+    def _build_prompt(self, timestamps: List[Dict]) -> str:
+        prompt = PromptGenerator.generate_summary_prompt()
+        timestamps_desc = "\n".join(
+            [f"- At {t['timestamp']} seconds: score = {t['score']}\n." for t in timestamps]
+        )
+        #add timestamps to prompt
+        return prompt + timestamps_desc
+
+    def _parse_summary(self, raw_summary: str) -> Dict:
+        # strip everything until the first '{' character everything after the last '}' character
+        raw_summary = raw_summary[raw_summary.find('{'):]
+        raw_summary = raw_summary[:raw_summary.rfind('}')+1]
+
+        # Parse the JSON string into a dictionary
+        summary_data = json.loads(raw_summary)
+        return {
+            'topic': summary_data['topic'],
+            'summary': summary_data['summary'],
+            'key_points': summary_data['key_points']
+        }
+
+    async def _generate_summary(self, audio_path: str, timestamps: List[Dict]) -> List[str]:
 
         # Generate summary for the entire audio where the user lost focus based on the timestamps where the user lost focus
-        # Generate summary for each segment where the user lost focus
         # Return a list of summaries
 
         summaries = []
-        filename, filepath = self._create_temp_file('.mp3')
         try:
-            logger.info(f"Exporting audio to {filepath}")
-            audio.export(
-                filepath,
-                format='mp3',
-                parameters=["-acodec", "libmp3lame", "-q:a", "2"]
-            )
-            
-            if os.path.getsize(filepath) == 0:
-                raise ValueError("Exported audio is empty")
-            
-            logger.info(f"Uploading audio to Gemini")
-            audio_file = genai.upload_file(filepath)
-            # print(filepath)
-            # filepath = "./harvard.wav"
-            audio_file = genai.upload_file(filepath)
+            # The converted file is uploaded as is; the caller removes it
+            logger.info(f"Summarizing audio with {self.llm.backend.name}")
+            raw_summary = await self.llm.summarize(audio_path, self._build_prompt(timestamps))
+            summaries.append(self._parse_summary(raw_summary))
+            logger.info(f"Successfully got analysis for audio")
+            return summaries
 
+        except Exception as e:
+            logger.error(f"LLM error: {str(e)}")
+            summaries.append(f"Error analyzing audio: {str(e)}")
+            return summaries
 
 
-            prompt = PromptGenerator.generate_summary_prompt()
-            #print timestamps
-            print(timestamps)
-            timestamps_desc = "\n".join(
-                [f"- At {t['timestamp']} seconds: score = {t['score']}\n." for t in timestamps]
-            )
-            # print(prompt)
-            #add timestamps to prompt
-            prompt = prompt + timestamps_desc
-            print(prompt)
+    async def _get_summaries(self, segments: List[str], timestamps: List[Dict]) -> List[str]:
+        """Summarize every segment concurrently (bounded by the LLM client); results keep segment order"""
+        prompt = self._build_prompt(timestamps)
 
+        async def summarize_segment(i: int, filepath: str):
+            logger.info(f"Processing segment {i+1}/{len(segments)}")
+            segment_start = time.time()
             try:
-                response = self.model.generate_content([prompt, audio_file])
-
-
-        
-                # Handle response directly
-                response.resolve()  # Ensure generation is complete
-                # Extract text response
-                raw_summary = response.text
-                # print("Raw Summary:", raw_summary)
-
-                # strip everything until the first '{' character everything after the last '}' character
-
-                raw_summary = raw_summary[raw_summary.find('{'):]
-                raw_summary = raw_summary[:raw_summary.rfind('}')+1]
-                # print("Raw Summary:", raw_summary)
-
-                # Parse the JSON string into a dictionary
-                summary_data = json.loads(raw_summary)
-
-                # Store in a hashmap
-                hashmap = {
-                    'topic': summary_data['topic'],
-                    'summary': summary_data['summary'],
-                    'key_points': summary_data['key_points']
-                }
-
-                print("Hashmap:", hashmap)
-                
-
-                # Append the hashmap to summaries if needed
-                summaries.append(hashmap)
-
-                # print("Summaries:", summaries)
-
-                logger.info(f"Successfully got analysis for audio")
-                
-                return summaries
-
-            
-                
-            
+                if os.path.getsize(filepath) == 0:
+                    raise ValueError(f"Extracted segment {i+1} is empty")
+                try:
+                    summary = self._parse_summary(await self.llm.summarize(filepath, prompt))
+                    logger.info(f"Successfully got analysis for segment {i+1}")
+                except Exception as e:
+                    logger.error(f"LLM error: {str(e)}")
+                    summary = f"Error analyzing segment {i + 1}: API error"
+                logger.info(f"Segment {i+1} processed in {time.time() - segment_start:.2f}s")
+                return summary
+            except Exception as e:
+                logger.error(f"Error processing segment {i+1}: {str(e)}")
+                return f"Could not analyze segment {i + 1}: {str(e)}"
             finally:
                 try:
                     if os.path.exists(filepath):
                         os.chmod(filepath, 0o666)
                         os.unlink(filepath)
-                        logger.info(f"Cleaned up audio file: {filepath}")
+                        logger.info(f"Cleaned up segment file: {filepath}")
                 except Exception as e:
-                    logger.warning(f"Failed to cleanup audio file {filepath}: {e}")
-
-
-        except Exception as e:
-            logger.error(f"Gemini API error: {str(e)}")
-            summaries.append(f"Error analyzing audio: {str(e)}")
-
-
-    async def _get_summaries(self, segments: AudioSegment, timestamps: List[Dict]) -> List[str]:
-
-        summaries = []
-        
-        for i, segment in enumerate(segments):
-            try:
-                logger.info(f"Processing segment {i+1}/{len(segments)}")
-                segment_start = time.time()
-                
-                filename, filepath = self._create_temp_file('.mp3')
-                try:
-                    logger.info(f"Exporting segment {i+1} to {filepath}")
-                    segment.export(
-                        filepath,
-                        format='mp3',
-                        parameters=["-acodec", "libmp3lame", "-q:a", "2"]
-                    )
-                    
-                    if os.path.getsize(filepath) == 0:
-                        raise ValueError(f"Exported segment {i+1} is empty")
-
-                    logger.info(f"Uploading segment {i+1} to Gemini")
-
-                    # print(filepath)
-                    filepath = "./harvard.wav"
-                    audio_file = genai.upload_file(filepath)
-
-
-
-                    prompt = PromptGenerator.generate_summary_prompt()
-                    #print timestamps
-                    print(timestamps)
-                    timestamps_desc = "\n".join(
-                        [f"- At {t['timestamp']} seconds: score = {t['score']}\n." for t in timestamps]
-                    )
-                    # print(prompt)
-                    #add timestamps to prompt
-                    prompt = prompt + timestamps_desc
-                    print(prompt)
-
+                    logger.warning(f"Failed to cleanup segment file {filepath}: {e}")
 
-                
-                    
-                    logger.info(f"Getting analysis for segment {i+1}")
-                    try:
-                        response = self.model.generate_content([prompt, audio_file])
-
-
-                
-                        # Handle response directly
-                        response.resolve()  # Ensure generation is complete
-                        # Extract text response
-                        raw_summary = response.text
-                        # print("Raw Summary:", raw_summary)
-
-                        # strip everything until the first '{' character everything after the last '}' character
-
-                        raw_summary = raw_summary[raw_summary.find('{'):]
-                        raw_summary = raw_summary[:raw_summary.rfind('}')+1]
-                        # print("Raw Summary:", raw_summary)
-
-                        # Parse the JSON string into a dictionary
-                        summary_data = json.loads(raw_summary)
-
-                        # Store in a hashmap
-                        hashmap = {
-                            'topic': summary_data['topic'],
-                            'summary': summary_data['summary'],
-                            'key_points': summary_data['key_points']
-                        }
-
-                        print("Hashmap:", hashmap)
-                        
-
-                        # Append the hashmap to summaries if needed
-                        summaries.append(hashmap)
-
-                       
-                        
-                        logger.info(f"Successfully got analysis for segment {i+1}")
-                    except Exception as e:
-                        logger.error(f"Gemini API error: {str(e)}")
-                        summaries.append(f"Error analyzing segment {i + 1}: API error")
-                    
-                    logger.info(f"Segment {i+1} processed in {time.time() - segment_start:.2f}s")
-
-                finally:
-                    try:
-                        if os.path.exists(filepath):
-                            os.chmod(filepath, 0o666)
-                            os.unlink(filepath)
-                            logger.info(f"Cleaned up segment file: {filepath}")
-                    except Exception as e:
-                        logger.warning(f"Failed to cleanup segment file {filepath}: {e}")
-
-            except Exception as e:
-                logger.error(f"Error processing segment {i+1}: {str(e)}")
-                summaries.append(f"Could not analyze segment {i + 1}: {str(e)}")
-        
+        summaries = await asyncio.gather(*(summarize_segment(i, filepath) for i, filepath in enumerate(segments)))
         return summaries if summaries else ["No audio segments could be analyzed"]
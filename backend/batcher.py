@@ -0,0 +1,53 @@
+import asyncio
+import logging
+from pipeline import BatchPipeline
+
+BATCH_WINDOW = 0.005  # Seconds to collect ticks that share a deadline before running them
+
+class DSPBatcher:
+    """Collects the sessions' ticks and runs them as one batched pipeline call.
+
+    With aligned schedulers every session at a rate wakes on the same
+    deadline, so the ticks submitted within BATCH_WINDOW of the first one
+    make up one batch. The batch runs in the default executor, like a single
+    session's pipeline does, and each session gets its own result back.
+    """
+    def __init__(self, window: float = BATCH_WINDOW):
+        self.window = window
+        self.pipeline = BatchPipeline()
+        self.pending = []
+        self.flush_handle = None
+
+    async def process(self, pipeline, raw_data, timestamps, aux=None, new_ppg=None, after=None):
+        """Result of pipeline.process for this tick; after(result) runs in the executor thread"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append(((pipeline, raw_data, timestamps, aux, new_ppg), after, future))
+        if self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.window, lambda: asyncio.ensure_future(self.flush()))
+        return await future
+
+    async def flush(self):
+        batch, self.pending = self.pending, []
+        self.flush_handle = None
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(None, self.run, batch)
+        except Exception as e:
+            logging.error(f"Batched processing failed: {e}")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():  # The session may have been cancelled meanwhile
+                future.set_result(result)
+
+    def run(self, batch):
+        results = self.pipeline.process([job for job, _, _ in batch])
+        for (_, after, _), result in zip(batch, results):
+            if after:
+                after(result)
+        return results
+
+    def stats(self):
+        return self.pipeline.stats()
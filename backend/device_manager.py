@@ -1,24 +1,71 @@
 import brainflow
-from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds, BrainFlowError
+import numpy as np
+from brainflow.board_shim import BoardShim, BrainFlowInputParams, BoardIds, BrainFlowError, BrainFlowPresets
+from ring_buffer import RingBuffer
+from precision import signal_dtype
 import logging
 
+AUX_BUFFER_SECONDS = 30  # Enough history for HRV windows
+PPG_WINDOW_SECONDS = 10
+IMU_WINDOW_SECONDS = 1
+# Board description keys for the auxiliary streams, found in whichever preset carries them
+AUX_STREAM_KEYS = {'acc': 'accel_channels', 'gyro': 'gyro_channels', 'ppg': 'ppg_channels'}
+EEG_CHANNEL_COUNT = 4  # TP9, AF7, AF8, TP10
+PACKAGE_NUM_WRAP = 256
+GAP_TOLERANCE = 1.5  # Sample periods between consecutive timestamps before it counts as a gap
+
 class DeviceManager:
-    def __init__(self):
+    def __init__(self, board_id: int = None, params: dict = None, instance: str = "", dtype=None):
+        """With no board_id, try a Muse 2 and fall back to the synthetic board.
+
+        params sets BrainFlowInputParams fields (serial_port, mac_address, file, ...).
+        instance tells synthetic boards apart, since BrainFlow allows one board per set of params.
+        dtype is the EEG sample dtype returned by get_data (see precision.signal_dtype).
+        """
         logging.basicConfig(level=logging.INFO)
         self.connected = False
         self.board = None
+        self.board_id = None
+        self.aux_streams = {}
+        self.eeg_rows = list(range(EEG_CHANNEL_COUNT))
+        self.fs = 256
+        self.dtype = signal_dtype(dtype)
+        self.last_timestamp = None
+        self.last_package_num = None
+
+        # Continuity counters for the drained EEG stream
+        self.gap_count = 0
+        self.samples_lost = 0
+        self.duplicate_count = 0
+
+        params = params or {}
+        if board_id is None:
+            # Try Muse 2 first
+            if not self._connect_muse(params):
+                # If Muse fails, try synthetic board
+                self._connect_synthetic(instance)
+        elif board_id == BoardIds.MUSE_2_BOARD.value:
+            self._connect_muse(params)
+        elif board_id == BoardIds.SYNTHETIC_BOARD.value:
+            self._connect_synthetic(instance)
+        else:
+            self._connect_board(board_id, params)
+        if self.connected:
+            self._init_eeg_channels()
+            self._init_aux_streams()
 
-        # Try Muse 2 first
-        if not self._connect_muse():
-            # If Muse fails, try synthetic board
-            self._connect_synthetic()
+    def _input_params(self, params: dict):
+        input_params = BrainFlowInputParams()
+        for key, value in params.items():
+            setattr(input_params, key, value)
+        return input_params
 
-    def _connect_muse(self):
+    def _connect_muse(self, params: dict = None):
         try:
-            params = BrainFlowInputParams()
-            params.serial_port = 'COM5'
+            params = self._input_params({'serial_port': 'COM5', **(params or {})})
             board_id = BoardIds.MUSE_2_BOARD.value
 
+            self.board_id = board_id
             self.board = BoardShim(board_id, params)
             self.board.prepare_session()
 
@@ -35,11 +82,13 @@ class DeviceManager:
                 self._cleanup_board()
             return False
 
-    def _connect_synthetic(self):
+    def _connect_synthetic(self, instance: str = ""):
         try:
             logging.info("Creating synthetic board session.")
             synthetic_params = BrainFlowInputParams()
-            self.board = BoardShim(BoardIds.SYNTHETIC_BOARD.value, synthetic_params)
+            synthetic_params.other_info = instance
+            self.board_id = BoardIds.SYNTHETIC_BOARD.value
+            self.board = BoardShim(self.board_id, synthetic_params)
             self.board.prepare_session()
             self.board.start_stream()
             logging.info("Synthetic board session started.")
@@ -52,6 +101,25 @@ class DeviceManager:
             self.connected = False
             return False
 
+    def _connect_board(self, board_id: int, params: dict):
+        try:
+            logging.info(f"Creating board {board_id} session.")
+            self.board_id = board_id
+            self.board = BoardShim(board_id, self._input_params(params))
+            self.board.prepare_session()
+            # Playback and streaming boards carry their master board's channel layout
+            self.board_id = self.board.get_board_id()
+            self.board.start_stream()
+            logging.info(f"Board {board_id} session started.")
+            self.connected = True
+            return True
+        except BrainFlowError as e:
+            logging.error(f"Failed to create board {board_id}: {e}")
+            if self.board:
+                self._cleanup_board()
+            self.connected = False
+            return False
+
     def _cleanup_board(self):
         try:
             if self.board.is_prepared():
@@ -60,17 +128,162 @@ class DeviceManager:
         except BrainFlowError as e:
             logging.error(f"Error cleaning up board: {e}")
 
+    def _init_eeg_channels(self):
+        self.eeg_rows = BoardShim.get_eeg_channels(self.board_id)[:EEG_CHANNEL_COUNT]
+        self.fs = BoardShim.get_sampling_rate(self.board_id)
+        self.timestamp_row = BoardShim.get_timestamp_channel(self.board_id)
+        self.package_row = BoardShim.get_package_num_channel(self.board_id)
+
+    def _init_aux_streams(self):
+        """Locate PPG, accelerometer and gyroscope rows in the board's presets.
+
+        The Muse 2 streams them in the auxiliary (IMU, 52 Hz) and ancillary
+        (PPG, 64 Hz) presets; the synthetic board carries them in the default one.
+        """
+        for preset in sorted(BoardShim.get_board_presets(self.board_id)):
+            descr = BoardShim.get_board_descr(self.board_id, preset)
+            for name, key in AUX_STREAM_KEYS.items():
+                if key not in descr or name in self.aux_streams:
+                    continue
+                fs = descr['sampling_rate']
+                self.aux_streams[name] = {
+                    'preset': preset,
+                    'rows': descr[key],
+                    'timestamp_row': descr['timestamp_channel'],
+                    'fs': fs,
+                    'buffer': RingBuffer(len(descr[key]), int(fs * AUX_BUFFER_SECONDS)),
+                }
+
+    def _poll_aux(self, default_data):
+        """Move new auxiliary samples into their ring buffers in one pass over all presets"""
+        drained = {BrainFlowPresets.DEFAULT_PRESET: default_data}
+        for stream in self.aux_streams.values():
+            preset = stream['preset']
+            if preset not in drained:
+                drained[preset] = self.board.get_board_data(preset=preset)
+            data = drained[preset]
+            if data.shape[1]:
+                stream['buffer'].write(data[stream['rows']], data[stream['timestamp_row']])
+
+    def get_aux_data(self, end_ts=None):
+        """PPG, accelerometer and gyroscope windows ending at an EEG timestamp.
+
+        Returns the shapes calculate_comprehensive_score expects: ppg as a 1-D
+        array, acc and gyro as (samples, 3). Missing streams are empty lists.
+        """
+        end_ts = self.last_timestamp if end_ts is None else end_ts
+        aux = {'ppg': [], 'acc': [], 'gyro': []}
+        if end_ts is None:
+            return aux
+        for name, seconds in (('ppg', PPG_WINDOW_SECONDS), ('acc', IMU_WINDOW_SECONDS), ('gyro', IMU_WINDOW_SECONDS)):
+            stream = self.aux_streams.get(name)
+            if not stream:
+                continue
+            data, _ = stream['buffer'].window(end_ts - seconds, end_ts)
+            aux[name] = self._ppg_row(data) if name == 'ppg' else data.T
+        return aux
+
+    def _ppg_row(self, data):
+        # Muse 2 reports ambient, infrared and red; infrared carries the pulse best
+        return data[min(1, len(data) - 1)]
+
+    @property
+    def ppg_fs(self):
+        stream = self.aux_streams.get('ppg')
+        return stream['fs'] if stream else None
+
+    def read_new_ppg(self, cursor=0):
+        """PPG samples buffered since cursor, for incremental consumers like StreamingHRV"""
+        stream = self.aux_streams.get('ppg')
+        if not stream:
+            return [], cursor
+        data, _, cursor = stream['buffer'].read_since(cursor)
+        return self._ppg_row(data), cursor
+
+    def get_aligned(self, name, timestamps):
+        """An auxiliary stream resampled onto EEG sample timestamps"""
+        return self.aux_streams[name]['buffer'].interpolate(timestamps)
+
+    def _empty(self):
+        return np.empty((len(self.eeg_rows), 0), dtype=self.dtype), np.empty(0)
+
+    def _check_continuity(self, package_nums, timestamps):
+        """Mask of samples not seen before; counts gaps since the previous read"""
+        if self.last_timestamp is None:
+            prev_ts, prev_pkg = timestamps[0] - 1.0 / self.fs, package_nums[0] - 1
+        else:
+            prev_ts, prev_pkg = self.last_timestamp, self.last_package_num
+
+        # Duplicates: anything not strictly after every sample already returned
+        running_max = np.maximum.accumulate(np.concatenate([[prev_ts], timestamps]))[:-1]
+        fresh = timestamps > running_max
+        self.duplicate_count += int(np.count_nonzero(~fresh))
+
+        # Gaps: the package counter should step by one per sample; timestamps
+        # catch gaps longer than a full counter wrap
+        ts = np.concatenate([[prev_ts], timestamps[fresh]])
+        pkg = np.concatenate([[prev_pkg], package_nums[fresh]])
+        lost_by_package = (np.diff(pkg) - 1) % PACKAGE_NUM_WRAP
+        dt = np.diff(ts) * self.fs
+        lost_by_time = np.where(dt > GAP_TOLERANCE, np.rint(dt) - 1, 0)
+        lost = np.maximum(lost_by_package, lost_by_time)
+        self.gap_count += int(np.count_nonzero(lost))
+        self.samples_lost += int(lost.sum())
+        return fresh
+
     def get_data(self):
+        """Drain every sample that arrived since the previous call.
+
+        Returns (eeg, timestamps): eeg is (channels, new_samples) and each
+        sample is returned exactly once; gap_count, samples_lost and
+        duplicate_count record any discontinuity in the stream.
+        """
         if self.connected:
             try:
-                data = self.board.get_current_board_data(100)
-                return data
+                data = self.board.get_board_data()
+                if data.shape[1] == 0:
+                    return self._empty()
+                timestamps = data[self.timestamp_row]
+                fresh = self._check_continuity(data[self.package_row], timestamps)
+                data = data[:, fresh]
+                if data.shape[1] == 0:
+                    return self._empty()
+                self.last_timestamp = data[self.timestamp_row, -1]
+                self.last_package_num = data[self.package_row, -1]
+                self._poll_aux(data)
+                # Timestamps stay float64: epoch seconds need more than float32's 24 bits
+                return data[self.eeg_rows].astype(self.dtype), data[self.timestamp_row]
             except BrainFlowError as e:
                 logging.error(f"Error fetching data: {e}")
                 self.connected = False
-                return []
+                return self._empty()
         else:
-            return []
+            return self._empty()
+
+    def reset(self):
+        """Discard buffered samples and counters so the board can serve a new session"""
+        if self.connected:
+            try:
+                for preset in BoardShim.get_board_presets(self.board_id):
+                    self.board.get_board_data(preset=preset)
+            except BrainFlowError as e:
+                logging.error(f"Error flushing board: {e}")
+                self.connected = False
+        self.last_timestamp = None
+        self.last_package_num = None
+        self.gap_count = 0
+        self.samples_lost = 0
+        self.duplicate_count = 0
+        self.aux_streams = {}
+        if self.connected:
+            self._init_aux_streams()
+
+    def get_stats(self):
+        return {
+            "gaps": self.gap_count,
+            "samples_lost": self.samples_lost,
+            "duplicates": self.duplicate_count,
+        }
 
     def stop(self):
         if self.connected:
@@ -0,0 +1,261 @@
+import os
+import json
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+from brainflow.board_shim import BoardIds
+from device_manager import DeviceManager
+from synthetic_source import SyntheticSource, SYNTHETIC_SOURCE
+
+# Device health states
+PREPARING = "preparing"
+READY = "ready"
+IN_USE = "in_use"
+FAILED = "failed"
+
+DEVICE_LEASE_TTL = 10  # Seconds a worker's claim on a configured device outlives its last renewal
+DEVICE_LEASE_RENEW_INTERVAL = 3
+
+class NoDeviceAvailable(Exception):
+    """Every configured device is leased to a session or failed"""
+
+class DeviceRegistry:
+    """Boards this server can stream from, prepared in the background and leased to sessions.
+
+    Devices come from a JSON config (STUDYAMP_DEVICES):
+
+        {"devices": [
+            {"device_id": "muse-a", "board": "MUSE_2_BOARD", "serial_port": "COM5"},
+            {"device_id": "muse-b", "board": "MUSE_2_BOARD", "mac_address": "00:55:DA:B0:00:01"},
+            {"device_id": "synthetic", "board": "SYNTHETIC_BOARD", "count": 30},
+            {"device_id": "sim", "board": "SYNTHETIC_SOURCE", "count": 100, "params": {"seed": 1}}
+        ]}
+
+    SYNTHETIC_SOURCE devices are in-process NumPy generators (see
+    synthetic_source.py); their params are SyntheticSource arguments.
+
+    Without a config every session gets its own on-demand device (Muse 2,
+    falling back to the synthetic board), as before.
+
+    With a shared state backend every worker reads the same config, so a
+    configured device is claimed through a lease on "device:<id>" before a
+    worker opens it. Devices are claimed when a session needs one and kept,
+    prepared, for the worker's later sessions; a dead worker's claims expire
+    after DEVICE_LEASE_TTL and its devices can be claimed by others. Without
+    one (a single worker) every device is claimed and prepared at startup.
+    """
+    def __init__(self, config_path: str = None, max_workers: int = 4, state=None, owner: str = None):
+        self.devices: Dict[str, Dict] = {}  # Devices this worker has claimed
+        self.lost: Dict[str, Dict] = {}  # Claims taken over while a session used the device, until it is released
+        self.configured: Dict[str, Tuple[Optional[int], dict]] = {}  # Device id -> (board id, params)
+        self.state = state
+        self.owner = owner
+        self.shared = state is not None and state.shared
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="device-prep")
+        self.on_demand = True
+        self.on_demand_count = 0
+        self.closed = False
+        config_path = config_path or os.getenv('STUDYAMP_DEVICES')
+        if config_path:
+            self.load_config(config_path)
+
+    def load_config(self, config_path: str):
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+        self.on_demand = config.get('on_demand', False)
+        for entry in config.get('devices', []):
+            entry = dict(entry)
+            device_id = entry.pop('device_id')
+            count = entry.pop('count', 1)
+            board = entry.pop('board', None)
+            board_id = BoardIds[board].value if isinstance(board, str) and board != SYNTHETIC_SOURCE else board
+            params = entry.pop('params', {})
+            params.update(entry)  # serial_port, mac_address, ... as shorthand
+            for i in range(count):
+                self.configured[device_id if count == 1 else f"{device_id}-{i + 1}"] = (board_id, params)
+        logging.info(f"Loaded {len(self.configured)} devices from {config_path}")
+
+    def _add(self, device_id: str, board_id: Optional[int], params: dict, on_demand: bool = False):
+        self.devices[device_id] = {
+            "device_id": device_id,
+            "board_id": board_id,
+            "params": params,
+            "on_demand": on_demand,
+            "state": PREPARING,
+            "session_id": None,
+            "manager": None,
+            "error": None,
+            "future": None,
+        }
+
+    def start(self):
+        """Prepare every configured board in the background, or start renewing claims when workers share them"""
+        if self.shared:
+            threading.Thread(target=self._renew_claims, daemon=True, name="device-claims").start()
+            return
+        for device_id, (board_id, params) in self.configured.items():
+            self._add(device_id, board_id, params)
+            self._schedule_prepare(device_id)
+
+    def _claim(self) -> Optional[str]:
+        """Claim a configured device no worker holds; called under self.lock"""
+        for device_id, (board_id, params) in self.configured.items():
+            if device_id not in self.devices and self.state.acquire_lease(f"device:{device_id}", self.owner, DEVICE_LEASE_TTL):
+                logging.info(f"Claimed device {device_id}")
+                self._add(device_id, board_id, params)
+                return device_id
+        return None
+
+    def _renew_claims(self):
+        while not self.closed:
+            time.sleep(DEVICE_LEASE_RENEW_INTERVAL)
+            with self.lock:
+                devices = list(self.devices.items())
+            for device_id, device in devices:
+                if device["on_demand"] or self.closed:
+                    continue
+                if not self.state.acquire_lease(f"device:{device_id}", self.owner, DEVICE_LEASE_TTL):
+                    self._lose(device_id)
+
+    def _lose(self, device_id: str):
+        """Stop using a device whose claim another worker took (e.g. after this one stalled past the TTL).
+
+        It is no longer allocated; a session streaming from it sees holds()
+        turn False and ends, and release() then closes the board.
+        """
+        with self.lock:
+            device = self.devices.pop(device_id, None)
+            if device is None:
+                return
+            in_use = device["session_id"] is not None
+            if in_use:
+                self.lost[device_id] = device
+        if in_use:
+            logging.error(f"Claim on device {device_id} was taken by another worker; ending session {device['session_id']}")
+        else:
+            logging.error(f"Claim on device {device_id} was taken by another worker; closing it")
+            if device["manager"]:
+                self.executor.submit(device["manager"].stop)
+
+    def holds(self, device_id: str) -> bool:
+        """False once the device's claim has been lost"""
+        return device_id in self.devices
+
+    def _schedule_prepare(self, device_id: str):
+        device = self.devices[device_id]
+        device["state"] = PREPARING
+        device["future"] = self.executor.submit(self._prepare, device_id)
+
+    def _prepare(self, device_id: str) -> Optional[DeviceManager]:
+        device = self.devices[device_id]
+        if device["board_id"] == SYNTHETIC_SOURCE:
+            manager = SyntheticSource(**device["params"], instance=device_id)
+        else:
+            manager = DeviceManager(device["board_id"], device["params"], instance=device_id)
+        with self.lock:
+            device["manager"] = manager
+            if not manager.connected:
+                device["state"] = FAILED
+                device["error"] = "Unable to connect"
+            else:
+                device["error"] = None
+                if device["session_id"] is None:
+                    device["state"] = READY
+        return manager
+
+    def allocate(self, session_id: str) -> str:
+        """Lease a free device to a session; preparing devices are handed out after ready ones"""
+        with self.lock:
+            for wanted in (READY, PREPARING):
+                for device in self.devices.values():
+                    if device["state"] == wanted and device["session_id"] is None:
+                        device["session_id"] = session_id
+                        if wanted == READY:
+                            device["state"] = IN_USE
+                        return device["device_id"]
+            device_id = self._claim() if self.shared else None
+            if device_id:
+                failed = None
+                self.devices[device_id]["session_id"] = session_id
+            elif not self.on_demand:
+                failed = [d["device_id"] for d in self.devices.values() if d["state"] == FAILED and d["future"].done()]
+            else:
+                failed = None
+                self.on_demand_count += 1
+                device_id = f"device_{self.on_demand_count}"
+                self._add(device_id, None, {}, on_demand=True)
+                self.devices[device_id]["session_id"] = session_id
+        if failed is not None:
+            # Give failed boards another try so they can serve later sessions
+            for device_id in failed:
+                self._schedule_prepare(device_id)
+            raise NoDeviceAvailable("No free device")
+        self._schedule_prepare(device_id)
+        return device_id
+
+    async def wait_ready(self, device_id: str) -> Optional[DeviceManager]:
+        """The device's DeviceManager once preparation finishes (None if it failed)"""
+        device = self.devices.get(device_id) or self.lost[device_id]
+        manager = await asyncio.wrap_future(device["future"])
+        with self.lock:
+            if not manager.connected or device_id not in self.devices:
+                return None
+            device["state"] = IN_USE
+        await asyncio.get_running_loop().run_in_executor(self.executor, manager.reset)
+        return manager
+
+    def release(self, device_id: str):
+        """Return a device to the pool at session end; unhealthy boards are re-prepared"""
+        device = self.devices.get(device_id)
+        if device is None:
+            lost = self.lost.pop(device_id, None)
+            if lost and lost["manager"]:
+                self.executor.submit(lost["manager"].stop)
+            return
+        if self.closed:
+            return  # Boards are stopped by shutdown()
+        manager = device["manager"]
+        if device["on_demand"]:
+            # On-demand devices live only as long as their session
+            with self.lock:
+                self.devices.pop(device_id, None)
+            if manager:
+                self.executor.submit(manager.stop)
+            return
+        with self.lock:
+            device["session_id"] = None
+            if manager and manager.connected:
+                device["state"] = READY
+                return
+        logging.warning(f"Device {device_id} unhealthy after session, preparing again")
+        if manager:
+            self.executor.submit(manager.stop)
+        self._schedule_prepare(device_id)
+
+    def status(self):
+        return [
+            {
+                "device_id": device["device_id"],
+                "board_id": device["board_id"],
+                "state": device["state"],
+                "session_id": device["session_id"],
+                "error": device["error"],
+            }
+            for device in self.devices.values()
+        ]
+
+    def shutdown(self):
+        self.closed = True
+        for device in self.lost.values():
+            if device["manager"]:
+                device["manager"].stop()  # Its lease belongs to another worker now
+        for device in self.devices.values():
+            if device["manager"]:
+                device["manager"].stop()
+            if self.shared and not device["on_demand"]:
+                self.state.release_lease(f"device:{device['device_id']}", self.owner)
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,196 @@
+import io
+import json
+import zipfile
+from typing import Iterator, List
+import numpy as np
+from precision import dumps, signal_dtype
+from recorder import EEGRecording
+from rollups import RESOLUTIONS
+
+# Format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "npz": ("application/octet-stream", "npz"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+ATTENTION_CHUNK_ROWS = 3600
+EEG_CHUNK_SECONDS = 10
+
+class ExportUnavailable(Exception):
+    """The format needs an optional package that is not installed"""
+
+class _Sink(io.RawIOBase):
+    """Write-only, unseekable buffer that an export drains after every chunk"""
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+class SessionExporter:
+    """Streams sessions out of the store one chunk at a time.
+
+    Each session contributes its metadata, its attention timeline (the 1 s
+    rollup: t, mean, min, max, count), its attention drops and, when it was
+    recorded, its EEG. Nothing larger than one chunk is held in memory, so
+    the generators can be handed to a StreamingResponse, which iterates them
+    in a worker thread rather than on the event loop.
+    """
+    def __init__(self, store, data_dir: str, session_ids: List[str], include_eeg: bool = True):
+        self.store = store
+        self.data_dir = data_dir
+        self.session_ids = session_ids
+        self.include_eeg = include_eeg
+
+    def stream(self, format: str) -> Iterator[bytes]:
+        if format == "arrow":
+            try:
+                import pyarrow
+            except ImportError:
+                raise ExportUnavailable("Arrow export needs pyarrow (pip install pyarrow)")
+            return self.arrow(pyarrow)
+        return {"ndjson": self.ndjson, "npz": self.npz}[format]()
+
+    def _sessions(self):
+        # Scores come from the rollups, so the full shard, dominated by the score list, is never read
+        for session_id in self.session_ids:
+            info = self.store.load_info(session_id)
+            if info is None:
+                continue
+            drops = info.pop('attention_drops', None) or []
+            timeline = self.store.get_rollups(session_id).levels[RESOLUTIONS[0]]
+            if info.get('status') != 'ended' and len(timeline):
+                # The metadata file is not rewritten as the average moves; the rollups are current
+                info['average_attention'] = sum(timeline.sums) / sum(timeline.counts)
+            recording = EEGRecording.open(self.data_dir, session_id) if self.include_eeg else None
+            yield session_id, info, timeline, drops, recording
+
+    def _eeg_chunk_samples(self, recording):
+        return max(1, int(recording.fs * EEG_CHUNK_SECONDS))
+
+    def ndjson(self) -> Iterator[bytes]:
+        """One JSON object per line, tagged by "table"; EEG comes one second per line"""
+        for session_id, info, timeline, drops, recording in self._sessions():
+            yield (json.dumps({"table": "session", **info}) + "\n").encode()
+            for lo in range(0, len(timeline), ATTENTION_CHUNK_ROWS):
+                hi = min(lo + ATTENTION_CHUNK_ROWS, len(timeline))
+                yield "".join(
+                    json.dumps({
+                        "table": "attention", "session_id": session_id, "t": timeline.starts[i],
+                        "mean": timeline.sums[i] / timeline.counts[i], "min": timeline.mins[i],
+                        "max": timeline.maxs[i], "count": timeline.counts[i],
+                    }) + "\n"
+                    for i in range(lo, hi)
+                ).encode()
+            if drops:
+                yield "".join(
+                    json.dumps({"table": "drop", "session_id": session_id, **drop}) + "\n" for drop in drops
+                ).encode()
+            if recording:
+                second = max(1, int(recording.fs))
+                for data, timestamps in recording.chunks(self._eeg_chunk_samples(recording)):
+                    yield "".join(
+                        dumps({
+                            "table": "eeg", "session_id": session_id, "kind": recording.kind,
+                            "t": timestamps[lo:lo + second], "samples": data[lo:lo + second],
+                        }) + "\n"
+                        for lo in range(0, len(timestamps), second)
+                    ).encode()
+
+    def npz(self) -> Iterator[bytes]:
+        """A NumPy .npz (zip of .npy) with arrays named <session_id>/<name>, written entry by entry"""
+        sink = _Sink()
+        with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+            for session_id, info, timeline, drops, recording in self._sessions():
+                arrays = {
+                    "session": np.array(json.dumps(info)),
+                    "attention_t": np.array(timeline.starts, dtype=np.float64),
+                    "attention_mean": np.array(timeline.sums) / np.maximum(timeline.counts, 1),
+                    "attention_min": np.array(timeline.mins, dtype=np.float64),
+                    "attention_max": np.array(timeline.maxs, dtype=np.float64),
+                    "attention_count": np.array(timeline.counts, dtype=np.int64),
+                    "drops": np.array([json.dumps(drop) for drop in drops], dtype=str),
+                }
+                for name, array in arrays.items():
+                    with archive.open(f"{session_id}/{name}.npy", 'w', force_zip64=True) as entry:
+                        np.lib.format.write_array(entry, array, allow_pickle=False)
+                    yield sink.drain()
+                if recording:
+                    chunk = self._eeg_chunk_samples(recording)
+                    for name, dtype, shape, column in (
+                        ("eeg", recording.dtype, (recording.n_samples, recording.channels), 0),
+                        ("eeg_t", np.dtype(np.float64), (recording.n_samples,), 1),
+                    ):
+                        with archive.open(f"{session_id}/{name}.npy", 'w', force_zip64=True) as entry:
+                            np.lib.format.write_array_header_2_0(entry, {
+                                "descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": shape})
+                            for pair in recording.chunks(chunk):
+                                entry.write(pair[column].tobytes())
+                                yield sink.drain()
+        yield sink.drain()
+
+    def arrow(self, pa) -> Iterator[bytes]:
+        """An Arrow IPC stream with one nullable column set shared by every table"""
+        value_type = pa.from_numpy_dtype(signal_dtype())
+        schema = pa.schema([
+            ("session_id", pa.string()),
+            ("table", pa.string()),
+            ("t", pa.float64()),
+            ("mean", pa.float64()),
+            ("min", pa.float64()),
+            ("max", pa.float64()),
+            ("count", pa.int64()),
+            ("eeg", pa.list_(value_type)),
+            ("info", pa.string()),  # JSON for session and drop rows
+        ])
+
+        def batch(session_id, table, n, **columns):
+            arrays = []
+            for field in schema:
+                if field.name == "session_id":
+                    arrays.append(pa.array([session_id] * n, pa.string()))
+                elif field.name == "table":
+                    arrays.append(pa.array([table] * n, pa.string()))
+                elif field.name in columns:
+                    arrays.append(columns[field.name])
+                else:
+                    arrays.append(pa.nulls(n, field.type))
+            return pa.record_batch(arrays, schema=schema)
+
+        sink = _Sink()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for session_id, info, timeline, drops, recording in self._sessions():
+                writer.write_batch(batch(session_id, "session", 1, info=pa.array([json.dumps(info)])))
+                for lo in range(0, len(timeline), ATTENTION_CHUNK_ROWS):
+                    hi = min(lo + ATTENTION_CHUNK_ROWS, len(timeline))
+                    counts = np.array(timeline.counts[lo:hi], dtype=np.int64)
+                    writer.write_batch(batch(
+                        session_id, "attention", hi - lo,
+                        t=pa.array(np.array(timeline.starts[lo:hi], dtype=np.float64)),
+                        mean=pa.array(np.array(timeline.sums[lo:hi]) / counts),
+                        min=pa.array(np.array(timeline.mins[lo:hi], dtype=np.float64)),
+                        max=pa.array(np.array(timeline.maxs[lo:hi], dtype=np.float64)),
+                        count=pa.array(counts)))
+                    yield sink.drain()
+                if drops:
+                    writer.write_batch(batch(
+                        session_id, "drop", len(drops), info=pa.array([json.dumps(drop) for drop in drops])))
+                if recording:
+                    for data, timestamps in recording.chunks(self._eeg_chunk_samples(recording)):
+                        n = len(timestamps)
+                        offsets = pa.array(np.arange(0, (n + 1) * recording.channels, recording.channels, dtype=np.int32))
+                        values = pa.array(data.astype(signal_dtype(), copy=False).ravel())
+                        writer.write_batch(batch(
+                            session_id, "eeg", n, t=pa.array(timestamps),
+                            eeg=pa.ListArray.from_arrays(offsets, values)))
+                        yield sink.drain()
+        yield sink.drain()
@@ -0,0 +1,61 @@
+import json
+import time
+import numpy as np
+from precision import to_wire
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class FrameEncoder:
+    """Encodes each tick's frame once, straight from the filtered array.
+
+    The text is the same JSON that EEGData.model_dump() + send_json produced
+    (same keys, float device_status values), built without pydantic
+    validation or an intermediate nested list when orjson is available.
+    Stream frames also lead with their sequence number, "seq", and quality
+    tier, "tier"; frames at the "score" tier have no EEG channels.
+    """
+    def __init__(self):
+        self.backend = "orjson" if orjson else "json"
+        self.frames = 0
+        self.bytes = 0
+        self.seconds = 0.0
+
+    def encode(self, timestamp: float, attention_score: float, eeg_channels: np.ndarray,
+               device_status: dict, artifacts: dict, hrv: dict, seq: int = None, tier: str = None) -> str:
+        start = time.perf_counter()
+        frame = {} if seq is None else {"seq": seq}
+        if tier is not None:
+            frame["tier"] = tier
+        if eeg_channels is None:
+            eeg_channels = []
+        elif orjson:
+            eeg_channels = np.ascontiguousarray(eeg_channels)
+        else:
+            eeg_channels = to_wire(eeg_channels)
+        frame.update({
+            "timestamp": float(timestamp),
+            "attention_score": float(attention_score),
+            "eeg_channels": eeg_channels,
+            "device_status": {key: float(value) for key, value in device_status.items()},
+            "artifacts": {key: bool(value) for key, value in artifacts.items()},
+            "hrv": {key: float(value) for key, value in hrv.items()},
+        })
+        if orjson:
+            text = orjson.dumps(frame, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+        else:
+            text = json.dumps(frame, separators=(",", ":"))
+        self.seconds += time.perf_counter() - start
+        self.frames += 1
+        self.bytes += len(text)
+        return text
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "frames": self.frames,
+            "encode_us_avg": 1e6 * self.seconds / self.frames if self.frames else 0.0,
+            "bytes_avg": self.bytes / self.frames if self.frames else 0.0,
+        }
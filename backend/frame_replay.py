@@ -0,0 +1,60 @@
+import os
+import math
+from array import array
+import numpy as np
+from collections import deque
+from typing import List, Optional, Tuple
+
+DEFAULT_REPLAY_SECONDS = 15.0
+MAX_CHECKPOINTS = 512  # Timestamps kept per session for frames that left the ring
+
+def replay_capacity(rate_hz: float) -> int:
+    """Frames kept per session: STUDYAMP_REPLAY_SECONDS (default 15) of the session's frame rate"""
+    seconds = float(os.getenv('STUDYAMP_REPLAY_SECONDS', DEFAULT_REPLAY_SECONDS))
+    return max(1, math.ceil(seconds * rate_hz))
+
+class ReplayBuffer:
+    """The most recent encoded frames of one session, for clients resuming with ?since=<seq>.
+
+    Sequence numbers start at 1. Only the last `capacity` frames are kept.
+    Older frames leave a timestamp checkpoint every `stride` seqs, so a gap
+    older than the ring can still be mapped to a time range, interpolated
+    between checkpoints, and summarized from the rollups. When the
+    checkpoints reach MAX_CHECKPOINTS every other one is dropped and the
+    stride doubles, so memory stays bounded however long the session runs.
+    """
+    def __init__(self, capacity: int):
+        self.frames = deque(maxlen=capacity)  # (seq, timestamp, text)
+        self.last_seq = 0
+        self.stride = 1
+        self.checkpoint_seqs = array('q')  # Seqs 1, 1 + stride, 1 + 2 * stride, ...
+        self.checkpoint_times = array('d')
+
+    def append(self, seq: int, timestamp: float, text: str):
+        self.last_seq = seq
+        self.frames.append((seq, timestamp, text))
+        if (seq - 1) % self.stride == 0:
+            self.checkpoint_seqs.append(seq)
+            self.checkpoint_times.append(timestamp)
+            if len(self.checkpoint_seqs) > MAX_CHECKPOINTS:
+                self.checkpoint_seqs = self.checkpoint_seqs[::2]
+                self.checkpoint_times = self.checkpoint_times[::2]
+                self.stride *= 2
+
+    def timestamp(self, seq: int) -> Optional[float]:
+        """Exact for frames in the ring, interpolated between checkpoints for older ones"""
+        if not 1 <= seq <= self.last_seq:
+            return None
+        first_kept = self.frames[0][0]
+        if seq >= first_kept:
+            return self.frames[seq - first_kept][1]
+        seqs = np.append(np.frombuffer(self.checkpoint_seqs, dtype=np.int64), first_kept)
+        times = np.append(np.frombuffer(self.checkpoint_times), self.frames[0][1])
+        return float(np.interp(seq, seqs, times))
+
+    def since(self, seq: int) -> Tuple[Optional[Tuple[int, int]], List[Tuple[int, str]]]:
+        """(missed seq range no longer in the ring or None, frames after seq still in it)"""
+        frames = [(frame_seq, text) for frame_seq, _, text in self.frames if frame_seq > seq]
+        first_kept = self.frames[0][0] if self.frames else self.last_seq + 1
+        gap = (seq + 1, first_kept - 1) if seq + 1 < first_kept else None
+        return gap, frames
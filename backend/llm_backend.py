@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GEMINI_MODEL = 'gemini-1.5-flash'
+DEFAULT_CONCURRENCY = 4
+DEFAULT_TIMEOUT = 120.0  # Seconds per call, upload included
+DEFAULT_RETRIES = 3
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+
+class LLMError(Exception):
+    """A failed model call; retryable errors are worth another attempt"""
+    def __init__(self, message: str, retryable: bool = False, retry_after: float = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+class RateLimited(LLMError):
+    def __init__(self, message: str = "Rate limited", retry_after: float = None):
+        super().__init__(message, retryable=True, retry_after=retry_after)
+
+class LLMBackend(ABC):
+    """Summarizes one audio file. Calls are blocking; LLMClient runs them in threads."""
+    name = "base"
+
+    @abstractmethod
+    def summarize(self, audio_path: str, prompt: str) -> str:
+        """Raw model text for the prompt and the audio file"""
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self, model: str = None):
+        import google.generativeai as genai
+        from google.api_core import exceptions
+        self.genai = genai
+        self.exceptions = exceptions
+        genai.configure(api_key=os.getenv('GOOGLE_API_KEY'))
+        self.model_name = model or os.getenv('STUDYAMP_LLM_MODEL', DEFAULT_GEMINI_MODEL)
+        self.model = genai.GenerativeModel(self.model_name)
+
+    def summarize(self, audio_path: str, prompt: str) -> str:
+        try:
+            audio_file = self.genai.upload_file(audio_path)
+            response = self.model.generate_content([prompt, audio_file])
+            response.resolve()  # Ensure generation is complete
+            return response.text
+        except (self.exceptions.ResourceExhausted, self.exceptions.TooManyRequests) as e:
+            raise RateLimited(str(e))
+        except (self.exceptions.ServiceUnavailable, self.exceptions.InternalServerError,
+                self.exceptions.DeadlineExceeded) as e:
+            raise LLMError(str(e), retryable=True)
+
+class FakeBackend(LLMBackend):
+    """Local stand-in with configurable latency and failures, for offline tests and benchmarks"""
+    name = "fake"
+
+    def __init__(self, latency: float = 1.0, jitter: float = 0.2, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, seed: int = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+
+    def summarize(self, audio_path: str, prompt: str) -> str:
+        time.sleep(max(0.0, self.random.gauss(self.latency, self.jitter * self.latency)))
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            raise RateLimited(retry_after=self.latency)
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise LLMError("Fake backend error", retryable=True)
+        name = os.path.basename(audio_path)
+        return json.dumps({
+            "topic": f"Fake topic for {name}",
+            "summary": f"Fake summary of {name}.",
+            "key_points": ["First point", "Second point"],
+        })
+
+def create_llm_backend() -> LLMBackend:
+    """STUDYAMP_LLM_BACKEND=gemini (default) or fake; the fake reads STUDYAMP_FAKE_LLM_* settings"""
+    kind = os.getenv('STUDYAMP_LLM_BACKEND', 'gemini')
+    if kind == 'fake':
+        return FakeBackend(
+            latency=float(os.getenv('STUDYAMP_FAKE_LLM_LATENCY', 1.0)),
+            error_rate=float(os.getenv('STUDYAMP_FAKE_LLM_ERROR_RATE', 0.0)),
+            rate_limit_rate=float(os.getenv('STUDYAMP_FAKE_LLM_RATE_LIMIT_RATE', 0.0)),
+        )
+    if kind != 'gemini':
+        raise ValueError(f"Unknown STUDYAMP_LLM_BACKEND {kind}; use gemini or fake")
+    return GeminiBackend()
+
+class LLMClient:
+    """Runs backend calls concurrently, bounded by a semaphore, with timeouts and retries.
+
+    Retryable failures back off exponentially with full jitter, or for the
+    time a rate limit asks for when it says. One client is shared by every
+    request in the worker, so the concurrency limit is per worker. Calls run
+    on the client's own threads, one per slot, and a call that timed out
+    keeps its slot until its thread returns, so abandoned calls can neither
+    pile up threads nor starve the loop's default executor.
+    """
+    def __init__(self, backend: LLMBackend, concurrency: int = DEFAULT_CONCURRENCY,
+                 timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES):
+        self.backend = backend
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm")
+        self.calls = 0
+        self.attempts = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rate_limited = 0
+        self.call_seconds = 0.0
+
+    async def summarize(self, audio_path: str, prompt: str) -> str:
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        self.calls += 1
+        try:
+            for attempt in range(self.retries + 1):
+                await self.semaphore.acquire()
+                self.attempts += 1
+                call = loop.run_in_executor(self.executor, self.backend.summarize, audio_path, prompt)
+                call.add_done_callback(self._release)
+                try:
+                    # Shielded so a timeout leaves the call running, and holding its slot, until its thread returns
+                    return await asyncio.wait_for(asyncio.shield(call), self.timeout)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    error = LLMError(f"Timed out after {self.timeout:.0f}s", retryable=True)
+                except RateLimited as e:
+                    self.rate_limited += 1
+                    error = e
+                except LLMError as e:
+                    error = e
+                if not error.retryable or attempt == self.retries:
+                    break
+                # Sleep outside the semaphore so waiting calls can use the slot
+                delay = error.retry_after or random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                logger.warning(f"{self.backend.name} call failed ({error}); retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            self.failures += 1
+            raise error
+        finally:
+            self.call_seconds += loop.time() - start
+
+    def _release(self, call: asyncio.Future):
+        self.semaphore.release()
+        if not call.cancelled():
+            call.exception()  # Retrieved, so a timed out call that fails later is not logged as unhandled
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+    def stats(self):
+        return {
+            "backend": self.backend.name,
+            "concurrency": self.concurrency,
+            "calls": self.calls,
+            "attempts": self.attempts,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rate_limited": self.rate_limited,
+            "call_s_avg": self.call_seconds / self.calls if self.calls else 0.0,
+        }
+
+@lru_cache(maxsize=None)
+def default_client() -> LLMClient:
+    """The worker's shared client, configured from STUDYAMP_LLM_* settings"""
+    return LLMClient(
+        create_llm_backend(),
+        concurrency=int(os.getenv('STUDYAMP_LLM_CONCURRENCY', DEFAULT_CONCURRENCY)),
+        timeout=float(os.getenv('STUDYAMP_LLM_TIMEOUT', DEFAULT_TIMEOUT)),
+        retries=int(os.getenv('STUDYAMP_LLM_RETRIES', DEFAULT_RETRIES)),
+    )
+
+async def benchmark(segments: int, concurrency: int, backend: LLMBackend, timeout: float, retries: int):
+    client = LLMClient(backend, concurrency=concurrency, timeout=timeout, retries=retries)
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(client.summarize(f"segment_{i}.mp3", "prompt") for i in range(segments)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    client.close()
+    failed = sum(isinstance(result, Exception) for result in results)
+    return {"concurrency": concurrency, "wall_s": elapsed, "failed": failed, **client.stats()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Segment summary latency against the fake LLM backend")
+    parser.add_argument("--segments", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean seconds per fake call")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for concurrency in args.concurrency:
+        backend = FakeBackend(args.latency, error_rate=args.error_rate,
+                              rate_limit_rate=args.rate_limit_rate, seed=args.seed)
+        result = asyncio.run(benchmark(args.segments, concurrency, backend, args.timeout, args.retries))
+        print(f"concurrency={result['concurrency']:>3}  wall={result['wall_s']:.2f}s  "
+              f"attempts={result['attempts']}  failed={result['failed']}  call_avg={result['call_s_avg']:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import logging
+from typing import Dict
+
+# Quality tiers, best first. "full" streams at the session's rate with filtered
+# channels, "reduced" at half that rate, "score" only the attention score at 1 Hz.
+TIERS = ("full", "reduced", "score")
+SCORE_TIER_RATE_HZ = 1.0
+DEFAULT_LATENESS_BUDGET_MS = 50.0
+DEFAULT_SHED_INTERVAL = 2.0  # Seconds between controller steps
+RECOVER_FRACTION = 0.5  # Lateness below this share of the budget counts as headroom
+RECOVER_STEPS = 3  # Consecutive steps with headroom before a session moves back up
+
+def tier_rate(tier: int, rate_hz: float) -> float:
+    """Tick rate of a session asking for rate_hz at a tier"""
+    if TIERS[tier] == "full":
+        return rate_hz
+    if TIERS[tier] == "reduced":
+        return max(min(rate_hz, SCORE_TIER_RATE_HZ), rate_hz / 2)
+    return min(rate_hz, SCORE_TIER_RATE_HZ)
+
+def tier_channels(tier: int) -> bool:
+    """Whether frames at a tier carry the filtered EEG channels"""
+    return TIERS[tier] != "score"
+
+class LoadShedder:
+    """Moves streaming sessions between quality tiers to keep ticks on time.
+
+    Every STUDYAMP_SHED_INTERVAL seconds the controller looks at the tick
+    lateness and skipped ticks of each session since its last step. While the
+    worst session is over STUDYAMP_LATENESS_BUDGET_MS (or any skipped a tick),
+    one session per step moves down a tier: the lowest priority first and,
+    within a priority, the one at the best tier, so degradation spreads evenly.
+    After RECOVER_STEPS steps well under budget with CPU headroom, one session
+    moves back up, highest priority first. A budget of 0 disables shedding.
+    """
+    def __init__(self, manager):
+        self.manager = manager
+        self.budget_ms = float(os.getenv('STUDYAMP_LATENESS_BUDGET_MS', DEFAULT_LATENESS_BUDGET_MS))
+        self.interval = float(os.getenv('STUDYAMP_SHED_INTERVAL', DEFAULT_SHED_INTERVAL))
+        self.last_step = None
+        self.calm_steps = 0
+        self.skipped: Dict[str, int] = {}  # Skipped ticks per session at the last step
+        self.worst_lateness_ms = 0.0
+        self.demotions = 0
+        self.promotions = 0
+
+    def maybe_step(self, now: float):
+        """Called by every tick; runs a controller step once per interval"""
+        if not self.budget_ms:
+            return
+        if self.last_step is None:
+            self.last_step = now
+        elif now - self.last_step >= self.interval:
+            self.step(self.last_step)
+            self.last_step = now
+
+    def step(self, since: float):
+        streams = dict(self.manager.streams)
+        overloaded = False
+        self.worst_lateness_ms = 0.0
+        for session_id, stream in streams.items():
+            scheduler = stream["scheduler"]
+            lateness = scheduler.lateness_since(since)
+            if len(lateness):
+                self.worst_lateness_ms = max(self.worst_lateness_ms, float(lateness.max()))
+            if scheduler.skipped > self.skipped.get(session_id, 0):
+                overloaded = True
+            self.skipped[session_id] = scheduler.skipped
+        self.skipped = {session_id: self.skipped[session_id] for session_id in streams}
+        overloaded = overloaded or self.worst_lateness_ms > self.budget_ms
+
+        if overloaded:
+            self.calm_steps = 0
+            self.demote(streams)
+        elif self.worst_lateness_ms < self.budget_ms * RECOVER_FRACTION and self.cpu_headroom():
+            self.calm_steps += 1
+            if self.calm_steps >= RECOVER_STEPS:
+                self.calm_steps = 0
+                self.promote(streams)
+        else:
+            self.calm_steps = 0
+
+    def cpu_headroom(self) -> bool:
+        admission = self.manager.admission
+        idle = admission.cpu.idle if admission.cpu else None
+        return idle is None or idle >= admission.min_cpu_headroom
+
+    def demote(self, streams: Dict[str, Dict]):
+        # Streams are in start order; among equals the newest goes first
+        candidates = [(stream["priority"], stream["tier"], -i, session_id)
+                      for i, (session_id, stream) in enumerate(streams.items()) if stream["tier"] < len(TIERS) - 1]
+        if candidates:
+            *_, session_id = min(candidates)
+            self.set_tier(session_id, streams[session_id], streams[session_id]["tier"] + 1)
+            self.demotions += 1
+
+    def promote(self, streams: Dict[str, Dict]):
+        candidates = [(-stream["priority"], -stream["tier"], i, session_id)
+                      for i, (session_id, stream) in enumerate(streams.items()) if stream["tier"] > 0]
+        if candidates:
+            *_, session_id = min(candidates)
+            self.set_tier(session_id, streams[session_id], streams[session_id]["tier"] - 1)
+            self.promotions += 1
+
+    def set_tier(self, session_id: str, stream: Dict, tier: int):
+        logging.warning(f"Session {session_id} moves from tier {TIERS[stream['tier']]} to {TIERS[tier]} "
+                        f"(worst lateness {self.worst_lateness_ms:.0f} ms)")
+        stream["tier"] = tier
+        stream["tier_changes"] += 1
+        stream["scheduler"].set_rate(tier_rate(tier, stream["rate_hz"]))
+
+    def stats(self):
+        tiers = {name: 0 for name in TIERS}
+        for stream in list(self.manager.streams.values()):
+            tiers[TIERS[stream["tier"]]] += 1
+        return {
+            "budget_ms": self.budget_ms,
+            "worst_lateness_ms": self.worst_lateness_ms,
+            "tiers": tiers,
+            "demotions": self.demotions,
+            "promotions": self.promotions,
+        }
@@ -0,0 +1,347 @@
+"""Load test: N concurrent sessions, each watched by M websocket clients.
+
+By default the app runs in-process on synthetic (or playback) devices, so
+no headset, network or other service is needed:
+
+    python load_test.py --sessions 20 --clients 3 --slow-clients 1 --duration 60
+
+The in-process app runs without admission caps and load shedding, so the
+run measures raw capacity; --admission keeps the server's defaults.
+
+--url drives a server that is already running instead (its devices are
+whatever that server is configured with; needs the `websockets` package):
+
+    python load_test.py --url http://localhost:5000 --sessions 5
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import numpy as np
+from rich.console import Console
+from rich.table import Table
+
+LATENCY_SANITY_LIMIT = 60.0  # Seconds; playback files carry old timestamps
+METRICS_SAMPLE_INTERVAL = 1.0
+# Admission limits and the shedding budget, all disabled by 0; explicit environment settings win
+UNLIMITED = ('STUDYAMP_MAX_SESSIONS', 'STUDYAMP_MAX_WEBSOCKETS', 'STUDYAMP_MAX_LATENESS_MS',
+             'STUDYAMP_MIN_CPU_HEADROOM', 'STUDYAMP_LATENESS_BUDGET_MS')
+
+class InProcessTarget:
+    """The FastAPI app on this process's own event loop, through Starlette's TestClient"""
+    def __init__(self, data_dir: str, devices_config: str, admission: bool = False):
+        # The app reads its data directory, device pool and limits at import time
+        os.chdir(data_dir)
+        os.environ['STUDYAMP_DEVICES'] = devices_config
+        if not admission:
+            for name in UNLIMITED:
+                os.environ.setdefault(name, '0')
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        from fastapi.testclient import TestClient
+        import main
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+
+    def request(self, method: str, path: str, **kwargs):
+        response = self.client.request(method, path, **kwargs)
+        return response.status_code, response.json()
+
+    def connect(self, path: str):
+        websocket = self.client.websocket_connect(path)
+        websocket.__enter__()
+        websocket.recv = websocket.receive_text
+        websocket.close = lambda: websocket.__exit__(None, None, None)
+        return websocket
+
+    def close(self):
+        self.client.__exit__(None, None, None)
+
+class RemoteTarget:
+    """A server listening on a local port"""
+    def __init__(self, url: str):
+        import requests
+        try:
+            from websockets.sync.client import connect
+        except ImportError:
+            sys.exit("--url needs the websockets package (pip install websockets)")
+        self.url = url.rstrip('/')
+        self.http = requests.Session()
+        self._connect = connect
+
+    def request(self, method: str, path: str, **kwargs):
+        response = self.http.request(method, self.url + path, **kwargs)
+        return response.status_code, response.json()
+
+    def connect(self, path: str):
+        return self._connect(self.url.replace('http', 'ws', 1) + path)
+
+    def close(self):
+        self.http.close()
+
+class Subscriber(threading.Thread):
+    """One websocket client; slow clients sleep after every frame"""
+    def __init__(self, target, session_id: str, deadline: float, delay: float = 0.0):
+        super().__init__(daemon=True)
+        self.target = target
+        self.session_id = session_id
+        self.deadline = deadline
+        self.delay = delay
+        self.received = 0
+        self.connected_seconds = 0.0
+        self.latencies = []
+        self.error = None
+
+    def run(self):
+        try:
+            websocket = self.target.connect(f"/ws/{self.session_id}")
+        except Exception as e:
+            self.error = str(e)
+            return
+        start = time.time()
+        try:
+            while time.time() < self.deadline:
+                frame = json.loads(websocket.recv())
+                self.received += 1
+                latency = time.time() - frame['timestamp']
+                if abs(latency) < LATENCY_SANITY_LIMIT:
+                    self.latencies.append(latency)
+                if self.delay:
+                    time.sleep(self.delay)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.connected_seconds = time.time() - start
+            try:
+                websocket.close()
+            except Exception:
+                pass
+
+class MetricsSampler(threading.Thread):
+    """Polls /api/metrics to track peak memory while the test runs"""
+    def __init__(self, target):
+        super().__init__(daemon=True)
+        self.target = target
+        self.peak_rss = 0
+        self.running = True
+
+    def run(self):
+        while self.running:
+            _, metrics = self.target.request('GET', '/api/metrics')
+            self.peak_rss = max(self.peak_rss, metrics['process']['rss_bytes'] or 0)
+            time.sleep(METRICS_SAMPLE_INTERVAL)
+
+def write_devices_config(path: str, sessions: int, playback: str = None, master_board: str = "SYNTHETIC_BOARD",
+                         synthetic_source: bool = False):
+    """One synthetic or playback device per session"""
+    if playback:
+        from brainflow.board_shim import BoardIds
+        devices = [
+            {"device_id": f"playback-{i + 1}", "board": "PLAYBACK_FILE_BOARD",
+             "params": {"file": os.path.abspath(playback), "master_board": BoardIds[master_board].value,
+                        "other_info": f"playback-{i + 1}"}}
+            for i in range(sessions)
+        ]
+    elif synthetic_source:
+        devices = [{"device_id": "sim", "board": "SYNTHETIC_SOURCE", "count": sessions, "params": {"seed": 0}}]
+    else:
+        devices = [{"device_id": "synthetic", "board": "SYNTHETIC_BOARD", "count": sessions}]
+    with open(path, 'w') as f:
+        json.dump({"devices": devices}, f)
+
+def percentiles(values, points=(50, 95, 99)):
+    if not len(values):
+        return {p: float('nan') for p in points}
+    return dict(zip(points, np.percentile(values, points)))
+
+def encode_benchmark(iterations: int = 2000, samples: int = 64):
+    """Per-frame cost of the old pydantic + stdlib path against the serialize-once encoder"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from models import EEGData
+    from frame_encoder import FrameEncoder
+    from precision import signal_dtype, to_wire
+    eeg = np.random.default_rng(0).standard_normal((4, samples)).astype(signal_dtype()) * 20
+    status = {"battery": 80, "gaps": 0, "samples_lost": 0, "duplicates": 0}
+    artifacts = {"blink": False, "clench": False, "motion": False}
+    hrv = {"hrv_score": 0.5, "heart_rate": 70.0, "sdnn": 0.04, "rmssd": 0.03}
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        frame = EEGData(timestamp=time.time(), attention_score=50.0, eeg_channels=to_wire(eeg),
+                        device_status=status, artifacts=artifacts, hrv=hrv).model_dump()
+        json.dumps(frame, separators=(",", ":"))
+    pydantic_us = 1e6 * (time.perf_counter() - start) / iterations
+
+    encoder = FrameEncoder()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encoder.encode(time.time(), 50.0, eeg, status, artifacts, hrv)
+    encoder_us = 1e6 * (time.perf_counter() - start) / iterations
+    return {"backend": encoder.backend, "pydantic_json_us": pydantic_us, "frame_encoder_us": encoder_us}
+
+def run(args):
+    if args.url:
+        target = RemoteTarget(args.url)
+    else:
+        data_dir = tempfile.mkdtemp(prefix="studyamp-load-")
+        devices_config = os.path.join(data_dir, "devices.json")
+        write_devices_config(devices_config, args.sessions, args.playback, args.master_board, args.synthetic_source)
+        target = InProcessTarget(data_dir, devices_config, args.admission)
+
+    console = Console()
+    try:
+        _, before = target.request('GET', '/api/metrics')
+
+        session_ids, rejected = [], 0
+        for _ in range(args.sessions):
+            status, body = target.request('POST', '/api/sessions', params={"rate_hz": args.rate})
+            if status == 200:
+                session_ids.append(body['session_id'])
+            else:
+                rejected += 1
+        console.print(f"Started {len(session_ids)} sessions ({rejected} rejected), warming up {args.warmup}s")
+        time.sleep(args.warmup)
+
+        _, start = target.request('GET', '/api/metrics')
+        sampler = MetricsSampler(target)
+        sampler.start()
+        started = time.time()
+        deadline = started + args.duration
+        subscribers = [
+            Subscriber(target, session_id, deadline, delay=args.slow_delay if i < args.slow_clients else 0.0)
+            for session_id in session_ids
+            for i in range(args.clients)
+        ]
+        for subscriber in subscribers:
+            subscriber.start()
+        for subscriber in subscribers:
+            subscriber.join(timeout=args.duration + 30)
+        elapsed = time.time() - started
+        sampler.running = False
+
+        # Tick timing is only kept while sessions stream, so read it before ending them
+        _, end = target.request('GET', '/api/metrics')
+        for session_id in session_ids:
+            target.request('DELETE', f"/api/sessions/{session_id}")
+        _, history = target.request('GET', '/api/sessions/history', params={"limit": len(session_ids) + 100})
+        _, final = target.request('GET', '/api/metrics')
+        if args.cleanup or not args.url:
+            for session_id in session_ids:
+                target.request('DELETE', f"/api/sessions/{session_id}/delete")
+    finally:
+        target.close()
+
+    report = summarize(args, session_ids, rejected, subscribers, elapsed, before, start, end, final, history, sampler.peak_rss)
+    report["batch"] = end.get('batch')
+    report["encoding"] = {**encode_benchmark(), "server_us_avg": end['encoder']['encode_us_avg'],
+                          "bytes_avg": end['encoder']['bytes_avg']}
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(console, report)
+
+def summarize(args, session_ids, rejected, subscribers, elapsed, before, start, end, final, history, peak_rss):
+    sessions = list(end['sessions'].values())
+    latencies = np.concatenate([s.latencies for s in subscribers if s.latencies] or [np.zeros(0)])
+    fast = [s for s in subscribers if not s.delay]
+    slow = [s for s in subscribers if s.delay]
+
+    def drop_rate(group):
+        expected = sum(s.connected_seconds * args.rate for s in group)
+        received = sum(s.received for s in group)
+        return max(0.0, 1 - received / expected) if expected else float('nan')
+
+    # Bytes the store wrote for every byte of session body it ended up holding
+    ours = set(session_ids)
+    stored = sum(len(json.dumps(s)) for s in history if s['session_id'] in ours)
+    written = final['store']['bytes_written'] - before['store']['bytes_written']
+    cpu = end['process']['cpu_seconds'] - start['process']['cpu_seconds']
+    rss_start = start['process']['rss_bytes'] or 0
+    rss_end = end['process']['rss_bytes'] or 0
+
+    return {
+        "sessions": len(session_ids),
+        "rejected": rejected,
+        "clients": len(subscribers),
+        "client_errors": sum(1 for s in subscribers if s.error),
+        "duration_s": elapsed,
+        "tick_lateness_ms": {
+            "p50": float(np.median([s['lateness_p50_ms'] for s in sessions])) if sessions else float('nan'),
+            "p95": float(np.max([s['lateness_p95_ms'] for s in sessions])) if sessions else float('nan'),
+            "p99": float(np.max([s['lateness_p99_ms'] for s in sessions])) if sessions else float('nan'),
+            "max": float(np.max([s['lateness_max_ms'] for s in sessions])) if sessions else float('nan'),
+        },
+        "skipped_ticks": sum(s['skipped'] for s in sessions),
+        "drop_rate": drop_rate(fast),
+        "slow_drop_rate": drop_rate(slow),
+        "frame_latency_ms": {f"p{p}": 1000 * v for p, v in percentiles(latencies).items()},
+        "cpu_per_session": cpu / elapsed / max(1, len(session_ids)),
+        "in_process": not args.url,
+        "rss_growth_mb": (rss_end - rss_start) / 2**20,
+        "peak_rss_mb": peak_rss / 2**20,
+        "store": {
+            "writes": final['store']['writes'] - before['store']['writes'],
+            "bytes_written": written,
+            "bytes_stored": stored,
+            "write_amplification": written / stored if stored else float('nan'),
+            "write_ms_max": final['store']['write_ms_max'],
+        },
+    }
+
+def print_report(console, report):
+    table = Table(title="Load test", show_header=True, header_style="bold magenta")
+    table.add_column("Metric")
+    table.add_column("Value", justify="right")
+    lateness = report['tick_lateness_ms']
+    latency = report['frame_latency_ms']
+    store = report['store']
+    cpu_note = " (incl. in-process clients)" if report['in_process'] else ""
+    rows = [
+        ("Sessions / rejected", f"{report['sessions']} / {report['rejected']}"),
+        ("Websocket clients (errors)", f"{report['clients']} ({report['client_errors']})"),
+        ("Duration", f"{report['duration_s']:.1f} s"),
+        ("Tick lateness p50 / p95 / p99", f"{lateness['p50']:.1f} / {lateness['p95']:.1f} / {lateness['p99']:.1f} ms"),
+        ("Skipped ticks", str(report['skipped_ticks'])),
+        ("Frame drop rate (fast / slow clients)", f"{report['drop_rate']:.1%} / {report['slow_drop_rate']:.1%}"),
+        ("Frame latency p50 / p95 / p99", f"{latency['p50']:.0f} / {latency['p95']:.0f} / {latency['p99']:.0f} ms"),
+        ("CPU per session" + cpu_note, f"{report['cpu_per_session']:.1%} of a core"),
+        ("Memory growth / peak RSS", f"{report['rss_growth_mb']:+.1f} / {report['peak_rss_mb']:.1f} MB"),
+        ("Store writes", f"{store['writes']} ({store['bytes_written'] / 2**20:.2f} MB)"),
+        ("Store write amplification", f"{store['write_amplification']:.1f}x"),
+        ("Store write max", f"{store['write_ms_max']:.1f} ms"),
+    ]
+    encoding = report['encoding']
+    rows += [
+        ("Frame encode (server avg)", f"{encoding['server_us_avg']:.0f} us, {encoding['bytes_avg']:.0f} B ({encoding['backend']})"),
+        ("Encode: pydantic+json / encoder", f"{encoding['pydantic_json_us']:.0f} / {encoding['frame_encoder_us']:.0f} us"),
+    ]
+    if report.get('batch'):
+        rows.append(("Batched DSP avg / max batch", f"{report['batch']['avg_batch']:.1f} / {report['batch']['max_batch']}"))
+    for name, value in rows:
+        table.add_row(name, value)
+    console.print(table)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--clients', type=int, default=2, help="Websocket clients per session")
+    parser.add_argument('--slow-clients', type=int, default=0, help="How many of each session's clients read slowly")
+    parser.add_argument('--slow-delay', type=float, default=1.0, help="Seconds a slow client sleeps per frame")
+    parser.add_argument('--duration', type=float, default=30.0)
+    parser.add_argument('--warmup', type=float, default=3.0, help="Seconds to let devices prepare and filters settle")
+    parser.add_argument('--rate', type=float, default=4.0, help="Frames per second per session")
+    parser.add_argument('--playback', help="Replay a BrainFlow recording instead of the synthetic board")
+    parser.add_argument('--master-board', default="SYNTHETIC_BOARD", help="Board the playback file was recorded from")
+    parser.add_argument('--synthetic-source', action='store_true',
+                        help="Use the in-process NumPy generator instead of BrainFlow's synthetic board")
+    parser.add_argument('--url', help="Test a running server instead of an in-process app")
+    parser.add_argument('--admission', action='store_true',
+                        help="Keep the in-process app's admission caps and load shedding (off by default)")
+    parser.add_argument('--cleanup', action='store_true', help="Delete the test sessions from a remote server")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -1,15 +1,28 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, File, UploadFile, Form
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, File, UploadFile, Form, Query, Header, Depends
 from models import SessionData, EEGData
 from device_manager import DeviceManager
 from signal_processor import SignalProcessor
 from session_manager import SessionManager
+from device_registry import NoDeviceAvailable
+from admission import AdmissionRejected
+from exporter import EXPORT_FORMATS, ExportUnavailable
 from audio_processor import AudioProcessor
+from profiler import MemoryTracker, MAX_PROFILE_SECONDS
 from datetime import datetime, timezone
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import StreamingResponse, Response, JSONResponse
+from contextlib import asynccontextmanager
+import os
 import asyncio
 import logging
+import secrets
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    session_manager.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 # security stuff
 app.add_middleware(
@@ -24,14 +37,23 @@ app.add_middleware(
 # device_manager = DeviceManager()
 # signal_processor = SignalProcessor()
 session_manager = SessionManager()
+memory_tracker = MemoryTracker()
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected(request, e: AdmissionRejected):
+    return JSONResponse({"detail": str(e)}, status_code=e.status_code, headers={"Retry-After": str(e.retry_after)})
 
 @app.post("/api/sessions")
-async def create_session():
-    return session_manager.create_session()
+async def create_session(rate_hz: float = Query(4.0, gt=0, le=32), priority: int = Query(1, ge=0, le=2)):
+    try:
+        return session_manager.create_session(rate_hz=rate_hz, priority=priority)
+    except NoDeviceAvailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
 
 @app.delete("/api/sessions/{session_id}")
 async def end_session(session_id: str):
-    session_manager.end_session(session_id)
+    if not session_manager.end_session(session_id):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
     return {"message": "Session ended"}
 
 @app.delete("/api/sessions/{session_id}/delete")
@@ -48,6 +70,66 @@ async def delete_session(session_id: str):
 async def get_session_status(session_id: str):
     return session_manager.get_status(session_id)
 
+@app.get("/api/sessions/{session_id}/timeline")
+async def get_session_timeline(
+    session_id: str,
+    start: float = None,
+    end: float = None,
+    max_points: int = Query(600, ge=1, le=10000)
+):
+    """Min/max/mean attention per time bucket, at most max_points buckets"""
+    timeline = session_manager.get_timeline(session_id, start, end, max_points)
+    if timeline is None:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return timeline
+
+def export_response(session_ids, format: str, eeg: bool, filename: str):
+    try:
+        body = session_manager.export(session_ids, format, include_eeg=eeg)
+    except ExportUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    media_type, extension = EXPORT_FORMATS[format]
+    # A sync iterator is consumed in a worker thread, keeping the event loop free for live streams
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="{filename}.{extension}"'})
+
+@app.get("/api/sessions/{session_id}/export")
+async def export_session(
+    session_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|npz|arrow)$"),
+    eeg: bool = True
+):
+    """Stream one session's timeline, drops and recorded EEG"""
+    if session_manager.get_status(session_id)["status"] == "not found":
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return export_response([session_id], format, eeg, f"session-{session_id}")
+
+@app.get("/api/export")
+async def export_sessions(
+    start: datetime = None,
+    end: datetime = None,
+    format: str = Query("ndjson", pattern="^(ndjson|npz|arrow)$"),
+    eeg: bool = False
+):
+    """Stream every session that started within [start, end)"""
+    session_ids = session_manager.store.query_range(
+        start.timestamp() if start else None, end.timestamp() if end else None)
+    return export_response(session_ids, format, eeg, "sessions")
+
+@app.get("/api/analytics")
+async def get_analytics(
+    group_by: str = Query("day", pattern="^(user|day|week|hour|status)$"),
+    start: datetime = None,
+    end: datetime = None,
+    user_id: str = None,
+    status: str = None,
+    utc_offset: int = Query(0, ge=-12, le=14)
+):
+    """Attention and drops across sessions that started within [start, end), grouped"""
+    return session_manager.get_analytics(
+        group_by, start.timestamp() if start else None, end.timestamp() if end else None,
+        user_id, status, utc_offset)
+
 @app.get("/api/sessions/history")
 async def get_session_history(limit: int = 10, status: str = None):
     """Get recent session history with optional status filter"""
@@ -58,30 +140,128 @@ async def get_session_history(limit: int = 10, status: str = None):
         logging.error(f"Error fetching session history: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/devices")
+async def get_devices():
+    """Configured devices with their health state and current session"""
+    return session_manager.devices.status()
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Tick timing of the sessions streaming in this worker"""
+    return session_manager.get_metrics()
+
 @app.post("/api/process_audio")
 async def process_audio_endpoint(
     audio: UploadFile = File(...),
     timestamps: str = Form(...)
 ):
-    try:
-        audio_processor = AudioProcessor()
-        summaries = await audio_processor.process_audio(audio.file, timestamps)
-        print(summaries,"main.py")
-        return {"summaries": summaries}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Raises AdmissionRejected when every audio job slot is taken or the worker is overloaded
+    with session_manager.admission.audio_job():
+        try:
+            audio_processor = AudioProcessor()
+            capture = session_manager.profiler.for_audio()
+            if capture:
+                with capture.job():
+                    summaries = await audio_processor.process_audio(audio.file, timestamps)
+            else:
+                summaries = await audio_processor.process_audio(audio.file, timestamps)
+            return {"summaries": summaries}
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Admin endpoints are off unless STUDYAMP_ADMIN_TOKEN is set; callers send it as X-Admin-Token"""
+    token = os.getenv('STUDYAMP_ADMIN_TOKEN')
+    if not token or not secrets.compare_digest(x_admin_token or "", token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+admin = [Depends(require_admin)]
+
+@app.post("/api/admin/profile/sessions/{session_id}", dependencies=admin)
+async def profile_session(session_id: str, seconds: float = Query(30.0, gt=0, le=MAX_PROFILE_SECONDS)):
+    """Profile a session's ticks for the next `seconds`"""
+    if session_id not in session_manager.streams:
+        if session_manager.get_status(session_id)["status"] == "active":
+            raise HTTPException(status_code=409, detail=f"Session {session_id} is not streaming in worker {session_manager.worker_id}")
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return session_manager.profiler.start_session(session_id, seconds).info()
+
+@app.post("/api/admin/profile/audio", dependencies=admin)
+async def profile_audio(
+    jobs: int = Query(1, ge=1, le=100),
+    seconds: float = Query(MAX_PROFILE_SECONDS, gt=0, le=MAX_PROFILE_SECONDS)
+):
+    """Profile the next `jobs` audio jobs, or the ones starting within `seconds`"""
+    return session_manager.profiler.start_audio(jobs, seconds).info()
+
+@app.get("/api/admin/profile", dependencies=admin)
+async def list_profiles():
+    return session_manager.profiler.list()
+
+@app.get("/api/admin/profile/{capture_id}", dependencies=admin)
+async def download_profile(
+    capture_id: str,
+    format: str = Query("pstats", pattern="^(pstats|text)$"),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """A capture's stats so far: marshalled pstats data or the top functions as text"""
+    capture = session_manager.profiler.captures.get(capture_id)
+    if capture is None:
+        raise HTTPException(status_code=404, detail=f"Profile {capture_id} not found")
+    if format == "text":
+        return Response(capture.dump("text", limit), media_type="text/plain")
+    return Response(capture.dump("pstats"), media_type="application/octet-stream", headers={
+        "Content-Disposition": f'attachment; filename="profile-{capture_id}.pstats"'})
+
+@app.delete("/api/admin/profile/{capture_id}", dependencies=admin)
+async def delete_profile(capture_id: str):
+    """Stop a capture and drop its stats"""
+    if session_manager.profiler.delete(capture_id) is None:
+        raise HTTPException(status_code=404, detail=f"Profile {capture_id} not found")
+    return {"status": "deleted"}
+
+@app.post("/api/admin/memory/snapshot", dependencies=admin)
+async def memory_snapshot(frames: int = Query(10, ge=1, le=100)):
+    """Start tracemalloc if needed and take the baseline later diffs compare to"""
+    return memory_tracker.snapshot(frames)
+
+@app.get("/api/admin/memory/diff", dependencies=admin)
+async def memory_diff(
+    limit: int = Query(25, ge=1, le=500),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")
+):
+    """Largest allocation growth since the baseline"""
+    diff = memory_tracker.diff(limit, group_by)
+    if diff is None:
+        raise HTTPException(status_code=409, detail="No baseline; POST /api/admin/memory/snapshot first")
+    return diff
+
+@app.delete("/api/admin/memory", dependencies=admin)
+async def memory_stop():
+    """Stop tracemalloc and drop the baseline"""
+    return memory_tracker.stop()
 
 @app.websocket("/ws/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str):
+async def websocket_endpoint(websocket: WebSocket, session_id: str, since: int = None):
     # Validate session ID
-    session = session_manager.get_session(session_id)
-    if not session or session.status != "active":
+    if session_manager.get_status(session_id)["status"] != "active":
         await websocket.close(code=1008)  # Policy Violation
         return
     
     await websocket.accept()
-    session_manager.register_websocket(session_id, websocket)
+    if not session_manager.admission.open_websocket(session_id):
+        await websocket.close(code=1013)  # Try Again Later: the session has its limit of clients
+        return
+    relay_task = None
     try:
+        if session_manager.is_local(session_id):
+            # ?since=<seq> resumes after the last frame the client received
+            await session_manager.attach_websocket(session_id, websocket, since)
+        else:
+            # Another worker owns the stream; relay its frames from the shared state
+            relay_task = asyncio.create_task(session_manager.relay_frames(session_id, websocket, since))
         while True:
             message = await websocket.receive_text()  # Keep the connection alive
             # No need to process incoming messages in this case
@@ -90,3 +270,7 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
     except Exception as e:
         logging.error(f"WebSocket error: {e}")
         await websocket.close(code=1011)
+    finally:
+        session_manager.admission.close_websocket(session_id)
+        if relay_task:
+            relay_task.cancel()
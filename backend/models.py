@@ -13,9 +13,15 @@ class SessionData(BaseModel):
     attention_scores: List[float] = []  # Add this field
     summaries: Optional[List[str]] = None
     attention_drops: Optional[List[Dict]] = None
+    rate_hz: float = 4.0
+    priority: int = 1  # Load shedding order: 0 low, 1 normal, 2 high
 
 class EEGData(BaseModel):
+    seq: Optional[int] = None
+    tier: Optional[str] = None
     timestamp: float
     attention_score: float
     eeg_channels: List[List[float]]
-    device_status: Dict[str, float]
\ No newline at end of file
+    device_status: Dict[str, float]
+    artifacts: Dict[str, bool] = {}
+    hrv: Dict[str, float] = {}
\ No newline at end of file
@@ -0,0 +1,102 @@
+"""Live operations console for a running backend.
+
+Polls /api/metrics (and /api/devices) over HTTP and never opens a board:
+
+    python ops_console.py                          # http://localhost:5000
+    python ops_console.py --url http://host:5000 --interval 2
+
+With several uvicorn workers each poll is answered by one of them; every
+worker seen is kept on screen, keyed by worker id.
+"""
+import time
+import argparse
+import requests
+from rich.console import Group
+from rich.live import Live
+from rich.panel import Panel
+from rich.table import Table
+from rich.text import Text
+
+STAGES = ("read", "hrv", "filter", "psd", "artifacts", "score", "process", "store", "encode", "publish", "send")
+LATENESS_WARN_MS = 50.0
+
+def fetch(session, url: str, path: str, timeout: float):
+    response = session.get(url + path, timeout=timeout)
+    response.raise_for_status()
+    return response.json()
+
+def worker_panel(metrics, previous, interval: float):
+    process = metrics['process']
+    store = metrics['store']
+    encoder = metrics.get('encoder', {})
+    cpu = ""
+    if previous:
+        elapsed = max(interval, 1e-6)
+        cpu = f"CPU {100 * (process['cpu_seconds'] - previous['process']['cpu_seconds']) / elapsed:.0f}%  "
+    rss = f"RSS {process['rss_bytes'] / 2**20:.0f} MB  " if process.get('rss_bytes') else ""
+    summary = Text(
+        f"{cpu}{rss}sessions {len(metrics['sessions'])}  "
+        f"store writes {store['writes']} (avg {store['write_ms_avg']:.2f} ms, max {store['write_ms_max']:.1f} ms)  "
+        f"encode {encoder.get('encode_us_avg', 0):.0f} us/frame ({encoder.get('backend', '?')})"
+    )
+
+    table = Table(show_header=True, header_style="bold magenta", expand=True)
+    for column in ("Session", "Hz (target)", "Late p50/p99 ms", "Skipped", "Subs", "Backlog",
+                   "Sent", "Dropped", "Stages ms"):
+        table.add_column(column, justify="left" if column in ("Session", "Stages ms") else "right")
+    for session_id, stats in sorted(metrics['sessions'].items()):
+        late = f"{stats['lateness_p50_ms']:.1f} / {stats['lateness_p99_ms']:.1f}"
+        if stats['lateness_p99_ms'] > LATENESS_WARN_MS:
+            late = f"[red]{late}[/red]"
+        stages = stats.get('stages_ms', {})
+        table.add_row(
+            session_id[:8],
+            f"{stats['measured_hz']:.1f} ({stats['rate_hz']:g})",
+            late,
+            str(stats['skipped']),
+            str(stats['subscribers']),
+            f"{stats['backlog_samples']}" + (f" [red]+{stats['overruns']} overruns[/red]" if stats['overruns'] else ""),
+            str(stats['frames_sent']),
+            f"[red]{stats['frames_dropped']}[/red]" if stats['frames_dropped'] else "0",
+            " ".join(f"{stage} {stages[stage]:.2f}" for stage in STAGES if stage in stages),
+        )
+    return Panel(Group(summary, table), title=f"Worker {metrics['worker_id']}", border_style="green")
+
+def devices_panel(devices):
+    table = Table(show_header=True, header_style="bold magenta", expand=True)
+    for column in ("Device", "State", "Session", "Error"):
+        table.add_column(column)
+    for device in devices:
+        table.add_row(device['device_id'], device['state'], (device.get('session_id') or "")[:8], device.get('error') or "")
+    return Panel(table, title="Devices", border_style="blue")
+
+def run(url: str, interval: float, timeout: float):
+    session = requests.Session()
+    workers = {}  # worker_id -> (metrics, previous metrics, poll time, seconds since previous poll)
+    with Live(refresh_per_second=4, screen=False) as live:
+        while True:
+            panels = []
+            try:
+                metrics = fetch(session, url, "/api/metrics", timeout)
+                devices = fetch(session, url, "/api/devices", timeout)
+                now = time.monotonic()
+                last = workers.get(metrics['worker_id'])
+                workers[metrics['worker_id']] = (metrics, last[0] if last else None, now, now - last[2] if last else interval)
+                panels.append(devices_panel(devices))
+            except requests.RequestException as e:
+                panels.append(Panel(Text(f"{url}: {e}", style="red"), title="Backend unreachable"))
+            for worker_id, (metrics, previous, _, elapsed) in sorted(workers.items()):
+                panels.append(worker_panel(metrics, previous, elapsed))
+            live.update(Group(*panels))
+            time.sleep(interval)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default="http://localhost:5000")
+    parser.add_argument('--interval', type=float, default=1.0, help="Seconds between polls")
+    parser.add_argument('--timeout', type=float, default=2.0)
+    args = parser.parse_args()
+    try:
+        run(args.url.rstrip('/'), args.interval, args.timeout)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,146 @@
+import time
+import numpy as np
+from typing import Dict, List
+from signal_processor import SignalProcessor, StreamingHRV
+from artifact_detector import ArtifactDetector
+from ring_buffer import RingBuffer
+from scheduler import StageTimer
+from precision import signal_dtype, to_wire
+
+WINDOW_SIZE = 256  # Samples in the spectral window (1 s at 256 Hz)
+
+GYRO_MOTION_THRESHOLD = 20.0  # deg/s; unlike acceleration, rotation has no gravity offset
+
+class SessionPipeline:
+    """Per-session processing: filter, one spectrum per window, artifact gating, scoring"""
+    def __init__(self, ppg_fs=None, dtype=None):
+        self.dtype = signal_dtype(dtype)
+        self.signal_processor = SignalProcessor(dtype=self.dtype)
+        self.artifact_detector = ArtifactDetector()
+        self.hrv = StreamingHRV(fs=ppg_fs or self.signal_processor.ppg_fs)
+        self.last_score = None
+        self.timer = StageTimer()
+        # Filter state and the rolling window of filtered samples the spectrum is taken over
+        self.zi = None
+        self.window = RingBuffer(len(self.signal_processor.channels), WINDOW_SIZE, dtype=self.dtype)
+
+    def process(self, raw_data, timestamps, aux: Dict = None, new_ppg=None) -> Dict:
+        """raw_data holds only the EEG samples new since the previous call.
+
+        aux holds the device's PPG/acc/gyro windows aligned to this EEG window;
+        new_ppg holds only the PPG samples that arrived since the previous call.
+        """
+        self.update_hrv(new_ppg)
+        with self.timer.time("filter"):
+            filtered_data, self.zi = self.signal_processor.filter_chunk(raw_data, self.zi)
+            self.window.write(filtered_data, timestamps)
+        with self.timer.time("psd"):
+            channels, _ = self.window.latest(WINDOW_SIZE)
+            freqs, psd = self.signal_processor.compute_psd(channels)
+        return self.finish(filtered_data, freqs, psd, aux)
+
+    def update_hrv(self, new_ppg):
+        if new_ppg is not None:
+            with self.timer.time("hrv"):
+                self.hrv.update(new_ppg)
+
+    def finish(self, filtered_data, freqs, psd, aux: Dict = None, score=None, features=None) -> Dict:
+        """Artifact gating and scoring of one window's spectrum (score and artifact features may be precomputed)"""
+        with self.timer.time("artifacts"):
+            if features is None:
+                features = self.artifact_detector.features(freqs, psd)
+            artifacts = self.artifact_detector.detect_features(features)
+            if aux is not None and len(aux['gyro']):
+                # The IMU sees head movement directly
+                rotation = np.mean(np.linalg.norm(aux['gyro'], axis=1))
+                artifacts['motion'] = artifacts['motion'] or bool(rotation > GYRO_MOTION_THRESHOLD)
+
+        # Contaminated windows are not scored; the last clean score is held instead
+        clean = not any(artifacts.values())
+        if clean or self.last_score is None:
+            with self.timer.time("score"):
+                if score is None:
+                    score = self.signal_processor.calculate_attention_from_psd(freqs, psd)
+                # Rounded to the signal precision for storage and the wire
+                self.last_score = to_wire(self.dtype.type(score))
+
+        return {
+            "filtered": filtered_data,
+            "attention_score": self.last_score,
+            "artifacts": artifacts,
+            "clean": clean,
+            "hrv": self.hrv.features(),
+        }
+
+class BatchPipeline:
+    """Runs the filter, spectrum and band-power stages of many sessions as stacked arrays.
+
+    Each job is (pipeline, raw_data, timestamps, aux, new_ppg) for one session
+    tick. Chunks of the same shape are filtered in one sosfilt call over a
+    (sessions, channels, samples) array with the sessions' filter states
+    stacked alongside; full windows get one Welch call and one pass for
+    band powers and artifact features. Stateful per-session steps (HRV,
+    artifact baselines) stay per session. Results match SessionPipeline.process job for job.
+    """
+    def __init__(self):
+        self.batches = 0
+        self.jobs = 0
+        self.max_batch = 0
+
+    def process(self, jobs) -> List[Dict]:
+        self.batches += 1
+        self.jobs += len(jobs)
+        self.max_batch = max(self.max_batch, len(jobs))
+        for pipeline, _, _, _, new_ppg in jobs:
+            pipeline.update_hrv(new_ppg)
+
+        filtered = [None] * len(jobs)
+        for indices in self._group(jobs, lambda job: (job[1].shape, job[1].dtype, job[0].dtype)).values():
+            start = time.perf_counter()
+            pipelines = [jobs[i][0] for i in indices]
+            data = np.stack([jobs[i][1] for i in indices])
+            zi = np.stack([
+                pipeline.zi if pipeline.zi is not None else pipeline.signal_processor.initial_zi(jobs[i][1])
+                for i, pipeline in zip(indices, pipelines)
+            ], axis=1)
+            out, zi = pipelines[0].signal_processor.filter_chunk(data, zi)
+            for k, (i, pipeline) in enumerate(zip(indices, pipelines)):
+                filtered[i] = out[k]
+                pipeline.zi = zi[:, k]
+                pipeline.window.write(out[k], jobs[i][2])
+            self._record(pipelines, "filter", start)
+
+        windows = [job[0].window.latest(WINDOW_SIZE)[0] for job in jobs]
+        results = [None] * len(jobs)
+        for indices in self._group(windows, lambda window: (window.shape, window.dtype)).values():
+            start = time.perf_counter()
+            pipelines = [jobs[i][0] for i in indices]
+            processor = pipelines[0].signal_processor
+            freqs, psd = processor.compute_psd(np.stack([windows[i] for i in indices]))
+            scores = processor.attention_scores(freqs, psd)
+            features = pipelines[0].artifact_detector.features(freqs, psd)
+            self._record(pipelines, "psd", start)
+            for k, i in enumerate(indices):
+                results[i] = pipelines[k].finish(
+                    filtered[i], freqs, psd[k], jobs[i][3], score=scores[k], features=features[k])
+        return results
+
+    def _group(self, items, key):
+        groups = {}
+        for i, item in enumerate(items):
+            groups.setdefault(key(item), []).append(i)
+        return groups
+
+    def _record(self, pipelines, stage: str, start: float):
+        # Each session is charged its share of the batched call
+        share = (time.perf_counter() - start) / len(pipelines)
+        for pipeline in pipelines:
+            pipeline.timer.record(stage, share)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "jobs": self.jobs,
+            "avg_batch": self.jobs / self.batches if self.batches else 0.0,
+            "max_batch": self.max_batch,
+        }
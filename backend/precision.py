@@ -0,0 +1,42 @@
+import json
+import os
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+SUPPORTED_DTYPES = ('float32', 'float64')
+
+def signal_dtype(name: str = None) -> np.dtype:
+    """Sample dtype from acquisition to the wire (STUDYAMP_DTYPE, float64 by default)"""
+    name = name or os.getenv('STUDYAMP_DTYPE', 'float64')
+    if str(name) not in SUPPORTED_DTYPES:
+        raise ValueError(f"Unsupported signal dtype {name}; use one of {SUPPORTED_DTYPES}")
+    return np.dtype(name)
+
+def to_wire(data):
+    """Python floats (or nested lists) for JSON.
+
+    float32 values are rounded to their shortest float32 digits first;
+    tolist() alone would print them with float64's 17 significant digits.
+    Writers that hold an array should prefer dumps(), which skips the
+    Python floats altogether.
+    """
+    data = np.asarray(data)
+    if data.dtype != np.float32:
+        return data.tolist()
+    if orjson and data.ndim:
+        # orjson prints each float32 with its shortest digits; parsing them back is still all in C
+        return orjson.loads(orjson.dumps(np.ascontiguousarray(data), option=orjson.OPT_SERIALIZE_NUMPY))
+    return data.astype(str).astype(np.float64).tolist()
+
+def dumps(record: dict) -> str:
+    """Compact JSON of a flat record whose values may be NumPy arrays, float32 ones in their shortest digits"""
+    if orjson:
+        record = {key: np.ascontiguousarray(value) if isinstance(value, np.ndarray) else value
+                  for key, value in record.items()}
+        return orjson.dumps(record, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+    record = {key: to_wire(value) if isinstance(value, np.ndarray) else value for key, value in record.items()}
+    return json.dumps(record, separators=(",", ":"))
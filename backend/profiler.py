@@ -0,0 +1,228 @@
+import io
+import sys
+import time
+import uuid
+import marshal
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+MAX_PROFILE_SECONDS = 600
+TRACEMALLOC_FRAMES = 10
+
+def _enable(profile: cProfile.Profile) -> bool:
+    if sys.getprofile() is not None:
+        return False
+    try:
+        profile.enable()
+    except ValueError:  # Another profiler is active (Python 3.12+)
+        return False
+    return True
+
+class Capture:
+    """cProfile stats merged from every profiled piece of work of one target.
+
+    Each piece (a tick's processing, an audio job) is profiled by its own
+    cProfile.Profile in the thread that runs it, then merged here, so work
+    running in the event loop and in executor threads can share a capture.
+    """
+    def __init__(self, kind: str, target: Optional[str], seconds: float, limit: int = None):
+        self.capture_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.target = target
+        self.limit = limit  # Units of work to capture, None for time-boxed only
+        self.started = time.time()
+        self.deadline = time.monotonic() + seconds
+        self.units = 0
+        self.stopped = False
+        self.busy = False
+        self.stats: Optional[pstats.Stats] = None
+        self.lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        if self.stopped or time.monotonic() >= self.deadline:
+            return False
+        return self.limit is None or self.units < self.limit
+
+    def add(self, profile: cProfile.Profile):
+        with self.lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+
+    @contextmanager
+    def profile(self):
+        """Profile the enclosed code in the current thread.
+
+        Skipped when the thread is already being profiled, e.g. by an audio
+        job capture that spans awaits, since a second profiler would unhook it.
+        """
+        profile = cProfile.Profile()
+        if not _enable(profile):
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.add(profile)
+
+    @contextmanager
+    def job(self):
+        """Profile one whole job, awaits included, counting it when done.
+
+        Work other tasks run on the event loop while the job awaits is
+        included too. Only one job is profiled at a time; jobs starting
+        meanwhile run unprofiled.
+        """
+        if self.busy:
+            yield
+            return
+        self.busy = True
+        try:
+            with self.profile():
+                yield
+        finally:
+            self.busy = False
+            self.count()
+
+    def call(self, fn, *args):
+        with self.profile():
+            return fn(*args)
+
+    def count(self):
+        """One unit of work (tick, job) finished"""
+        self.units += 1
+
+    def info(self):
+        return {
+            "capture_id": self.capture_id,
+            "kind": self.kind,
+            "target": self.target,
+            "active": self.active,
+            "started": self.started,
+            "seconds_left": max(0.0, self.deadline - time.monotonic()) if self.active else 0.0,
+            "units": self.units,
+            "limit": self.limit,
+        }
+
+    def dump(self, format: str = "pstats", limit: int = 50) -> bytes:
+        """pstats: marshalled stats for pstats/snakeviz; text: top functions by cumulative time"""
+        with self.lock:
+            if self.stats is None:
+                return b""
+            if format == "pstats":
+                return marshal.dumps(self.stats.stats)
+            stream = io.StringIO()
+            self.stats.stream = stream
+            self.stats.sort_stats("cumulative").print_stats(limit)
+            return stream.getvalue().encode()
+
+class Profiler:
+    """On-demand captures of session ticks and audio jobs.
+
+    Hot paths only look up whether a capture is active (a dict get or an
+    attribute read); nothing is profiled or allocated until one is started.
+    """
+    def __init__(self):
+        self.captures: Dict[str, Capture] = {}
+        self.sessions: Dict[str, Capture] = {}  # Active capture per session id
+        self.audio: Optional[Capture] = None
+
+    def start_session(self, session_id: str, seconds: float) -> Capture:
+        current = self.for_session(session_id)
+        if current:
+            return current
+        capture = self.sessions[session_id] = Capture("session", session_id, seconds)
+        self.captures[capture.capture_id] = capture
+        return capture
+
+    def start_audio(self, jobs: int, seconds: float) -> Capture:
+        if self.for_audio():
+            return self.audio
+        capture = self.audio = Capture("audio", None, seconds, limit=jobs)
+        self.captures[capture.capture_id] = capture
+        return capture
+
+    def for_session(self, session_id: str) -> Optional[Capture]:
+        capture = self.sessions.get(session_id)
+        if capture is not None and not capture.active:
+            del self.sessions[session_id]
+            return None
+        return capture
+
+    def for_audio(self) -> Optional[Capture]:
+        capture = self.audio
+        if capture is not None and not capture.active:
+            self.audio = capture = None
+        return capture
+
+    def stop(self, capture_id: str) -> Optional[Capture]:
+        capture = self.captures.get(capture_id)
+        if capture:
+            capture.stopped = True
+        return capture
+
+    def delete(self, capture_id: str):
+        capture = self.stop(capture_id)
+        self.captures.pop(capture_id, None)
+        return capture
+
+    def list(self) -> List[Dict]:
+        return [capture.info() for capture in self.captures.values()]
+
+class MemoryTracker:
+    """tracemalloc baseline and diffs; tracing is off, and costs nothing, until a baseline is taken"""
+    def __init__(self):
+        self.baseline = None
+        self.baseline_time = None
+
+    def snapshot(self, frames: int = TRACEMALLOC_FRAMES):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self.baseline = tracemalloc.take_snapshot()
+        self.baseline_time = time.time()
+        return self.status()
+
+    def diff(self, limit: int = 25, group_by: str = "lineno"):
+        """Largest allocation changes since the baseline, by line or by traceback"""
+        if self.baseline is None:
+            return None
+        current = tracemalloc.take_snapshot()
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        changes = current.filter_traces(filters).compare_to(self.baseline.filter_traces(filters), group_by)
+        return {
+            **self.status(),
+            "total_diff_bytes": sum(stat.size_diff for stat in changes),
+            "top": [
+                {
+                    "size_diff_bytes": stat.size_diff,
+                    "size_bytes": stat.size,
+                    "count_diff": stat.count_diff,
+                    "count": stat.count,
+                    "traceback": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                }
+                for stat in changes[:limit]
+            ],
+        }
+
+    def stop(self):
+        self.baseline = None
+        self.baseline_time = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return self.status()
+
+    def status(self):
+        traced, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "baseline_time": self.baseline_time,
+            "traced_bytes": traced,
+            "peak_traced_bytes": peak,
+        }
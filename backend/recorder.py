@@ -0,0 +1,78 @@
+import os
+import json
+import logging
+import numpy as np
+
+RECORD_MODES = ('raw', 'filtered')
+
+def record_mode():
+    """Which EEG to record per session (STUDYAMP_RECORD_EEG=raw|filtered); None records nothing"""
+    mode = os.getenv('STUDYAMP_RECORD_EEG')
+    if mode and mode not in RECORD_MODES:
+        logging.warning(f"Ignoring STUDYAMP_RECORD_EEG={mode}; use one of {RECORD_MODES}")
+        return None
+    return mode
+
+def recording_paths(data_dir: str, session_id: str):
+    base = os.path.join(data_dir, 'recordings', session_id)
+    return {"meta": f"{base}.json", "samples": f"{base}.eeg", "timestamps": f"{base}.ts"}
+
+def delete_recording(data_dir: str, session_id: str):
+    for path in recording_paths(data_dir, session_id).values():
+        if os.path.exists(path):
+            os.unlink(path)
+
+class EEGRecorder:
+    """Appends a session's EEG to flat binary files as it streams.
+
+    Samples are stored sample-major ((samples, channels), C order) so a
+    recording can be read back, or copied into an .npy entry, chunk by chunk.
+    """
+    def __init__(self, data_dir: str, session_id: str, channels: int, fs: float, dtype, kind: str):
+        self.paths = recording_paths(data_dir, session_id)
+        os.makedirs(os.path.dirname(self.paths["meta"]), exist_ok=True)
+        self.dtype = np.dtype(dtype)
+        with open(self.paths["meta"], 'w') as f:
+            json.dump({"kind": kind, "channels": channels, "fs": fs, "dtype": self.dtype.str}, f)
+        self.samples = open(self.paths["samples"], 'ab')
+        self.timestamps = open(self.paths["timestamps"], 'ab')
+
+    def append(self, data, timestamps):
+        """data is (channels, samples) as the pipeline produces it"""
+        self.samples.write(np.ascontiguousarray(data.T, dtype=self.dtype).tobytes())
+        self.timestamps.write(np.asarray(timestamps, dtype=np.float64).tobytes())
+
+    def close(self):
+        self.samples.close()
+        self.timestamps.close()
+
+class EEGRecording:
+    """Read side of an EEGRecorder's files"""
+    def __init__(self, data_dir: str, session_id: str):
+        self.paths = recording_paths(data_dir, session_id)
+        with open(self.paths["meta"], 'r') as f:
+            meta = json.load(f)
+        self.kind = meta["kind"]
+        self.channels = meta["channels"]
+        self.fs = meta["fs"]
+        self.dtype = np.dtype(meta["dtype"])
+        # Snapshot the length, so an export of a live session is self-consistent
+        self.n_samples = min(
+            os.path.getsize(self.paths["samples"]) // (self.channels * self.dtype.itemsize),
+            os.path.getsize(self.paths["timestamps"]) // 8)
+
+    @classmethod
+    def open(cls, data_dir: str, session_id: str):
+        """The session's recording, or None if it was not recorded"""
+        if not os.path.exists(recording_paths(data_dir, session_id)["meta"]):
+            return None
+        return cls(data_dir, session_id)
+
+    def chunks(self, chunk_samples: int):
+        """Yield (samples (n, channels), timestamps (n,)) without loading the whole recording"""
+        frame_bytes = self.channels * self.dtype.itemsize
+        with open(self.paths["samples"], 'rb') as samples, open(self.paths["timestamps"], 'rb') as timestamps:
+            for start in range(0, self.n_samples, chunk_samples):
+                n = min(chunk_samples, self.n_samples - start)
+                data = np.frombuffer(samples.read(n * frame_bytes), dtype=self.dtype).reshape(n, self.channels)
+                yield data, np.frombuffer(timestamps.read(n * 8), dtype=np.float64)
@@ -0,0 +1,73 @@
+import numpy as np
+
+class RingBuffer:
+    """Fixed-capacity (channels, samples) buffer with a timestamp per sample.
+
+    Safe for one writer thread and one reader thread without a lock: the
+    writer fills the slots first and publishes them by advancing
+    total_written, and readers snapshot total_written once per read.
+    """
+    def __init__(self, channels: int, capacity: int, dtype=np.float64):
+        self.channels = channels
+        self.capacity = capacity
+        self.data = np.zeros((channels, capacity), dtype=dtype)
+        self.timestamps = np.zeros(capacity)
+        self.total_written = 0
+
+    def __len__(self):
+        return min(self.total_written, self.capacity)
+
+    @property
+    def last_timestamp(self):
+        if self.total_written == 0:
+            return None
+        return self.timestamps[(self.total_written - 1) % self.capacity]
+
+    def write(self, data, timestamps):
+        """Append samples, skipping any at or before the last written timestamp"""
+        if self.total_written:
+            fresh = timestamps > self.last_timestamp
+            data, timestamps = data[:, fresh], timestamps[fresh]
+        n = len(timestamps)
+        if n == 0:
+            return 0
+        if n > self.capacity:
+            data, timestamps = data[:, -self.capacity:], timestamps[-self.capacity:]
+            self.total_written += n - self.capacity
+            n = self.capacity
+
+        start = self.total_written % self.capacity
+        first = min(n, self.capacity - start)
+        self.data[:, start:start + first] = data[:, :first]
+        self.timestamps[start:start + first] = timestamps[:first]
+        if first < n:
+            self.data[:, :n - first] = data[:, first:]
+            self.timestamps[:n - first] = timestamps[first:]
+        self.total_written += n
+        return n
+
+    def latest(self, n: int, end: int = None):
+        """Most recent n samples (up to sample count end) in time order as (data, timestamps)"""
+        end = self.total_written if end is None else end
+        n = min(n, end, self.capacity)
+        idx = (np.arange(end - n, end)) % self.capacity
+        return self.data[:, idx], self.timestamps[idx]
+
+    def read_since(self, cursor: int):
+        """Samples written after cursor (an earlier total_written), plus the new cursor"""
+        end = self.total_written
+        data, timestamps = self.latest(end - cursor, end)
+        return data, timestamps, end
+
+    def window(self, start_ts: float, end_ts: float):
+        """Samples with start_ts < timestamp <= end_ts"""
+        data, timestamps = self.latest(len(self))
+        mask = (timestamps > start_ts) & (timestamps <= end_ts)
+        return data[:, mask], timestamps[mask]
+
+    def interpolate(self, timestamps):
+        """Resample the buffered stream onto another timeline (e.g. the EEG timestamps)"""
+        data, own_timestamps = self.latest(len(self))
+        if len(own_timestamps) == 0:
+            return np.zeros((self.channels, len(timestamps)), dtype=self.data.dtype)
+        return np.stack([np.interp(timestamps, own_timestamps, row) for row in data])
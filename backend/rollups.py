@@ -0,0 +1,106 @@
+import math
+from bisect import bisect_left
+from typing import Dict, List
+import numpy as np
+
+RESOLUTIONS = (1, 10, 60)  # Bucket widths in seconds, finest first
+DEFAULT_MAX_POINTS = 600
+
+class Rollup:
+    """min, max, sum and count of a series in fixed-width time buckets"""
+    def __init__(self, resolution: int, data: Dict = None):
+        self.resolution = resolution
+        data = data or {}
+        self.starts: List[float] = data.get('t', [])
+        self.mins: List[float] = data.get('min', [])
+        self.maxs: List[float] = data.get('max', [])
+        self.sums: List[float] = data.get('sum', [])
+        self.counts: List[int] = data.get('count', [])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def add(self, timestamp: float, value: float):
+        start = math.floor(timestamp / self.resolution) * self.resolution
+        if self.starts and self.starts[-1] == start:
+            i = len(self.starts) - 1
+        else:
+            # Scores normally arrive in time order, so this is an append
+            i = bisect_left(self.starts, start)
+            if i == len(self.starts) or self.starts[i] != start:
+                self.starts.insert(i, start)
+                self.mins.insert(i, value)
+                self.maxs.insert(i, value)
+                self.sums.insert(i, 0.0)
+                self.counts.insert(i, 0)
+        self.mins[i] = min(self.mins[i], value)
+        self.maxs[i] = max(self.maxs[i], value)
+        self.sums[i] += value
+        self.counts[i] += 1
+
+    def to_dict(self):
+        return {'t': self.starts, 'min': self.mins, 'max': self.maxs, 'sum': self.sums, 'count': self.counts}
+
+class SessionRollups:
+    """Attention score rollups of one session at every resolution, updated per score"""
+    def __init__(self, data: Dict = None):
+        data = data or {}
+        self.levels = {resolution: Rollup(resolution, data.get(str(resolution))) for resolution in RESOLUTIONS}
+
+    @classmethod
+    def from_scores(cls, scores: List[float], start_ts: float, rate_hz: float):
+        """Rebuild rollups for a session stored before rollups existed (scores assumed evenly spaced)"""
+        rollups = cls()
+        for i, score in enumerate(scores):
+            rollups.add(start_ts + i / rate_hz, score)
+        return rollups
+
+    def add(self, timestamp: float, value: float):
+        for rollup in self.levels.values():
+            rollup.add(timestamp, value)
+
+    def to_dict(self):
+        return {str(resolution): rollup.to_dict() for resolution, rollup in self.levels.items()}
+
+    def timeline(self, start: float = None, end: float = None, max_points: int = DEFAULT_MAX_POINTS) -> Dict:
+        """At most max_points buckets covering [start, end), from the finest resolution that fits.
+
+        Ranges too long even for the coarsest level are merged further in
+        groups of whole buckets, so the payload stays bounded.
+        """
+        finest = self.levels[RESOLUTIONS[0]]
+        if not len(finest):
+            return {"resolution": RESOLUTIONS[0], "t": [], "min": [], "max": [], "mean": [], "count": []}
+        start = finest.starts[0] if start is None else start
+        end = finest.starts[-1] + RESOLUTIONS[0] if end is None else end
+
+        for resolution in RESOLUTIONS:
+            rollup = self.levels[resolution]
+            lo = bisect_left(rollup.starts, math.floor(start / resolution) * resolution)
+            hi = bisect_left(rollup.starts, end)
+            if hi - lo <= max_points:
+                break
+
+        starts = np.array(rollup.starts[lo:hi], dtype=np.float64)
+        mins = np.array(rollup.mins[lo:hi], dtype=np.float64)
+        maxs = np.array(rollup.maxs[lo:hi], dtype=np.float64)
+        sums = np.array(rollup.sums[lo:hi], dtype=np.float64)
+        counts = np.array(rollup.counts[lo:hi], dtype=np.int64)
+        if len(starts) > max_points:
+            group = math.ceil(len(starts) / max_points)
+            edges = np.arange(0, len(starts), group)
+            starts = starts[edges]
+            mins = np.minimum.reduceat(mins, edges)
+            maxs = np.maximum.reduceat(maxs, edges)
+            sums = np.add.reduceat(sums, edges)
+            counts = np.add.reduceat(counts, edges)
+            resolution *= group
+
+        return {
+            "resolution": resolution,
+            "t": starts.tolist(),
+            "min": mins.tolist(),
+            "max": maxs.tolist(),
+            "mean": (sums / np.maximum(counts, 1)).tolist(),
+            "count": counts.tolist(),
+        }
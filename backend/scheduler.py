@@ -0,0 +1,92 @@
+import math
+import time
+import asyncio
+import numpy as np
+from collections import deque
+from itertools import takewhile
+from contextlib import contextmanager
+
+class TickScheduler:
+    """Fires ticks on absolute monotonic deadlines at a fixed rate.
+
+    Deadlines are start + n * period, so processing time never accumulates
+    into drift. When the loop falls more than a period behind, the missed
+    ticks are coalesced into the next one and counted as skipped. Lateness
+    (wake time minus deadline) is kept for the most recent ticks.
+    """
+    def __init__(self, rate_hz: float, history: int = 240, align: bool = False):
+        self.rate_hz = rate_hz
+        self.align = align  # Put deadlines on a shared grid so sessions at one rate tick together
+        self.period = 1.0 / rate_hz
+        self.next_period = None  # Set by set_rate, applied after the current tick
+        self.next_deadline = None
+        self.ticks = 0
+        self.skipped = 0
+        self.lateness = deque(maxlen=history)
+        self.tick_times = deque(maxlen=history)
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.next_deadline is None:
+            self.next_deadline = math.ceil(now / self.period) * self.period if self.align else now
+        elif now >= self.next_deadline + self.period:
+            missed = int((now - self.next_deadline) // self.period)
+            self.skipped += missed
+            self.next_deadline += missed * self.period
+
+        delay = self.next_deadline - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.tick_times.append(loop.time())
+        self.lateness.append(self.tick_times[-1] - self.next_deadline)
+        if self.next_period:
+            self.period, self.next_period = self.next_period, None
+            if self.align:
+                self.next_deadline = math.floor(self.next_deadline / self.period) * self.period
+        self.next_deadline += self.period
+        self.ticks += 1
+
+    def set_rate(self, rate_hz: float):
+        """Change the tick rate from the next tick on; a wait in progress keeps its deadline"""
+        self.rate_hz = rate_hz
+        self.next_period = 1.0 / rate_hz
+
+    def lateness_since(self, since: float) -> np.ndarray:
+        """Lateness in milliseconds of the ticks that fired at or after loop time `since`"""
+        recent = takewhile(lambda tick: tick[0] >= since, zip(reversed(self.tick_times), reversed(self.lateness)))
+        return np.array([late for _, late in recent]) * 1000
+
+    def stats(self):
+        lateness_ms = np.array(self.lateness) * 1000
+        p50, p95, p99 = np.percentile(lateness_ms, [50, 95, 99]) if len(lateness_ms) else (0.0, 0.0, 0.0)
+        span = self.tick_times[-1] - self.tick_times[0] if len(self.tick_times) > 1 else 0.0
+        return {
+            "rate_hz": self.rate_hz,
+            "measured_hz": (len(self.tick_times) - 1) / span if span else 0.0,
+            "ticks": self.ticks,
+            "skipped": self.skipped,
+            "lateness_p50_ms": float(p50),
+            "lateness_p95_ms": float(p95),
+            "lateness_p99_ms": float(p99),
+            "lateness_max_ms": float(lateness_ms.max()) if len(lateness_ms) else 0.0,
+        }
+
+class StageTimer:
+    """Smoothed duration of each named stage of a tick, in milliseconds"""
+    def __init__(self, alpha: float = 0.1):
+        self.alpha = alpha
+        self.ms = {}
+
+    @contextmanager
+    def time(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+
+    def record(self, stage: str, seconds: float):
+        ms = seconds * 1000
+        previous = self.ms.get(stage)
+        self.ms[stage] = ms if previous is None else previous + self.alpha * (ms - previous)
@@ -0,0 +1,134 @@
+import os
+import sys
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+from models import SessionData
+
+DEFAULT_CACHE_MB = 64.0
+SESSION_BASE_BYTES = 2048  # Model, datetimes, ids and dict overhead
+SCORE_BYTES = 32  # A float object plus its list slot
+DROP_BYTES = 400  # A small dict of floats
+
+def cache_budget_bytes() -> int:
+    """STUDYAMP_SESSION_CACHE_MB, the memory budget for session bodies"""
+    return int(float(os.getenv('STUDYAMP_SESSION_CACHE_MB', DEFAULT_CACHE_MB)) * 1024 * 1024)
+
+def estimate_bytes(session: SessionData) -> int:
+    """Approximate resident size of a session body, dominated by its score list"""
+    size = SESSION_BASE_BYTES
+    size += SCORE_BYTES * len(session.attention_scores or [])
+    size += DROP_BYTES * len(session.attention_drops or [])
+    size += sum(sys.getsizeof(summary) for summary in session.summaries or [])
+    return size
+
+class SessionCache:
+    """Least recently used session bodies in front of the SessionStore.
+
+    Sessions streaming in this worker are pinned: they are never evicted and
+    are always served from memory. Everything else is evicted, oldest use
+    first, once the estimated size of the cache exceeds the budget, and is
+    paged back in from the store by load(). Unpinned entries are checked
+    against their shard's modification time on every load, so a session
+    another worker keeps saving is read again once its shard changes.
+    """
+    def __init__(self, store, budget_bytes: int = None):
+        self.store = store
+        self.budget_bytes = cache_budget_bytes() if budget_bytes is None else budget_bytes
+        self.entries: "OrderedDict[str, SessionData]" = OrderedDict()
+        self.sizes: Dict[str, int] = {}  # Estimates of unpinned entries; pinned ones still grow
+        self.versions: Dict[str, Optional[int]] = {}  # Shard version each unpinned entry was read at
+        self.pinned: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, session_id: str) -> Optional[SessionData]:
+        """The cached body, without touching the store or the counters"""
+        return self.entries.get(session_id)
+
+    def load(self, session_id: str) -> Optional[SessionData]:
+        """The session from memory, else paged in from the store"""
+        session = self.entries.get(session_id)
+        if session is not None and session_id not in self.pinned:
+            if self.store.shard_version(session_id) != self.versions.get(session_id):
+                # Saved by another worker since it was read, or deleted
+                self.pop(session_id)
+                self.reloads += 1
+                session = None
+        if session is not None:
+            self.hits += 1
+            self.entries.move_to_end(session_id)
+            return session
+        self.misses += 1
+        session = self.store.load(session_id)
+        if session is not None:
+            self.put(session)
+        return session
+
+    def put(self, session: SessionData, pinned: bool = False):
+        session_id = session.session_id
+        self.entries[session_id] = session
+        self.entries.move_to_end(session_id)
+        if pinned:
+            self.pinned.add(session_id)
+            self.sizes.pop(session_id, None)
+            self.versions.pop(session_id, None)
+        elif session_id not in self.pinned:
+            self.sizes[session_id] = estimate_bytes(session)
+            self.versions[session_id] = self.store.shard_version(session_id)
+        self.evict()
+
+    def unpin(self, session_id: str):
+        """Make a session that stopped streaming evictable"""
+        self.pinned.discard(session_id)
+        session = self.entries.get(session_id)
+        if session is not None:
+            self.sizes[session_id] = estimate_bytes(session)
+            self.versions[session_id] = self.store.shard_version(session_id)
+            self.evict()
+
+    def pop(self, session_id: str, default=None):
+        self.pinned.discard(session_id)
+        self.sizes.pop(session_id, None)
+        self.versions.pop(session_id, None)
+        return self.entries.pop(session_id, default)
+
+    def size_bytes(self) -> int:
+        pinned = sum(estimate_bytes(self.entries[session_id]) for session_id in self.pinned if session_id in self.entries)
+        return pinned + sum(self.sizes.values())
+
+    def evict(self):
+        """Drop least recently used unpinned sessions until the cache fits its budget"""
+        size = self.size_bytes()
+        if size <= self.budget_bytes:
+            return
+        for session_id in list(self.entries):
+            if size <= self.budget_bytes:
+                break
+            if session_id in self.pinned:
+                continue
+            size -= self.sizes.pop(session_id)
+            self.versions.pop(session_id, None)
+            del self.entries[session_id]
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "pinned": len(self.pinned),
+            "bytes": self.size_bytes(),
+            "budget_bytes": self.budget_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "evictions": self.evictions,
+            "reloads": self.reloads,
+        }
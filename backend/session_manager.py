@@ -1,162 +1,423 @@
-import json
 import os
-from models import SessionData, EEGData
+import json
+import time
+from models import SessionData
 from typing import Dict, List
 from datetime import datetime, timezone
 import asyncio
 import uuid
 import logging
-from device_manager import DeviceManager
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from device_registry import DeviceRegistry
 from fastapi.websockets import WebSocket
-from signal_processor import SignalProcessor
+from pipeline import SessionPipeline
+from frame_encoder import FrameEncoder
+from frame_replay import ReplayBuffer, replay_capacity
+from rollups import DEFAULT_MAX_POINTS
+from exporter import SessionExporter
+from recorder import EEGRecorder, record_mode, delete_recording
+from acquisition import AcquisitionThread
+from batcher import DSPBatcher
+from scheduler import TickScheduler, StageTimer
+from session_store import SessionStore
+from session_cache import SessionCache
+from analytics import SessionAnalytics
+from profiler import Profiler
+from admission import AdmissionController
+from load_shedding import LoadShedder, TIERS, tier_channels
+from state_backend import StateBackend, create_state_backend, get_worker_id
 from asyncio import Lock
 
+LEASE_TTL = 10.0  # Seconds a worker owns a session's stream without renewing
+LEASE_RENEW_INTERVAL = 3.0
+RELAY_POLL_INTERVAL = 0.1
+DEFAULT_RATE_HZ = 4.0  # Frames per second unless the session asks for another rate
+
+def process_stats():
+    """CPU time and resident memory of this worker process"""
+    rss = None
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass  # Not Linux
+    return {"pid": os.getpid(), "cpu_seconds": time.process_time(), "rss_bytes": rss}
+
 class SessionManager:
-    def __init__(self):
-        self.sessions: Dict[str, SessionData] = {}
+    def __init__(self, state_backend: StateBackend = None, device_registry: DeviceRegistry = None):
         self.websockets: Dict[str, List[WebSocket]] = {}
         self.locks: Dict[str, Lock] = {}
+        self.replays: Dict[str, ReplayBuffer] = {}  # Recent frames per local session, for resuming clients
+        self.streams: Dict[str, Dict] = {}  # Live stream state per local session, for metrics
+        self.encoder = FrameEncoder()
+        # Shard, rollup and metadata writes, in order and off the event loop
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="store-writer")
+        self.score_sums: Dict[str, float] = {}  # Running score sum per streaming session, for average_attention
+        self.profiler = Profiler()
+        self.admission = AdmissionController(self)
+        self.shedder = LoadShedder(self)
+        # STUDYAMP_BATCH_DSP=1 runs every session's tick DSP as one stacked computation
+        self.batcher = DSPBatcher() if os.getenv('STUDYAMP_BATCH_DSP') == '1' else None
         self.data_dir = 'data'
-        self.data_file = os.path.join(self.data_dir, 'sessions.json')
         os.makedirs(self.data_dir, exist_ok=True)
+        self.state = state_backend or create_state_backend(self.data_dir)
+        self.worker_id = get_worker_id()
+        self.devices = device_registry or DeviceRegistry(state=self.state, owner=self.worker_id)
+        self.devices.start()
         self.load_sessions()
 
     def load_sessions(self):
-        try:
-            if os.path.exists(self.data_file):
-                with open(self.data_file, 'r') as f:
-                    sessions_data = json.load(f)
-                    for session_id, session_info in sessions_data.items():
-                        session_info['start_time'] = datetime.fromisoformat(session_info['start_time'])
-                        if session_info.get('end_time'):
-                            session_info['end_time'] = datetime.fromisoformat(session_info['end_time'])
-                        self.sessions[session_id] = SessionData(**session_info)
-        except Exception as e:
-            logging.error(f"Error loading sessions: {e}")
+        """Load the session manifest; bodies are paged in by get_session"""
+        self.store = SessionStore(self.data_dir)
+        self.sessions = SessionCache(self.store)
+        self.analytics = SessionAnalytics(self.store)
+        self.analytics_backfilled = False
 
-    def save_sessions(self):
-        try:
-            with open(self.data_file, 'w') as f:
-                sessions_data = {
-                    session_id: {
-                        **session.model_dump(),
-                        'start_time': session.start_time.isoformat(),
-                        'end_time': session.end_time.isoformat() if session.end_time else None
-                    }
-                    for session_id, session in self.sessions.items()
-                }
-                json.dump(sessions_data, f, indent=2)
-        except Exception as e:
-            logging.error(f"Error saving sessions: {e}")
+    def shutdown(self):
+        """Stop the boards and let queued store writes finish"""
+        self.devices.shutdown()
+        self.writer.shutdown(wait=True)
+
+    def save_session(self, session_id: str, rollups: bool = False):
+        """Queue a write of the session's shard (and its rollups) on the store writer thread.
 
-    def create_session(self):
+        The score list is copied here, so the writer never dumps a list that
+        is still growing. Writes run one at a time, in the order queued.
+        """
+        session = self.sessions.get(session_id)
+        if session:
+            snapshot = session.model_copy(update={"attention_scores": list(session.attention_scores or [])})
+            self.writer.submit(self.store.save, snapshot)
+        if rollups:
+            data = self.store.rollup_snapshot(session_id)
+            if data is not None:
+                self.writer.submit(self.store.write_rollups, session_id, data)
+
+    def create_session(self, rate_hz: float = DEFAULT_RATE_HZ, priority: int = 1):
+        # Raises AdmissionRejected at the session cap or while the worker is overloaded
+        self.admission.check_session()
         session_id = str(uuid.uuid4())
+        # Raises NoDeviceAvailable when the pool is exhausted; preparation happens in the background
+        device_id = self.devices.allocate(session_id)
         session = SessionData(
             session_id=session_id,
             start_time=datetime.now(timezone.utc),
             user_id="user_1",
-            device_id="device_1",
-            status="active"
+            device_id=device_id,
+            status="active",
+            rate_hz=rate_hz,
+            priority=priority
         )
-        self.sessions[session_id] = session
+        self.sessions.put(session, pinned=True)
         self.websockets[session_id] = []
         self.locks[session_id] = Lock()
-        self.save_sessions()
+        self.replays[session_id] = ReplayBuffer(replay_capacity(rate_hz))
+        self.save_session(session_id)
+        self.state.set_status(session_id, "active")
+        self.state.acquire_lease(session_id, self.worker_id, LEASE_TTL)
         # Start data streaming task
         asyncio.create_task(self.stream_data(session_id))
         return session
 
-    def end_session(self, session_id: str):
-        if session_id in self.sessions:
-            self.sessions[session_id].status = "ended"
-            self.sessions[session_id].end_time = datetime.now(timezone.utc)
-            self.save_sessions()
+    def end_session(self, session_id: str) -> bool:
+        """Mark a session ended and finalize it if this worker owns it; False for an unknown id"""
+        if self.state.get_status(session_id) is None and session_id not in self.store:
+            return False
+        self.state.set_status(session_id, "ended")
+        owner = self.state.get_owner(session_id)
+        if owner and owner != self.worker_id:
+            return True  # The owning worker's stream loop sees the status and finalizes
+        session = self.get_session(session_id)
+        if session and session.status != "ended":
+            session.status = "ended"
+            session.end_time = datetime.now(timezone.utc)
+            self.save_session(session_id)
+            self.analytics.record(session, self.store.get_rollups(session_id))
+            self.writer.submit(self.store.flush_rollups, session_id)
+            self.score_sums.pop(session_id, None)
+            self.sessions.unpin(session_id)
             # Clean up resources
-            del self.locks[session_id]
-            del self.websockets[session_id]
+            self.locks.pop(session_id, None)
+            self.websockets.pop(session_id, None)
+            self.replays.pop(session_id, None)
+            self.state.release_lease(session_id, self.worker_id)
+        return True
 
     def get_status(self, session_id: str):
-        session = self.sessions.get(session_id)
-        if session:
-            return {"status": session.status}
+        status = self.state.get_status(session_id)
+        if status:
+            return {"status": status}
+        entry = self.store.get_entry(session_id)
+        if entry:
+            return {"status": entry['status']}
         else:
             return {"status": "not found"}
 
+    def is_local(self, session_id: str) -> bool:
+        """True when this worker runs the session's stream task"""
+        return session_id in self.websockets
+
     def get_session(self, session_id: str):
-        return self.sessions.get(session_id)
+        return self.sessions.load(session_id)
 
     def get_all_sessions(self, limit: int = 10, status: str = None):
         """Get recent sessions with optional filtering"""
         try:
-            sessions = list(self.sessions.values())
-            
-            # Filter by status if provided
-            if status:
-                sessions = [s for s in sessions if s.status == status]
-            
-            # Sort by start time (newest first)
-            sessions.sort(key=lambda x: x.start_time, reverse=True)
-            
-            # Apply limit
-            sessions = sessions[:limit]
-            
-            return sessions
+            # Filter and sort (newest first) on the manifest, then page in only what is returned
+            session_ids = self.store.query(limit=limit, status=status)
+            sessions = [self.get_session(session_id) for session_id in session_ids]
+            return [s for s in sessions if s]
         except Exception as e:
             logging.error(f"Error retrieving sessions: {e}")
             return []
 
     async def stream_data(self, session_id: str):
-        # Instantiate device and signal processors per session
-        device_manager = DeviceManager()
-        signal_processor = SignalProcessor()
+        device_id = self.sessions.get(session_id).device_id
+        ready = asyncio.ensure_future(self.devices.wait_ready(device_id))
+        while not ready.done():
+            # Keep the lease while the board is prepared, so relays do not take the session for orphaned
+            await asyncio.wait({ready}, timeout=LEASE_RENEW_INTERVAL)
+            self.state.acquire_lease(session_id, self.worker_id, LEASE_TTL)
+        device_manager = ready.result()
+        if device_manager is None:
+            logging.error(f"Device {device_id} failed to start for session {session_id}")
+            self.devices.release(device_id)
+            self.end_session(session_id)
+            return
+
+        pipeline = SessionPipeline(ppg_fs=device_manager.ppg_fs, dtype=device_manager.dtype)
+        loop = asyncio.get_event_loop()
+        last_renew = loop.time()
+        ppg_cursor = 0
+        session = self.sessions.get(session_id)
+        scheduler = TickScheduler(session.rate_hz, align=self.batcher is not None)
+        timer = StageTimer()
+        mode = record_mode()
+        recorder = mode and EEGRecorder(
+            self.data_dir, session_id, len(device_manager.eeg_rows), device_manager.fs, device_manager.dtype, mode)
+
+        def process_tick(raw_data, timestamps, new_ppg):
+            result = pipeline.process(raw_data, timestamps, device_manager.get_aux_data(), new_ppg)
+            record(raw_data, timestamps, result)
+            return result
+
+        def record(raw_data, timestamps, result):
+            if recorder:
+                recorder.append(raw_data if mode == 'raw' else result["filtered"], timestamps)
+
+        acquisition = AcquisitionThread(device_manager, loop, hop_samples=max(1, int(device_manager.fs * scheduler.period)))
+        acquisition.start()
+        stream = self.streams[session_id] = {
+            "scheduler": scheduler, "acquisition": acquisition, "pipeline": pipeline, "timer": timer,
+            "frames_sent": 0, "frames_dropped": 0,
+            # Quality tier index into TIERS, moved by the LoadShedder
+            "tier": 0, "tier_changes": 0, "priority": session.priority, "rate_hz": session.rate_hz,
+        }
         try:
             while True:
                 session = self.sessions.get(session_id)
                 if not session or session.status != "active":
                     break  # Exit if session is not active
+                if loop.time() - last_renew > LEASE_RENEW_INTERVAL:
+                    # The shared state can block on another worker's write, so it is only asked off the loop
+                    status, leased = await loop.run_in_executor(None, self.renew_lease, session_id)
+                    if status != "active":
+                        self.end_session(session_id)  # Ended through another worker
+                        break
+                    if not leased:
+                        logging.error(f"Lost lease on session {session_id}")
+                        break
+                    if not self.devices.holds(device_id):
+                        break  # Another worker claimed the board; ended below
+                    last_renew = loop.time()
 
-                # Fetch and process data asynchronously
-                raw_data = await asyncio.get_event_loop().run_in_executor(
-                    None, device_manager.get_data)
-                if len(raw_data) == 0:
+                # Tick on the session's deadline, then take everything acquired since the last one
+                await scheduler.wait()
+                self.shedder.maybe_step(loop.time())
+                if acquisition.backlog == 0 and not await acquisition.wait(timeout=scheduler.period):
                     logging.warning("No data received from device.")
-                    await asyncio.sleep(0.25)
                     continue
+                # None unless a profile of this session was requested through /api/admin/profile
+                capture = self.profiler.for_session(session_id)
+                profiling = capture.profile if capture else nullcontext
+                with timer.time("read"), profiling():
+                    raw_data, timestamps = acquisition.read()
+                    new_ppg, ppg_cursor = device_manager.read_new_ppg(ppg_cursor)
+                with timer.time("process"):
+                    if self.batcher:
+                        result = await self.batcher.process(
+                            pipeline, raw_data, timestamps, device_manager.get_aux_data(), new_ppg,
+                            after=lambda result: record(raw_data, timestamps, result))
+                    elif capture:
+                        result = await loop.run_in_executor(
+                            None, capture.call, process_tick, raw_data, timestamps, new_ppg)
+                    else:
+                        result = await loop.run_in_executor(None, process_tick, raw_data, timestamps, new_ppg)
+                timestamp = float(timestamps[-1])
+                replay = self.replays.get(session_id)
+                if replay is None:
+                    break  # Ended while this frame was processed
+                seq = replay.last_seq + 1
 
-                filtered_data = await asyncio.get_event_loop().run_in_executor(
-                    None, signal_processor.filter_signal, raw_data)
-                attention_score = await asyncio.get_event_loop().run_in_executor(
-                    None, signal_processor.calculate_attention, filtered_data)
-                eeg_data = EEGData(
-                    timestamp=datetime.utcnow().timestamp(),
-                    attention_score=attention_score,
-                    eeg_channels=filtered_data.tolist(),
-                    device_status={"battery": 80}
-                )
+                # Windows flagged as artifacts do not count towards the session
+                if result["clean"]:
+                    with timer.time("store"), profiling():
+                        self.update_session_metrics(session_id, result["attention_score"], timestamp=timestamp)
 
-                self.update_session_metrics(session_id, attention_score)
+                # Encoded once; every subscriber and the relay get the same text
+                with timer.time("encode"), profiling():
+                    tier = stream["tier"]
+                    frame = self.encoder.encode(
+                        timestamp, result["attention_score"], result["filtered"] if tier_channels(tier) else None,
+                        {"battery": 80, **device_manager.get_stats()}, result["artifacts"], result["hrv"],
+                        seq=seq, tier=TIERS[tier])
+                replay.append(seq, timestamp, frame)
+                if self.state.shared:
+                    # Let other workers relay this frame to their websocket clients
+                    with timer.time("publish"):
+                        self.state.publish_frame(session_id, seq, frame)
 
                 # Broadcast data to all connected websockets
-                async with self.locks[session_id]:
-                    for websocket in self.websockets[session_id]:
+                lock = self.locks.get(session_id)
+                if lock is None:
+                    break  # Ended while this frame was processed
+                async with lock:
+                    send_start = loop.time()
+                    for websocket in list(self.websockets[session_id]):
                         try:
-                            await websocket.send_json(eeg_data.model_dump())
+                            await websocket.send_text(frame)
+                            stream["frames_sent"] += 1
                         except Exception as e:
+                            stream["frames_dropped"] += 1
                             logging.error(f"Failed to send data: {e}")
                             await websocket.close()
                             self.websockets[session_id].remove(websocket)
-
-                await asyncio.sleep(0.25)  # Adjust streaming rate as needed
+                    timer.record("send", loop.time() - send_start)
+                if capture:
+                    capture.count()
         except Exception as e:
             logging.error(f"Error in stream_data: {e}")
         finally:
-            device_manager.stop()
+            if self.state.get_status(session_id) == "active":
+                # Stopped by a lost lease or an error rather than by ending the session
+                logging.error(f"Stream of session {session_id} stopped unexpectedly; ending the session")
+                try:
+                    self.end_session(session_id)
+                except Exception as e:
+                    logging.error(f"Error ending session {session_id}: {e}")
+            acquisition.stop()
+            if recorder:
+                recorder.close()
+            self.devices.release(device_id)
+            self.streams.pop(session_id, None)
+            self.sessions.unpin(session_id)
+            self.state.release_lease(session_id, self.worker_id)
+
+    def gap_message(self, session_id: str, first_seq: int, last_seq: int, start: float = None, end: float = None) -> str:
+        """One message standing in for frames first_seq..last_seq that can no longer be replayed.
+
+        It carries the attention timeline of the missed time range when that
+        range is known, so a client can restore its chart and drop history.
+        """
+        timeline = None
+        if end is not None and (start is not None or first_seq == 1):
+            rollups = self.store.get_rollups(session_id)
+            timeline = rollups.timeline(start, end) if rollups else None
+        return json.dumps({
+            "type": "gap", "from_seq": first_seq, "to_seq": last_seq, "start": start, "end": end, "timeline": timeline,
+        })
+
+    async def attach_websocket(self, session_id: str, websocket: WebSocket, since: int = None):
+        """Subscribe a websocket to a local session, first replaying the frames after seq `since`"""
+        lock = self.locks.get(session_id)
+        if lock is None:
+            return
+        # Under the broadcast lock, so no frame falls between the replay and the live stream
+        async with lock:
+            replay = self.replays.get(session_id)
+            if since is not None and replay:
+                gap, frames = replay.since(since)
+                if gap:
+                    await websocket.send_text(self.gap_message(
+                        session_id, *gap, start=replay.timestamp(since), end=replay.timestamp(gap[1])))
+                for _, frame in frames:
+                    await websocket.send_text(frame)
+            self.register_websocket(session_id, websocket)
+
+    async def relay_frames(self, session_id: str, websocket: WebSocket, since: int = None):
+        """Forward frames published by the owning worker to a websocket connected here"""
+        loop = asyncio.get_event_loop()
+        frames = await loop.run_in_executor(None, self.state.fetch_frames, session_id, since or 0)
+        if since is None:
+            last_seq = frames[-1][0] if frames else 0
+        else:
+            # Resume from the shared frame log; older frames are only summarized
+            if frames and frames[0][0] > since + 1:
+                end = json.loads(frames[0][1])["timestamp"]
+                await websocket.send_text(self.gap_message(session_id, since + 1, frames[0][0] - 1, end=end))
+            for seq, payload in frames:
+                await websocket.send_text(payload)
+            last_seq = frames[-1][0] if frames else since
+        last_owner_check = loop.time()
+        while await loop.run_in_executor(None, self.state.get_status, session_id) == "active":
+            if loop.time() - last_owner_check > LEASE_RENEW_INTERVAL:
+                last_owner_check = loop.time()
+                if await loop.run_in_executor(None, self.state.get_owner, session_id) is None:
+                    # The owner stopped renewing its lease (crashed or stalled); nobody streams the session
+                    logging.error(f"Lease on session {session_id} expired; ending the orphaned session")
+                    self.end_session(session_id)
+                    await websocket.close(code=1011)
+                    return
+            frames = await loop.run_in_executor(None, self.state.fetch_frames, session_id, last_seq)
+            for seq, payload in frames:
+                await websocket.send_text(payload)
+                last_seq = seq
+            await asyncio.sleep(RELAY_POLL_INTERVAL)
+
+    def renew_lease(self, session_id: str):
+        """(shared status, lease renewed) of a session this worker streams; runs in the executor"""
+        status = self.state.get_status(session_id)
+        return status, status == "active" and self.state.acquire_lease(session_id, self.worker_id, LEASE_TTL)
+
+    def stream_stats(self, session_id: str, stream: Dict):
+        acquisition = stream["acquisition"]
+        return {
+            **stream["scheduler"].stats(),
+            "tier": TIERS[stream["tier"]],
+            "tier_changes": stream["tier_changes"],
+            "priority": stream["priority"],
+            "subscribers": len(self.websockets.get(session_id, [])),
+            "backlog_samples": acquisition.backlog,
+            "overruns": acquisition.overruns,
+            "frames_sent": stream["frames_sent"],
+            "frames_dropped": stream["frames_dropped"],
+            "stages_ms": {**stream["timer"].ms, **stream["pipeline"].timer.ms},
+        }
+
+    def get_metrics(self):
+        """Tick timing, stage timings and delivery counters of sessions streaming in this worker"""
+        return {
+            "worker_id": self.worker_id,
+            "process": process_stats(),
+            "store": self.store.stats(),
+            "cache": self.sessions.stats(),
+            "encoder": self.encoder.stats(),
+            "batch": self.batcher.stats() if self.batcher else None,
+            "admission": self.admission.stats(),
+            "shedding": self.shedder.stats(),
+            "sessions": {
+                session_id: self.stream_stats(session_id, stream)
+                for session_id, stream in list(self.streams.items())
+            },
+        }
 
-    def update_session_metrics(self, session_id: str, attention_score: float, attention_drop: Dict = None):
+    def update_session_metrics(self, session_id: str, attention_score: float, attention_drop: Dict = None, timestamp: float = None):
         """Update session metrics during streaming"""
         try:
-            if session_id in self.sessions:
-                session = self.sessions[session_id]
+            session = self.sessions.get(session_id)
+            if session:
+                bucket_closed = self.store.add_score(session_id, timestamp or time.time(), attention_score)
                 # Initialize empty list if needed
                 if not session.attention_scores:
                     session.attention_scores = []
@@ -164,9 +425,12 @@ class SessionManager:
                 # Add new score
                 session.attention_scores.append(attention_score)
                 
-                # Update average
-                if session.attention_scores:
-                    session.average_attention = sum(session.attention_scores) / len(session.attention_scores)
+                # Update average from a running sum, so a tick costs the same however long the session
+                total = self.score_sums.get(session_id)
+                if total is None:
+                    total = sum(session.attention_scores[:-1])
+                total = self.score_sums[session_id] = total + attention_score
+                session.average_attention = total / len(session.attention_scores)
                 
                 # Handle attention drops
                 if attention_drop:
@@ -174,15 +438,37 @@ class SessionManager:
                         session.attention_drops = []
                     session.attention_drops.append(attention_drop)
                 
-                self.save_sessions()
+                # Persisted when a rollup bucket closes (every 10 s) and at session end, not per tick
+                if bucket_closed or attention_drop:
+                    self.save_session(session_id, rollups=True)
         except Exception as e:
             logging.error(f"Error updating session metrics: {e}")
 
+    def get_timeline(self, session_id: str, start: float = None, end: float = None, max_points: int = DEFAULT_MAX_POINTS):
+        """Attention score chart data at a resolution bounded by max_points"""
+        rollups = self.store.get_rollups(session_id)
+        if rollups is None:
+            return None
+        return {"session_id": session_id, **rollups.timeline(start, end, max_points)}
+
+    def get_analytics(self, group_by: str, start: float = None, end: float = None, user_id: str = None,
+                      status: str = None, utc_offset: int = 0):
+        """Attention and drop statistics grouped across sessions, from their aggregates"""
+        if not self.analytics_backfilled:
+            self.analytics.backfill()
+            self.analytics_backfilled = True
+        return self.analytics.query(group_by, start, end, user_id, status, utc_offset)
+
+    def export(self, session_ids: List[str], format: str, include_eeg: bool = True):
+        """Chunked export body; raises ExportUnavailable when the format's package is missing"""
+        return SessionExporter(self.store, self.data_dir, session_ids, include_eeg).stream(format)
+
     def update_session_summaries(self, session_id: str, summaries: List[str]):
         """Add analysis summaries to session"""
-        if session_id in self.sessions:
-            self.sessions[session_id].summaries = summaries
-            self.save_sessions()
+        session = self.get_session(session_id)
+        if session:
+            session.summaries = summaries
+            self.save_session(session_id)
 
     def register_websocket(self, session_id: str, websocket):
         if session_id in self.websockets:
@@ -198,16 +484,19 @@ class SessionManager:
     def delete_session(self, session_id: str):
         """Permanently delete a session and save changes"""
         try:
-            if session_id in self.sessions:
+            if session_id in self.store:
                 # Clean up any active connections
                 if session_id in self.websockets:
                     del self.websockets[session_id]
                 if session_id in self.locks:
                     del self.locks[session_id]
                 
-                # Remove session
-                del self.sessions[session_id]
-                self.save_sessions()
+                # Remove session, after any of its writes still queued
+                self.sessions.pop(session_id, None)
+                self.writer.submit(self.store.delete, session_id).result()
+                self.analytics.delete(session_id)
+                delete_recording(self.data_dir, session_id)
+                self.state.delete(session_id)
             else:
                 raise ValueError(f"Session {session_id} not found")
         except Exception as e:
@@ -0,0 +1,324 @@
+import json
+import os
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from models import SessionData
+from rollups import SessionRollups, RESOLUTIONS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Fields kept in the manifest so listing and status lookups never touch a shard
+INDEX_FIELDS = ('user_id', 'device_id', 'status')
+
+class SessionStore:
+    """Per-session shard storage with a small manifest index.
+
+    Layout under data_dir:
+        manifest.json          session_id -> index entry (status, times, ids)
+        sessions/<id>.json     full SessionData body for one session
+        sessions/<id>.meta.json  the body without its attention scores, for exports
+        rollups/<id>.json      attention score rollups for timeline charts
+        aggregates.ndjson      per-session summary rows for analytics, appended as sessions end
+    """
+    def __init__(self, data_dir: str = 'data'):
+        self.data_dir = data_dir
+        self.shard_dir = os.path.join(data_dir, 'sessions')
+        self.rollup_dir = os.path.join(data_dir, 'rollups')
+        self.manifest_file = os.path.join(data_dir, 'manifest.json')
+        self.legacy_file = os.path.join(data_dir, 'sessions.json')
+        self.lock_file = os.path.join(data_dir, 'manifest.lock')
+        self.aggregate_file = os.path.join(data_dir, 'aggregates.ndjson')
+        self.manifest: Dict[str, Dict] = {}
+        self.manifest_mtime = None
+        self.meta_keys: Dict[str, Dict] = {}  # Last metadata written per active session
+        self.rollups: Dict[str, SessionRollups] = {}  # Sessions receiving scores
+        # Write counters, for write amplification and latency metrics
+        self.writes = 0
+        self.bytes_written = 0
+        self.write_seconds = 0.0
+        self.max_write_seconds = 0.0
+        os.makedirs(self.shard_dir, exist_ok=True)
+        os.makedirs(self.rollup_dir, exist_ok=True)
+        self.load_manifest()
+
+    def load_manifest(self):
+        """Load the index only; shards are read lazily by load()"""
+        try:
+            if os.path.exists(self.manifest_file):
+                self._read_manifest()
+            elif os.path.exists(self.legacy_file):
+                with self._manifest_lock():
+                    if not os.path.exists(self.manifest_file):
+                        self._migrate_legacy()
+                    else:
+                        self._read_manifest()
+        except Exception as e:
+            logging.error(f"Error loading session manifest: {e}")
+
+    def _read_manifest(self):
+        mtime = os.stat(self.manifest_file).st_mtime_ns
+        with open(self.manifest_file, 'r') as f:
+            self.manifest = json.load(f)
+        self.manifest_mtime = mtime
+
+    def refresh(self):
+        """Pick up manifest changes written by other worker processes"""
+        try:
+            mtime = os.stat(self.manifest_file).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self.manifest_mtime:
+            self._read_manifest()
+
+    @contextmanager
+    def _manifest_lock(self):
+        """Serialize manifest read-modify-write across worker processes"""
+        with open(self.lock_file, 'a+') as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _update_manifest(self, session_id: str, entry: Optional[Dict]):
+        """Merge one entry into the latest on-disk manifest (entry=None removes it)"""
+        with self._manifest_lock():
+            self.refresh()
+            if entry is None:
+                self.manifest.pop(session_id, None)
+            else:
+                self.manifest[session_id] = entry
+            self._write_manifest()
+
+    def _migrate_legacy(self):
+        """Split a monolithic sessions.json into shards (runs once)"""
+        logging.info(f"Migrating {self.legacy_file} to per-session shards")
+        with open(self.legacy_file, 'r') as f:
+            sessions_data = json.load(f)
+        for session_id, session_info in sessions_data.items():
+            session = SessionData(**session_info)
+            self._write_shard(session)
+            self.manifest[session_id] = self._index_entry(session)
+        self._write_manifest()
+        os.replace(self.legacy_file, self.legacy_file + '.migrated')
+
+    def _shard_path(self, session_id: str) -> str:
+        return os.path.join(self.shard_dir, f"{session_id}.json")
+
+    def _meta_path(self, session_id: str) -> str:
+        return os.path.join(self.shard_dir, f"{session_id}.meta.json")
+
+    def _index_entry(self, session: SessionData) -> Dict:
+        entry = {field: getattr(session, field) for field in INDEX_FIELDS}
+        entry['start_ts'] = session.start_time.timestamp()
+        entry['end_ts'] = session.end_time.timestamp() if session.end_time else None
+        return entry
+
+    def _write_atomic(self, path: str, data, **dump_kwargs):
+        start = time.perf_counter()
+        tmp_path = f"{path}.tmp"
+        content = json.dumps(data, **dump_kwargs)
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        elapsed = time.perf_counter() - start
+        self.writes += 1
+        self.bytes_written += len(content)
+        self.write_seconds += elapsed
+        self.max_write_seconds = max(self.max_write_seconds, elapsed)
+
+    def stats(self):
+        return {
+            "writes": self.writes,
+            "bytes_written": self.bytes_written,
+            "write_ms_avg": 1000 * self.write_seconds / self.writes if self.writes else 0.0,
+            "write_ms_max": 1000 * self.max_write_seconds,
+        }
+
+    def _write_shard(self, session: SessionData):
+        body = session.model_dump(mode='json')
+        self._write_atomic(self._shard_path(session.session_id), body)
+        del body['attention_scores']
+        # The live average is left out of the comparison (exports take it from the rollups), so
+        # the metadata file is only rewritten when status, times, device, drops or summaries change
+        key = {name: value for name, value in body.items() if name != 'average_attention'}
+        if self.meta_keys.get(session.session_id) != key:
+            self._write_atomic(self._meta_path(session.session_id), body)
+            if session.status == "ended":
+                self.meta_keys.pop(session.session_id, None)
+            else:
+                self.meta_keys[session.session_id] = key
+
+    def _write_manifest(self):
+        self._write_atomic(self.manifest_file, self.manifest, indent=2)
+        self.manifest_mtime = os.stat(self.manifest_file).st_mtime_ns
+
+    def __contains__(self, session_id: str) -> bool:
+        self.refresh()
+        return session_id in self.manifest
+
+    def get_entry(self, session_id: str) -> Optional[Dict]:
+        self.refresh()
+        return self.manifest.get(session_id)
+
+    def shard_version(self, session_id: str) -> Optional[int]:
+        """Modification time of the session's shard, None when it has none"""
+        try:
+            return os.stat(self._shard_path(session_id)).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self, session_id: str) -> Optional[SessionData]:
+        """Page a full session body in from its shard"""
+        if session_id not in self:
+            return None
+        try:
+            with open(self._shard_path(session_id), 'r') as f:
+                return SessionData(**json.load(f))
+        except Exception as e:
+            logging.error(f"Error loading session {session_id}: {e}")
+            return None
+
+    def load_info(self, session_id: str) -> Optional[Dict]:
+        """The session body without its attention scores, read from the small metadata file"""
+        if session_id not in self:
+            return None
+        try:
+            with open(self._meta_path(session_id), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            # Saved before metadata files existed
+            session = self.load(session_id)
+            return session and session.model_dump(mode='json', exclude={'attention_scores'})
+        except Exception as e:
+            logging.error(f"Error loading session {session_id} metadata: {e}")
+            return None
+
+    def save(self, session: SessionData):
+        """Write the session's shard, and the manifest only if its index entry changed"""
+        try:
+            self._write_shard(session)
+            entry = self._index_entry(session)
+            if self.manifest.get(session.session_id) != entry:
+                self._update_manifest(session.session_id, entry)
+        except Exception as e:
+            logging.error(f"Error saving session {session.session_id}: {e}")
+
+    def delete(self, session_id: str):
+        self._update_manifest(session_id, None)
+        self.meta_keys.pop(session_id, None)
+        self.rollups.pop(session_id, None)
+        for path in (self._shard_path(session_id), self._meta_path(session_id), self._rollup_path(session_id)):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def _rollup_path(self, session_id: str) -> str:
+        return os.path.join(self.rollup_dir, f"{session_id}.json")
+
+    def add_score(self, session_id: str, timestamp: float, score: float) -> bool:
+        """Fold one score into the session's rollups; True when it closed a 10 s bucket.
+
+        Nothing is written here: the caller persists the rollups (and the
+        shard) when a bucket closes, and flush_rollups at session end.
+        """
+        rollups = self.rollups.get(session_id)
+        if rollups is None:
+            rollups = self.rollups[session_id] = self._read_rollups(session_id) or SessionRollups()
+        closed = len(rollups.levels[RESOLUTIONS[1]])
+        rollups.add(timestamp, score)
+        return len(rollups.levels[RESOLUTIONS[1]]) != closed
+
+    def rollup_snapshot(self, session_id: str) -> Optional[Dict]:
+        """Copy of the live rollups, for writing from another thread while scores keep arriving"""
+        rollups = self.rollups.get(session_id)
+        if rollups is None:
+            return None
+        return {level: {name: list(values) for name, values in data.items()} for level, data in rollups.to_dict().items()}
+
+    def write_rollups(self, session_id: str, data: Dict):
+        self._write_atomic(self._rollup_path(session_id), data)
+
+    def flush_rollups(self, session_id: str):
+        """Persist and drop the in-memory rollups of a session that stopped receiving scores"""
+        rollups = self.rollups.get(session_id)
+        if rollups is not None:
+            # Written before it is dropped, so readers always find it in memory or on disk
+            self._write_atomic(self._rollup_path(session_id), rollups.to_dict())
+            self.rollups.pop(session_id, None)
+
+    def _read_rollups(self, session_id: str) -> Optional[SessionRollups]:
+        try:
+            with open(self._rollup_path(session_id), 'r') as f:
+                return SessionRollups(json.load(f))
+        except FileNotFoundError:
+            return None
+
+    def get_rollups(self, session_id: str) -> Optional[SessionRollups]:
+        """Live rollups, else the stored ones, else rebuilt from the session's scores"""
+        if session_id in self.rollups:
+            return self.rollups[session_id]
+        rollups = self._read_rollups(session_id)
+        if rollups is None:
+            session = self.load(session_id)
+            if session is None:
+                return None
+            rollups = SessionRollups.from_scores(
+                session.attention_scores, session.start_time.timestamp(), session.rate_hz)
+            if session.status == "ended":
+                self._write_atomic(self._rollup_path(session_id), rollups.to_dict())
+        return rollups
+
+    def append_aggregate(self, row: Dict):
+        """Append one aggregate row; a later row for the same session replaces it"""
+        line = json.dumps(row, separators=(',', ':')) + '\n'
+        with self._manifest_lock():
+            with open(self.aggregate_file, 'a') as f:
+                f.write(line)
+        self.writes += 1
+        self.bytes_written += len(line)
+
+    def read_aggregates(self, offset: int = 0):
+        """Aggregate rows appended from byte offset on, and the offset after them"""
+        try:
+            with open(self.aggregate_file, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], offset
+        end = data.rfind(b'\n') + 1  # A line still being appended is read next time
+        return [json.loads(line) for line in data[:end].splitlines() if line], offset + end
+
+    def query_range(self, start_ts: float = None, end_ts: float = None) -> List[str]:
+        """Session ids that started within [start_ts, end_ts), oldest first"""
+        self.refresh()
+        entries = sorted(
+            (entry['start_ts'], session_id)
+            for session_id, entry in self.manifest.items()
+            if (start_ts is None or entry['start_ts'] >= start_ts) and (end_ts is None or entry['start_ts'] < end_ts)
+        )
+        return [session_id for _, session_id in entries]
+
+    def query(self, limit: int = 10, status: str = None) -> List[str]:
+        """Session ids newest first, filtered on the manifest alone"""
+        self.refresh()
+        entries = [
+            (entry['start_ts'], session_id)
+            for session_id, entry in self.manifest.items()
+            if not status or entry['status'] == status
+        ]
+        entries.sort(reverse=True)
+        return [session_id for _, session_id in entries[:limit]]
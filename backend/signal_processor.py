@@ -1,7 +1,9 @@
 import numpy as np
-from scipy.signal import butter, filtfilt, welch, lfilter
+from scipy.signal import butter, filtfilt, welch, lfilter, sosfilt, sosfilt_zi
+from collections import deque
 from enum import Enum
 import warnings
+from precision import signal_dtype
 
 # Suppress specific warnings
 warnings.filterwarnings("ignore", message="nperseg = 256 is greater than input length")
@@ -16,7 +18,7 @@ class Band(Enum):
     Gamma = (30, 100)
 
 class SignalProcessor:
-    def __init__(self):
+    def __init__(self, dtype=None):
         self.lowcut = 0.5  # Lowered to capture delta waves
         self.highcut = 50.0  # Increased to capture gamma waves
         self.fs = 256.0  # EEG sampling rate
@@ -24,6 +26,10 @@ class SignalProcessor:
         self.acc_fs = 52.0  # Accelerometer sampling rate
         self.order = 5
         self.channels = ['TP9', 'AF7', 'AF8', 'TP10']
+        self.sos = butter(self.order, [self.lowcut, self.highcut], btype='band', fs=self.fs, output='sos')
+        # Dtype of filtered samples and spectra; filter coefficients and state stay float64
+        self.dtype = signal_dtype(dtype)
+        self.zi_unit = sosfilt_zi(self.sos)  # Filter state for a unit step, scaled per stream
 
     def detect_motion_artifacts(self, acc_data, gyro_data):
         # Convert lists to NumPy arrays
@@ -76,28 +82,38 @@ class SignalProcessor:
         freq_mask = (freqs >= band[0]) & (freqs <= band[1])
         return np.mean(psd[freq_mask])
 
+    def compute_psd(self, filtered_data):
+        """Welch spectrum of every channel in one call, shared by scoring and artifact detection"""
+        return welch(filtered_data, fs=self.fs, nperseg=256, axis=-1)
+
+    def band_powers(self, freqs, psd):
+        """Mean power per band, shape (..., channels, bands) in Band order"""
+        return np.stack([
+            np.mean(psd[..., (freqs >= band.value[0]) & (freqs <= band.value[1])], axis=-1)
+            for band in Band
+        ], axis=-1)
+
     def calculate_attention(self, filtered_data):
-        # Calculate power in each frequency band for each channel
-        band_powers = {}
-        for i, channel in enumerate(self.channels):
-            channel_data = filtered_data[i]
-            band_powers[channel] = {
-                band: self.calculate_band_power(channel_data, band.value)
-                for band in Band
-            }
+        freqs, psd = self.compute_psd(filtered_data[:len(self.channels)])
+        return self.calculate_attention_from_psd(freqs, psd)
+
+    def calculate_attention_from_psd(self, freqs, psd):
+        return float(self.attention_scores(freqs, psd[:len(self.channels)]))
+
+    def attention_scores(self, freqs, psd):
+        """Scores for psd of shape (..., channels, freqs), vectorized over any leading (session) axes"""
+        # Power in each frequency band for each channel
+        powers = self.band_powers(freqs, psd)
+        alpha = powers[..., list(Band).index(Band.Alpha)]
+        beta = powers[..., list(Band).index(Band.Beta)]
 
         # Calculate components
-        alpha_suppression = 1 - np.mean([
-            band_powers[ch][Band.Alpha] for ch in self.channels
-        ])
-        
-        beta_engagement = np.mean([
-            band_powers[ch][Band.Beta] for ch in self.channels
-        ])
+        alpha_suppression = 1 - np.mean(alpha, axis=-1)
+        beta_engagement = np.mean(beta, axis=-1)
 
         # Calculate frontal asymmetry
-        left_alpha = band_powers['AF7'][Band.Alpha]
-        right_alpha = band_powers['AF8'][Band.Alpha]
+        left_alpha = alpha[..., self.channels.index('AF7')]
+        right_alpha = alpha[..., self.channels.index('AF8')]
         faa = (right_alpha - left_alpha) / (right_alpha + left_alpha)
 
         # Combine scores with weights
@@ -107,7 +123,8 @@ class SignalProcessor:
             ((faa + 1) / 2) * 30
         )
 
-        return float(max(0, min(100, score)))
+        # A NaN score clamps to 100, as max(0, min(100, nan)) always did
+        return np.where(np.isnan(score), 100.0, np.clip(score, 0, 100))
 
     # Keep existing methods
     def butter_bandpass(self, lowcut, highcut, fs, order=5):
@@ -119,8 +136,26 @@ class SignalProcessor:
 
     def filter_signal(self, data):
         b, a = self.butter_bandpass(self.lowcut, self.highcut, self.fs, self.order)
-        filtered = lfilter(b, a, data, axis=0)
-        return filtered
+        filtered = lfilter(b, a, data, axis=-1)
+        return filtered.astype(self.dtype, copy=False)
+
+    def filter_chunk(self, data, zi=None):
+        """Band-pass only the new samples of a (channels, samples) chunk.
+
+        zi carries the filter state between chunks so consecutive calls
+        match filtering the whole stream at once; pass None to start.
+        The recursion runs in float64 (high-order sections lose stability
+        in float32) and only the output is cast to the processor's dtype.
+        """
+        if zi is None:
+            zi = self.initial_zi(data)
+        filtered, zi = sosfilt(self.sos, data, axis=-1, zi=zi)
+        return filtered.astype(self.dtype, copy=False), zi
+
+    def initial_zi(self, data):
+        """Steady-state filter state for a stream starting at the first sample of (..., samples) data"""
+        zi = self.zi_unit.reshape(self.zi_unit.shape[0], *([1] * (data.ndim - 1)), 2)
+        return zi * data[..., :1].astype(np.float64)
 
     # def calculate_attention(self, filtered_data):
     #     # Calculate power in each frequency band for each channel
@@ -155,7 +190,8 @@ class SignalProcessor:
 
     #     return float(max(0, min(100, score)))
 
-    def calculate_comprehensive_score(self, eeg_data, ppg_data, acc_data, gyro_data):
+    def calculate_comprehensive_score(self, eeg_data, ppg_data, acc_data, gyro_data, hrv_score=None):
+        """hrv_score (0-1) may come from a StreamingHRV instead of re-scanning ppg_data"""
         # Calculate EEG-based attention score
         attention_score = self.calculate_attention(eeg_data)
         
@@ -163,7 +199,8 @@ class SignalProcessor:
         motion_score = self.detect_motion_artifacts(acc_data, gyro_data)
         
         # Calculate HRV-based focus score
-        hrv_score = self.calculate_hrv_features(ppg_data)
+        if hrv_score is None:
+            hrv_score = self.calculate_hrv_features(ppg_data)
         
         # Combine scores with weights
         # 60% EEG, 20% motion, 20% HRV
@@ -301,4 +338,96 @@ class SignalProcessor:
         # Normalize the score based on expected ratio range (e.g., 0.6 to 1.0)
         normalized_score = 100 * (average_ratio - 0.1) / 9.9
         immersion_score = np.clip(normalized_score, 0, 100)
-        return float(immersion_score)
\ No newline at end of file
+        return float(immersion_score)
+
+class StreamingHRV:
+    """Online PPG peak detection with a rolling inter-beat-interval window.
+
+    Incremental counterpart of SignalProcessor.calculate_hrv_features, which
+    stays as the find_peaks reference. Each update only scans the new samples
+    and each detected beat updates the running sums in O(1).
+    """
+    def __init__(self, fs=64.0, min_distance=0.5, max_intervals=64, min_duration=10.0):
+        self.fs = fs
+        self.min_distance = int(fs * min_distance)  # Min 0.5s between peaks, as find_ppg_peaks
+        self.max_intervals = max_intervals
+        self.min_samples = int(fs * min_duration)  # Need at least 10s, as calculate_hrv_features
+
+        self.samples_seen = 0
+        self.tail = np.empty(0)  # Last two samples, to find maxima across update boundaries
+        self.candidate = None  # (index, value) of a peak not yet confirmed
+        self.last_peak = None
+
+        self.intervals = deque()
+        self.diffs = deque()
+        self.sum_ibi = 0.0
+        self.sum_ibi_sq = 0.0
+        self.sum_diff_sq = 0.0
+
+    def update(self, ppg_samples):
+        """Consume new PPG samples; returns the number of beats confirmed"""
+        ppg_samples = np.asarray(ppg_samples, dtype=np.float64)
+        if ppg_samples.size == 0:
+            return 0
+        ext = np.concatenate([self.tail, ppg_samples])
+        offset = self.samples_seen - len(self.tail)
+        self.samples_seen += len(ppg_samples)
+        self.tail = ext[-2:]
+
+        beats = 0
+        mid = ext[1:-1]
+        for i in np.flatnonzero((mid > ext[:-2]) & (mid > ext[2:])):
+            index, value = offset + i + 1, mid[i]
+            if self.candidate is None:
+                self.candidate = (index, value)
+            elif index - self.candidate[0] < self.min_distance:
+                # Too close: keep the taller of the two, as find_peaks does
+                if value > self.candidate[1]:
+                    self.candidate = (index, value)
+            else:
+                beats += self._confirm(self.candidate[0])
+                self.candidate = (index, value)
+
+        # Nothing later can displace a candidate once min_distance has passed
+        if self.candidate and self.samples_seen - 1 - self.candidate[0] >= self.min_distance:
+            beats += self._confirm(self.candidate[0])
+            self.candidate = None
+        return beats
+
+    def _confirm(self, index):
+        if self.last_peak is None:
+            self.last_peak = index
+            return 0
+        interval = (index - self.last_peak) / self.fs
+        self.last_peak = index
+
+        if self.intervals:
+            diff = interval - self.intervals[-1]
+            self.diffs.append(diff)
+            self.sum_diff_sq += diff * diff
+        self.intervals.append(interval)
+        self.sum_ibi += interval
+        self.sum_ibi_sq += interval * interval
+
+        if len(self.intervals) > self.max_intervals:
+            old = self.intervals.popleft()
+            self.sum_ibi -= old
+            self.sum_ibi_sq -= old * old
+            old_diff = self.diffs.popleft()
+            self.sum_diff_sq -= old_diff * old_diff
+        return 1
+
+    def features(self):
+        """SDNN/RMSSD-style HRV features over the current interval window"""
+        n = len(self.intervals)
+        if self.samples_seen < self.min_samples or n < 1:
+            return {'hrv_score': 0.5, 'heart_rate': 0.0, 'sdnn': 0.0, 'rmssd': 0.0}
+        mean_ibi = self.sum_ibi / n
+        sdnn = float(np.sqrt(max(0.0, self.sum_ibi_sq / n - mean_ibi * mean_ibi)))
+        rmssd = float(np.sqrt(self.sum_diff_sq / len(self.diffs))) if self.diffs else 0.0
+        return {
+            'hrv_score': min(1.0, sdnn / 0.1),  # Same normalization as calculate_hrv_features
+            'heart_rate': 60.0 / mean_ibi,
+            'sdnn': sdnn,
+            'rmssd': rmssd,
+        }
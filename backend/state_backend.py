@@ -0,0 +1,219 @@
+import os
+import time
+import socket
+import sqlite3
+import logging
+import queue
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+def get_worker_id() -> str:
+    """Identifies this process across workers and hosts"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class StateBackend(ABC):
+    """Session state shared by every worker process.
+
+    Holds the live status of each session, a lease naming the worker that
+    runs its stream task, and a short log of recent frames so a worker that
+    does not own a session can relay them to its own websocket clients.
+    A networked store (e.g. Redis) only has to implement these methods.
+    """
+    # False when every worker sees the same in-process state (nothing to relay)
+    shared = True
+
+    @abstractmethod
+    def set_status(self, session_id: str, status: str):
+        ...
+
+    @abstractmethod
+    def get_status(self, session_id: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def acquire_lease(self, session_id: str, owner: str, ttl: float) -> bool:
+        """Take or renew ownership; fails while another owner's lease is live"""
+        ...
+
+    @abstractmethod
+    def release_lease(self, session_id: str, owner: str):
+        ...
+
+    @abstractmethod
+    def get_owner(self, session_id: str) -> Optional[str]:
+        """Owner of a live (unexpired) lease, if any"""
+        ...
+
+    @abstractmethod
+    def publish_frame(self, session_id: str, seq: int, payload: str):
+        ...
+
+    @abstractmethod
+    def fetch_frames(self, session_id: str, after_seq: int) -> List[Tuple[int, str]]:
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+class MemoryStateBackend(StateBackend):
+    """Single-process state; the default when running one worker"""
+    shared = False
+
+    def __init__(self):
+        self.statuses: Dict[str, str] = {}
+        self.leases: Dict[str, Tuple[str, float]] = {}
+
+    def set_status(self, session_id: str, status: str):
+        self.statuses[session_id] = status
+
+    def get_status(self, session_id: str) -> Optional[str]:
+        return self.statuses.get(session_id)
+
+    def acquire_lease(self, session_id: str, owner: str, ttl: float) -> bool:
+        current = self.leases.get(session_id)
+        now = time.time()
+        if current and current[0] != owner and current[1] > now:
+            return False
+        self.leases[session_id] = (owner, now + ttl)
+        return True
+
+    def release_lease(self, session_id: str, owner: str):
+        current = self.leases.get(session_id)
+        if current and current[0] == owner:
+            del self.leases[session_id]
+
+    def get_owner(self, session_id: str) -> Optional[str]:
+        current = self.leases.get(session_id)
+        if current and current[1] > time.time():
+            return current[0]
+        return None
+
+    def publish_frame(self, session_id: str, seq: int, payload: str):
+        pass  # Every subscriber is local
+
+    def fetch_frames(self, session_id: str, after_seq: int) -> List[Tuple[int, str]]:
+        return []
+
+    def delete(self, session_id: str):
+        self.statuses.pop(session_id, None)
+        self.leases.pop(session_id, None)
+
+class SQLiteStateBackend(StateBackend):
+    """State shared by all workers on one host through a WAL-mode SQLite file.
+
+    publish_frame only queues the frame: a publisher thread inserts
+    everything queued in one transaction, so a tick never waits on the
+    database, and a busy writer in another worker delays frames rather
+    than the event loop.
+    """
+    def __init__(self, path: str, frame_history: int = 64):
+        self.path = path
+        self.frame_history = frame_history
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                session_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS frames (
+                session_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            ) WITHOUT ROWID;
+        """)
+        self.frames: "queue.SimpleQueue[Tuple[str, int, str]]" = queue.SimpleQueue()
+        self.published = 0
+        self.batches = 0
+        threading.Thread(target=self._publish_frames, daemon=True, name="state-frames").start()
+        logging.info(f"Using shared session state at {path}")
+
+    def _execute(self, sql: str, params: tuple = ()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def set_status(self, session_id: str, status: str):
+        self._execute(
+            "INSERT INTO sessions (session_id, status) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET status = excluded.status",
+            (session_id, status))
+
+    def get_status(self, session_id: str) -> Optional[str]:
+        rows = self._execute("SELECT status FROM sessions WHERE session_id = ?", (session_id,))
+        return rows[0][0] if rows else None
+
+    def acquire_lease(self, session_id: str, owner: str, ttl: float) -> bool:
+        now = time.time()
+        self._execute(
+            "INSERT INTO leases (session_id, owner, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+            "WHERE leases.owner = excluded.owner OR leases.expires < ?",
+            (session_id, owner, now + ttl, now))
+        return self.get_owner(session_id) == owner
+
+    def release_lease(self, session_id: str, owner: str):
+        self._execute("DELETE FROM leases WHERE session_id = ? AND owner = ?", (session_id, owner))
+
+    def get_owner(self, session_id: str) -> Optional[str]:
+        rows = self._execute(
+            "SELECT owner FROM leases WHERE session_id = ? AND expires > ?",
+            (session_id, time.time()))
+        return rows[0][0] if rows else None
+
+    def publish_frame(self, session_id: str, seq: int, payload: str):
+        self.frames.put((session_id, seq, payload))
+
+    def _publish_frames(self):
+        while True:
+            batch = [self.frames.get()]
+            while True:
+                try:
+                    batch.append(self.frames.get_nowait())
+                except queue.Empty:
+                    break
+            # Trim in batches rather than on every frame
+            trims = [(session_id, seq - self.frame_history) for session_id, seq, _ in batch
+                     if seq % self.frame_history == 0]
+            try:
+                with self.lock:
+                    self.conn.execute("BEGIN")
+                    try:
+                        self.conn.executemany(
+                            "INSERT OR REPLACE INTO frames (session_id, seq, payload) VALUES (?, ?, ?)", batch)
+                        self.conn.executemany("DELETE FROM frames WHERE session_id = ? AND seq <= ?", trims)
+                        self.conn.execute("COMMIT")
+                    except Exception:
+                        self.conn.execute("ROLLBACK")
+                        raise
+                self.published += len(batch)
+                self.batches += 1
+            except Exception as e:
+                logging.error(f"Error publishing {len(batch)} frames: {e}")
+
+    def fetch_frames(self, session_id: str, after_seq: int) -> List[Tuple[int, str]]:
+        return self._execute(
+            "SELECT seq, payload FROM frames WHERE session_id = ? AND seq > ? ORDER BY seq",
+            (session_id, after_seq))
+
+    def delete(self, session_id: str):
+        for table in ('sessions', 'leases', 'frames'):
+            self._execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+
+def create_state_backend(data_dir: str = 'data') -> StateBackend:
+    """SQLite when STUDYAMP_STATE_DB is set (needed for --workers > 1), in-memory otherwise"""
+    db_path = os.getenv('STUDYAMP_STATE_DB')
+    if db_path:
+        if not os.path.isabs(db_path) and not os.path.dirname(db_path):
+            db_path = os.path.join(data_dir, db_path)
+        return SQLiteStateBackend(db_path)
+    return MemoryStateBackend()
@@ -0,0 +1,215 @@
+import time
+import zlib
+import argparse
+import numpy as np
+from typing import Dict, List
+from precision import signal_dtype
+
+SYNTHETIC_SOURCE = "SYNTHETIC_SOURCE"  # Board name in the device config
+EEG_CHANNEL_COUNT = 4  # TP9, AF7, AF8, TP10
+FRONTAL_CHANNELS = [1, 2]
+TEMPORAL_CHANNELS = [0, 3]
+
+# Centre frequency (Hz) and default amplitude (uV) per band
+BANDS = {
+    "delta": (2.0, 8.0),
+    "theta": (6.0, 6.0),
+    "alpha": (10.0, 10.0),
+    "beta": (20.0, 4.0),
+    "gamma": (40.0, 1.5),
+}
+ARTIFACT_DEFAULTS = {
+    "blink": {"duration": 0.3, "amplitude": 150.0},
+    "clench": {"duration": 1.0, "amplitude": 40.0},
+    "motion": {"duration": 1.0, "amplitude": 120.0},
+}
+PPG_FS = 64
+IMU_FS = 52
+PPG_WINDOW_SECONDS = 10
+IMU_WINDOW_SECONDS = 1
+NOISE_BLOCK_SECONDS = 10  # Noise is drawn in seeded blocks this long
+
+def _amplitude(schedule, t):
+    """A band amplitude at times t from [[seconds, uV], ...] breakpoints, linearly interpolated"""
+    points = np.asarray(schedule, dtype=np.float64)
+    return np.interp(t, points[:, 0], points[:, 1])
+
+class SyntheticSource:
+    """Seedable NumPy EEG generator with the DeviceManager interface.
+
+    Every sample is a pure function of its index: band sinusoids (one per
+    band and channel, with seeded phases) scaled by each band's amplitude
+    schedule, scheduled artifacts and white noise drawn in blocks seeded by
+    their position. Any range of samples can therefore be generated directly, in any
+    chunking, with identical results, which is what generate() does for
+    benchmarks. get_data() serves the samples due on the wall clock since
+    the previous call, so a session streams at real-time pace.
+
+    artifacts is a list of {"type": "blink" | "clench" | "motion", "at": seconds,
+    "duration": seconds, "amplitude": uV}, times relative to the stream start.
+    """
+    board_id = SYNTHETIC_SOURCE
+
+    def __init__(self, seed: int = 0, fs: int = 256, bands: Dict = None, noise: float = 2.0,
+                 artifacts: List[Dict] = None, heart_rate: float = 66.0, instance: str = "", dtype=None):
+        self.seed = [seed, zlib.crc32(instance.encode())]
+        self.fs = fs
+        self.dtype = signal_dtype(dtype)
+        self.eeg_rows = list(range(EEG_CHANNEL_COUNT))
+        self.noise = noise
+        self.heart_rate = heart_rate
+        self.ppg_fs = PPG_FS
+        self.bands = {name: (bands or {}).get(name, amplitude) for name, (_, amplitude) in BANDS.items()}
+        self.artifacts = [{**ARTIFACT_DEFAULTS[a["type"]], **a} for a in artifacts or []]
+        rng = np.random.default_rng(self.seed)
+        # Per channel phase and a slight frequency spread, so channels are not copies
+        self.freqs = np.array([f for f, _ in BANDS.values()])[:, None] * rng.uniform(0.95, 1.05, (len(BANDS), EEG_CHANNEL_COUNT))
+        self.phases = rng.uniform(0, 2 * np.pi, (len(BANDS), EEG_CHANNEL_COUNT))
+        self.noise_blocks = {}  # Stream -> (block index, block), the last block drawn
+        self.connected = True
+        self.reset()
+
+    def reset(self):
+        """Restart the stream at sample 0, timed from now"""
+        self.start_time = time.time()
+        self.samples_read = 0
+        self.last_timestamp = None
+
+    def stop(self):
+        self.connected = False
+
+    def get_stats(self):
+        return {"gaps": 0, "samples_lost": 0, "duplicates": 0}
+
+    def timestamps(self, start: int, n: int, fs: float = None) -> np.ndarray:
+        return self.start_time + (start + np.arange(n)) / (fs or self.fs)
+
+    def generate(self, start: int, n: int) -> np.ndarray:
+        """EEG samples start .. start + n as (channels, n), in uV"""
+        t = (start + np.arange(n)) / self.fs
+        eeg = np.zeros((EEG_CHANNEL_COUNT, n))
+        wave = np.empty_like(eeg)
+        for i, amplitude in enumerate(self.bands.values()):
+            np.multiply(2 * np.pi * self.freqs[i][:, None], t, out=wave)
+            wave += self.phases[i][:, None]
+            np.sin(wave, out=wave)
+            wave *= amplitude if np.isscalar(amplitude) else _amplitude(amplitude, t)
+            eeg += wave
+        eeg += self.noise * self._normal("eeg", self.fs, EEG_CHANNEL_COUNT, start, n)
+        for artifact in self.artifacts:
+            self._inject(eeg, t, artifact)
+        return eeg.astype(self.dtype, copy=False)
+
+    def _normal(self, stream: str, fs: float, rows: int, start: int, n: int) -> np.ndarray:
+        """Standard normal samples start .. start + n of a stream as (rows, n), the same in any chunking"""
+        if n <= 0:
+            return np.empty((rows, 0))  # E.g. IMU windows before the first IMU sample is due
+        block_len = int(NOISE_BLOCK_SECONDS * fs)
+        first, last = start // block_len, (start + n - 1) // block_len
+        blocks = []
+        for index in range(first, last + 1):
+            cached = self.noise_blocks.get(stream)
+            if cached is None or cached[0] != index:
+                key = zlib.crc32(stream.encode())
+                cached = self.noise_blocks[stream] = (
+                    index, np.random.default_rng(self.seed + [key, index]).standard_normal((rows, block_len)))
+            blocks.append(cached[1])
+        offset = start - first * block_len
+        data = blocks[0] if len(blocks) == 1 else np.concatenate(blocks, axis=1)
+        return data[:, offset:offset + n]
+
+    def _inject(self, eeg: np.ndarray, t: np.ndarray, artifact: Dict):
+        at, duration, amplitude = artifact["at"], artifact["duration"], artifact["amplitude"]
+        active = (t >= at) & (t < at + duration)
+        if not active.any():
+            return
+        phase = (t[active] - at) / duration  # 0 .. 1 through the artifact
+        if artifact["type"] == "blink":
+            # A slow frontal deflection
+            eeg[np.ix_(FRONTAL_CHANNELS, np.flatnonzero(active))] += amplitude * np.sin(np.pi * phase)
+        elif artifact["type"] == "clench":
+            # Broadband muscle activity, strongest at the temporal electrodes
+            burst = self._normal("emg", self.fs, EEG_CHANNEL_COUNT, int(round(t[active][0] * self.fs)), int(active.sum()))
+            burst = burst * np.sin(2 * np.pi * 45.0 * t[active])  # Shift the burst's energy up to the EMG band
+            weights = np.full((EEG_CHANNEL_COUNT, 1), 0.4)
+            weights[TEMPORAL_CHANNELS] = 1.0
+            eeg[:, active] += amplitude * weights * burst
+        elif artifact["type"] == "motion":
+            # A large slow swing on every channel
+            eeg[:, active] += amplitude * np.sin(2 * np.pi * phase)[None, :] * np.linspace(1.0, 0.7, EEG_CHANNEL_COUNT)[:, None]
+
+    def get_data(self):
+        """EEG due on the wall clock since the previous call, as (channels, samples) and timestamps"""
+        due = int((time.time() - self.start_time) * self.fs)
+        n = due - self.samples_read
+        if not self.connected or n <= 0:
+            return np.empty((EEG_CHANNEL_COUNT, 0), dtype=self.dtype), np.empty(0)
+        data = self.generate(self.samples_read, n)
+        timestamps = self.timestamps(self.samples_read, n)
+        self.samples_read = due
+        self.last_timestamp = timestamps[-1]
+        return data, timestamps
+
+    def ppg(self, start: int, n: int) -> np.ndarray:
+        """PPG samples start .. start + n at PPG_FS: a pulse wave with a slow heart rate oscillation"""
+        t = (start + np.arange(n)) / self.ppg_fs
+        beat_hz = self.heart_rate / 60.0
+        # Heart rate swings 5% at 0.25 Hz; the phase is its integral, so beats stay continuous
+        phase = 2 * np.pi * (beat_hz * t - beat_hz * 0.05 / (2 * np.pi * 0.25) * np.cos(2 * np.pi * 0.25 * t))
+        return 1e5 + 1e3 * (np.sin(phase) + 0.3 * np.sin(2 * phase))
+
+    def imu(self, start: int, n: int, kind: str) -> np.ndarray:
+        """Accelerometer (g) or gyroscope (deg/s) samples as (n, 3); motion artifacts show here too"""
+        t = (start + np.arange(n)) / IMU_FS
+        data = 0.01 * self._normal(kind, IMU_FS, 3, start, n).T
+        if kind == 'acc':
+            data[:, 2] += 1.0  # Gravity
+        for artifact in self.artifacts:
+            if artifact["type"] == "motion":
+                active = (t >= artifact["at"]) & (t < artifact["at"] + artifact["duration"])
+                data[active] += 0.5 if kind == 'acc' else 50.0
+        return data
+
+    def _due(self, fs: float) -> int:
+        """Samples of a stream at fs covered by the EEG read so far"""
+        return int(self.samples_read / self.fs * fs)
+
+    def read_new_ppg(self, cursor=0):
+        """PPG samples up to the last EEG read since cursor, for incremental consumers like StreamingHRV"""
+        due = self._due(self.ppg_fs)
+        if due <= cursor:
+            return np.empty(0), cursor
+        return self.ppg(cursor, due - cursor), due
+
+    def get_aux_data(self, end_ts=None):
+        """PPG, accelerometer and gyroscope windows ending at the latest EEG sample, as DeviceManager returns them"""
+        if self.last_timestamp is None:
+            return {'ppg': [], 'acc': [], 'gyro': []}
+        ppg_end, imu_end = self._due(self.ppg_fs), self._due(IMU_FS)
+        ppg_n = min(ppg_end, PPG_WINDOW_SECONDS * self.ppg_fs)
+        imu_n = min(imu_end, IMU_WINDOW_SECONDS * IMU_FS)
+        return {
+            'ppg': self.ppg(ppg_end - ppg_n, ppg_n),
+            'acc': self.imu(imu_end - imu_n, imu_n, 'acc'),
+            'gyro': self.imu(imu_end - imu_n, imu_n, 'gyro'),
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Time SyntheticSource generating a long recording")
+    parser.add_argument("--hours", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-seconds", type=float, default=600.0)
+    args = parser.parse_args()
+
+    source = SyntheticSource(seed=args.seed, artifacts=[{"type": "blink", "at": 5.0}])
+    total = int(args.hours * 3600 * source.fs)
+    chunk = int(args.chunk_seconds * source.fs)
+    start = time.perf_counter()
+    for offset in range(0, total, chunk):
+        source.generate(offset, min(chunk, total - offset))
+    elapsed = time.perf_counter() - start
+    print(f"{args.hours:g} h of {EEG_CHANNEL_COUNT}-channel EEG at {source.fs} Hz "
+          f"({total:,} samples) in {1000 * elapsed:.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""StreamingHRV must find the same beats as the find_peaks reference, however the PPG is chunked.
+
+Run with pytest or directly: python test_hrv.py
+"""
+import numpy as np
+from signal_processor import SignalProcessor, StreamingHRV
+
+FS = 64.0
+CHUNK_SIZES = (1, 7, 16, 64, 250)
+
+def synthetic_ppg(beats=120, seed=0):
+    """Pulses with a dicrotic bump, beat intervals varying around 0.8 s.
+
+    Ends a second after the last pulse, so every beat can be confirmed.
+    """
+    rng = np.random.default_rng(seed)
+    intervals = 0.8 + 0.04 * np.sin(np.arange(beats) / 3) + 0.02 * rng.standard_normal(beats)
+    beat_times = 1.0 + np.concatenate(([0.0], np.cumsum(intervals[:-1])))
+    t = np.arange(int((beat_times[-1] + 1.0) * FS)) / FS
+    ppg = np.zeros(len(t))
+    for beat in beat_times:
+        ppg += np.exp(-((t - beat) / 0.06) ** 2)
+        ppg += 0.3 * np.exp(-((t - beat - 0.3) / 0.05) ** 2)  # Within the 0.5 s minimum distance
+    return ppg
+
+def reference_intervals(ppg):
+    processor = SignalProcessor()
+    return np.diff(processor.find_ppg_peaks(ppg)) / processor.ppg_fs
+
+def stream(ppg, chunk_sizes, max_intervals=64):
+    hrv = StreamingHRV(fs=FS, max_intervals=max_intervals)
+    start, i = 0, 0
+    while start < len(ppg):
+        size = chunk_sizes[i % len(chunk_sizes)]
+        hrv.update(ppg[start:start + size])
+        start, i = start + size, i + 1
+    return hrv
+
+def test_matches_reference_over_all_beats():
+    ppg = synthetic_ppg()
+    intervals = reference_intervals(ppg)
+    reference_score = SignalProcessor().calculate_hrv_features(ppg)
+    assert 0 < reference_score < 1  # Not clamped, so it still measures SDNN
+    for size in CHUNK_SIZES:
+        hrv = stream(ppg, [size], max_intervals=len(ppg))
+        assert np.allclose(hrv.intervals, intervals)
+        features = hrv.features()
+        assert abs(features['hrv_score'] - reference_score) < 1e-9
+        assert abs(features['sdnn'] - np.std(intervals)) < 1e-9
+        assert abs(features['rmssd'] - np.sqrt(np.mean(np.diff(intervals) ** 2))) < 1e-9
+        assert abs(features['heart_rate'] - 60 / np.mean(intervals)) < 1e-6
+
+def test_rolling_window_across_chunk_boundaries():
+    ppg = synthetic_ppg(seed=1)
+    window = reference_intervals(ppg)[-64:]
+    rng = np.random.default_rng(1)
+    for sizes in ([16], rng.integers(1, 40, size=50).tolist()):
+        features = stream(ppg, sizes).features()
+        # Running sums drift only by rounding after intervals leave the window
+        assert abs(features['sdnn'] - np.std(window)) < 1e-9
+        assert abs(features['rmssd'] - np.sqrt(np.mean(np.diff(window) ** 2))) < 1e-9
+
+def test_default_until_ten_seconds():
+    ppg = synthetic_ppg()
+    hrv = stream(ppg[:int(9 * FS)], [16])
+    assert hrv.features()['hrv_score'] == 0.5
+    assert SignalProcessor().calculate_hrv_features(ppg[:int(9 * FS)]) == 0.5
+
+if __name__ == "__main__":
+    for test in (test_matches_reference_over_all_beats, test_rolling_window_across_chunk_boundaries,
+                 test_default_until_ten_seconds):
+        test()
+        print(f"{test.__name__}: ok")
@@ -0,0 +1,83 @@
+"""float32 mode must track the float64 pipeline closely enough to not change any result.
+
+Run with pytest or directly: python test_precision.py
+"""
+import json
+import numpy as np
+from signal_processor import SignalProcessor
+from pipeline import SessionPipeline
+from precision import dumps, to_wire
+
+FS = 256
+CHUNK = 64  # One tick at 4 Hz
+
+def synthetic_eeg(seconds=30, seed=0, scale=1.0):
+    """Alpha and beta rhythms with noise on a large DC offset, like raw headset output"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(seconds * FS) / FS
+    channels = []
+    for ch in range(4):
+        signal = (
+            800.0 + 5 * ch
+            + 20 * np.sin(2 * np.pi * 10 * t + ch)
+            + 8 * np.sin(2 * np.pi * 20 * t + 2 * ch)
+            + 5 * rng.standard_normal(len(t))
+        )
+        channels.append(signal)
+    return scale * np.array(channels), 1.7e9 + t
+
+def run_pipeline(dtype, data, timestamps):
+    pipeline = SessionPipeline(dtype=dtype)
+    results = []
+    for start in range(0, data.shape[1], CHUNK):
+        chunk = data[:, start:start + CHUNK].astype(dtype)
+        results.append(pipeline.process(chunk, timestamps[start:start + CHUNK]))
+    return pipeline, results
+
+def test_filter_state_stays_float64():
+    processor = SignalProcessor(dtype='float32')
+    data, _ = synthetic_eeg(seconds=2)
+    filtered, zi = processor.filter_chunk(data[:, :CHUNK].astype(np.float32))
+    assert filtered.dtype == np.float32
+    assert zi.dtype == np.float64
+
+def test_pipeline_matches_float64():
+    # Scaled so attention scores land inside (0, 100) rather than at the clamp
+    data, timestamps = synthetic_eeg(scale=0.05)
+    pipeline32, results32 = run_pipeline('float32', data, timestamps)
+    _, results64 = run_pipeline('float64', data, timestamps)
+
+    assert pipeline32.window.data.dtype == np.float32
+    filtered32 = np.concatenate([r['filtered'] for r in results32], axis=1)
+    filtered64 = np.concatenate([r['filtered'] for r in results64], axis=1)
+    assert filtered32.dtype == np.float32
+    # Error stays at the input quantization (float32 spacing at the DC offset), far below the noise
+    scale = np.std(filtered64)
+    assert np.max(np.abs(filtered32 - filtered64)) < 1e-4 * scale
+
+    freqs, psd32 = pipeline32.signal_processor.compute_psd(filtered32[:, -256:])
+    _, psd64 = pipeline32.signal_processor.compute_psd(filtered64[:, -256:])
+    assert psd32.dtype == np.float32
+    assert np.allclose(psd32, psd64, rtol=1e-3, atol=1e-6 * psd64.max())
+
+    assert 0 < results64[-1]['attention_score'] < 100
+    for r32, r64 in zip(results32, results64):
+        assert r32['artifacts'] == r64['artifacts']
+        assert r32['clean'] == r64['clean']
+        assert abs(r32['attention_score'] - r64['attention_score']) < 1e-3
+
+def test_wire_format_is_shorter_and_exact():
+    data, _ = synthetic_eeg(seconds=1)
+    filtered, _ = SignalProcessor(dtype='float64').filter_chunk(data)
+    as32 = filtered.astype(np.float32)
+    wire32 = to_wire(as32)
+    # Every value parses back to the same float32
+    assert np.array_equal(np.array(wire32, dtype=np.float32), as32)
+    assert len(json.dumps(wire32)) < 0.7 * len(json.dumps(to_wire(filtered)))
+    # Arrays written directly carry the same digits
+    assert json.loads(dumps({"samples": as32}))["samples"] == wire32
+
+if __name__ == "__main__":
+    for test in (test_filter_state_stays_float64, test_pipeline_matches_float64, test_wire_format_is_shorter_and_exact):
+        test()
+        print(f"{test.__name__}: ok")
@@ -85,9 +85,10 @@ async def stream_to_terminal():
         with Live(refresh_per_second=4) as live:
             while True:
                 # Fetch raw data
-                raw_data = await asyncio.get_event_loop().run_in_executor(
+                raw_data, timestamps = await asyncio.get_event_loop().run_in_executor(
                     None, device_manager.get_data)
-                if len(raw_data) == 0:
+                if raw_data.shape[1] == 0:
+                    await asyncio.sleep(0.05)
                     continue  # Skip if no data received
 
                 # Filter signal
@@ -95,10 +96,11 @@ async def stream_to_terminal():
                     None, signal_processor.filter_signal, raw_data)
                 filtered_data = np.nan_to_num(filtered_data, nan=0.0)
 
-                # Placeholder data for PPG, accelerometer, and gyroscope
-                ppg_data = []   # Replace with actual PPG data if available
-                acc_data = []   # Replace with actual accelerometer data if available
-                gyro_data = []  # Replace with actual gyroscope data if available
+                # PPG, accelerometer, and gyroscope windows aligned to this EEG window
+                aux = device_manager.get_aux_data()
+                ppg_data = aux['ppg']
+                acc_data = aux['acc']
+                gyro_data = aux['gyro']
 
                 # Calculate comprehensive scores
                 scores = await asyncio.get_event_loop().run_in_executor(
@@ -121,7 +123,7 @@ async def stream_to_terminal():
                 # Prepare EEGData instance
                 eeg_channels = filtered_data.tolist()  # Now a list of lists
                 eeg_data = EEGData(
-                    timestamp=datetime.now(timezone.utc).timestamp(),
+                    timestamp=float(timestamps[-1]),
                     attention_score=scores['attention_score'],
                     eeg_channels=eeg_channels,
                     device_status={"battery": 80}
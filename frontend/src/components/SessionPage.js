@@ -24,6 +24,8 @@ ChartJS.register(
   Legend
 );
 
+const MAX_RECONNECT_ATTEMPTS = 10;
+
 const SessionPage = () => {
   const [chartData, setChartData] = useState({
     labels: [],
@@ -48,9 +50,14 @@ const SessionPage = () => {
   const [mediaRecorder, setMediaRecorder] = useState(null);
   const [summaries, setSummaries] = useState([]);
   const [processingStatus, setProcessingStatus] = useState('');
+  const [qualityTier, setQualityTier] = useState('full');
   
   const audioChunks = useRef([]);
   const lowAttentionPeriods = useRef([]);
+  // Websocket resume: last frame seq received, and whether a close was requested
+  const lastSeqRef = useRef(0);
+  const closingRef = useRef(false);
+  const reconnectTimerRef = useRef(null);
   const apiUrl = process.env.REACT_APP_API_URL;
 
   useEffect(() => {
@@ -178,6 +185,12 @@ const SessionPage = () => {
                 body: formData,
               });
 
+              if (response.status === 429 || response.status === 503) {
+                // The server is at its audio job limit or overloaded
+                setProcessingStatus('');
+                setSummaries([`The server is busy. Please try again in ${response.headers.get('Retry-After') || 30} seconds.`]);
+                return;
+              }
               if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
               }
@@ -203,6 +216,8 @@ const SessionPage = () => {
       audioChunks.current = [];
       lowAttentionPeriods.current = [];
 
+      closingRef.current = true;
+      clearTimeout(reconnectTimerRef.current);
       fetch(`${apiUrl}/sessions/${session.session_id}`, { method: 'DELETE' })
         .then((response) => response.text())
         .then((result) => {
@@ -220,19 +235,81 @@ const SessionPage = () => {
     }
   };
 
-  const startWebSocketConnection = (session) => {
-    if (!session || !session.session_id) {
-      console.error('Invalid session data');
-      setIsLoading(false);
+  const addAttentionPoint = (timestamp, attentionScore, trackDrops = true) => {
+    const label = new Date(timestamp * 1000).toLocaleTimeString();
+
+    // Check if attention score drops below threshold
+    if (trackDrops && attentionScore > 0 && attentionScore < lowAttentionScore) {
+      // Add to low attention periods
+      lowAttentionPeriods.current.push({
+        timestamp: timestamp,
+        score: attentionScore,
+      });
+    }
+
+    setAttentionScores((prev) => {
+      const newScores = [...prev, attentionScore];
+      const updatedScores = newScores.slice(-33);
+      setMovingAverage(calculateMovingAverage(updatedScores));
+      return updatedScores;
+    });
+
+    setChartData((prevData) => {
+      const newLabels = [...prevData.labels, label];
+      const newData = [...prevData.datasets[0].data, attentionScore];
+
+      if (newLabels.length > 20) {
+        newLabels.shift();
+        newData.shift();
+      }
+
+      return {
+        labels: newLabels,
+        datasets: [
+          {
+            ...prevData.datasets[0],
+            data: newData,
+          },
+        ],
+      };
+    });
+  };
+
+  const handleMessage = (data) => {
+    if (data.type === 'gap') {
+      // Frames too old to replay arrive summarized per time bucket
+      console.log(`Missed frames ${data.from_seq}-${data.to_seq}`);
+      const timeline = data.timeline;
+      if (timeline) {
+        timeline.t.forEach((t, i) => {
+          if (timeline.min[i] > 0 && timeline.min[i] < lowAttentionScore) {
+            lowAttentionPeriods.current.push({ timestamp: t, score: timeline.min[i] });
+          }
+          addAttentionPoint(t, timeline.mean[i], false);
+        });
+      }
+      lastSeqRef.current = Math.max(lastSeqRef.current, data.to_seq);
       return;
     }
+    if (data.seq !== undefined) {
+      if (data.seq <= lastSeqRef.current) return; // Already received before a reconnect
+      lastSeqRef.current = data.seq;
+    }
+    // The server lowers a session's frame rate when it is overloaded ("reduced", "score")
+    if (data.tier) setQualityTier(data.tier);
+    addAttentionPoint(data.timestamp, data.attention_score);
+  };
 
+  const connectWebSocket = (session, attempt) => {
     const wsUrl = process.env.REACT_APP_WS_URL;
-    const newSocket = new WebSocket(`${wsUrl}/${session.session_id}`);
+    // After a drop, resume from the last frame received
+    const since = lastSeqRef.current > 0 ? `?since=${lastSeqRef.current}` : '';
+    const newSocket = new WebSocket(`${wsUrl}/${session.session_id}${since}`);
     setSocket(newSocket);
 
     newSocket.onopen = () => {
       console.log('WebSocket connection established');
+      attempt = 0;
       newSocket.send(
         JSON.stringify({ message: 'Session started', sessionId: session.session_id })
       );
@@ -242,54 +319,34 @@ const SessionPage = () => {
       const data = JSON.parse(event.data);
       setIsLoading(false);
       console.log('Message from server: ', data);
-
-      const attentionScore = data.attention_score;
-      const timestamp = new Date(data.timestamp * 1000).toLocaleTimeString();
-
-      // Check if attention score drops below threshold
-      if (attentionScore > 0 && attentionScore < lowAttentionScore) {
-        // Add to low attention periods
-        lowAttentionPeriods.current.push({
-          timestamp: data.timestamp,
-          score: attentionScore,
-        });
-      }
-
-      setAttentionScores((prev) => {
-        const newScores = [...prev, attentionScore];
-        const updatedScores = newScores.slice(-33);
-        setMovingAverage(calculateMovingAverage(updatedScores));
-        return updatedScores;
-      });
-
-      setChartData((prevData) => {
-        const newLabels = [...prevData.labels, timestamp];
-        const newData = [...prevData.datasets[0].data, attentionScore];
-
-        if (newLabels.length > 20) {
-          newLabels.shift();
-          newData.shift();
-        }
-
-        return {
-          labels: newLabels,
-          datasets: [
-            {
-              ...prevData.datasets[0],
-              data: newData,
-            },
-          ],
-        };
-      });
+      handleMessage(data);
     };
 
     newSocket.onerror = (error) => {
       console.error('WebSocket error: ', error);
     };
 
-    newSocket.onclose = () => {
+    newSocket.onclose = (event) => {
       console.log('WebSocket connection closed');
+      // 1008: the session is no longer active, so there is nothing to resume
+      if (closingRef.current || event.code === 1008 || attempt >= MAX_RECONNECT_ATTEMPTS) return;
+      const delay = Math.min(500 * 2 ** attempt, 10000);
+      console.log(`Reconnecting in ${delay}ms from seq ${lastSeqRef.current}`);
+      reconnectTimerRef.current = setTimeout(() => connectWebSocket(session, attempt + 1), delay);
     };
+  };
+
+  const startWebSocketConnection = (session) => {
+    if (!session || !session.session_id) {
+      console.error('Invalid session data');
+      setIsLoading(false);
+      return;
+    }
+
+    lastSeqRef.current = 0;
+    closingRef.current = false;
+    setQualityTier('full');
+    connectWebSocket(session, 0);
 
     // Start a timer to send notifications at the user-defined interval
     notificationTimerRef.current = setInterval(() => {
@@ -325,6 +382,9 @@ const SessionPage = () => {
             <div className="graph-container" style={{ padding: '20px' }}>
               <div className="average-score" style={{ textAlign: 'center', marginBottom: '10px' }}>
                 <h2>Average Attention Score: {movingAverage || 0}</h2>
+                {qualityTier !== 'full' && !sessionEnded && (
+                  <p>The server is busy, so scores update less often for now.</p>
+                )}
               </div>
               
               <div style={{ 